@@ -0,0 +1,95 @@
+"""
+Wall time of a batch evaluation against the rate-limit bound N / RPM.
+
+    python -m benchmarks.bench_batch [--workers 1 8] [--texts 40] [--videos 4] [--rpm 600]
+                                     [--latency 1.0] [--processing 1.0] [--no-record]
+
+A batch of texts and videos is run by BatchRunner through a LimitedClient over a
+MockClient with lognormal call latency (median `--latency` s) and File API processing
+of about 2 x `--processing` s per video, under a tier of `--rpm` requests per minute.
+One worker runs the items back to back, paying the sum of their latencies; with several,
+uploads, processing and judge calls overlap until the limiter's RPM is the bound.
+Efficiency is the bound (items / RPM) divided by the wall time.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.results import record
+from src.batch import BatchItem, BatchRunner
+from src.evaluator import Evaluator
+from src.mock_client import MockClient, lognormal_latency
+from src.wrapper import LimitedClient
+
+MODEL = "gemini-2.5-flash"
+WORDS = ("the", "ramen", "queue", "honestly", "rain", "broth", "crypto", "friend", "spicy", "waited",
+         "minutes", "overrated", "place", "finally", "tried", "street", "noodles", "again", "never", "cold")
+
+
+def _items(texts, videos, seed=0):
+    rng = random.Random(seed)
+    items = [BatchItem(f"text{i}", "text", " ".join(rng.choice(WORDS) for _ in range(150))) for i in range(texts)]
+    for i in range(videos):
+        video = io.BytesIO(os.urandom(64 * 1024))
+        video.name = f"clip{i}.mp4"
+        items.append(BatchItem(video.name, "video", video, "video/mp4"))
+    return items
+
+
+def run_workers(workers, texts, videos, rpm, latency, processing, workdir):
+    config_path = os.path.join(workdir, f"models_config_{workers}.json")
+    with open(config_path, "w") as f:
+        json.dump({"free": {MODEL: {"rpm": rpm, "tpm": 100000000, "rpd": 100000}}}, f)
+    client = LimitedClient(MockClient(latency=lognormal_latency(latency, 0.5), seed=workers),
+                           state_file=os.path.join(workdir, f"state_{workers}.json"), config_file=config_path)
+    evaluator = Evaluator(client, poll_interval=processing)
+    items = _items(texts, videos)
+    runner = BatchRunner(evaluator, MODEL, max_workers=workers)
+    start = time.perf_counter()
+    runner.start(items).wait()
+    wall_seconds = time.perf_counter() - start
+    bound_seconds = len(items) / rpm * 60
+    return {
+        "items": len(items),
+        "failed": runner.counts()["failed"],
+        "wall_seconds": wall_seconds,
+        "items_per_minute": len(items) / wall_seconds * 60,
+        "rpm_bound_seconds": bound_seconds,
+        "efficiency": bound_seconds / wall_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--texts", type=int, default=40)
+    parser.add_argument("--videos", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--processing", type=float, default=1.0)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {"texts": args.texts, "videos": args.videos, "rpm": args.rpm, "latency": args.latency,
+              "processing": args.processing}
+    workdir = tempfile.mkdtemp()
+    try:
+        report = {}
+        for workers in args.workers:
+            run = report[f"workers_{workers}"] = run_workers(workers, workdir=workdir, **params)
+            print(f"workers={workers:>2}: {run['wall_seconds']:6.1f} s for {run['items']} items "
+                  f"({run['items_per_minute']:.0f}/min, bound {run['rpm_bound_seconds']:.1f} s, "
+                  f"efficiency {run['efficiency']:.0%}, {run['failed']} failed)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if not args.no_record:
+        record("batch", {**params, "workers": args.workers}, report)
+
+
+if __name__ == "__main__":
+    main()
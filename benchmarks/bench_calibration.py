@@ -0,0 +1,117 @@
+"""
+Cost of a full calibration fit against an incremental update, and calibration quality.
+
+    python -m benchmarks.bench_calibration [--rows 1000000] [--new 10000] [--no-record]
+
+`--rows` labeled results from a synthetic overconfident judge (two models, two prompt
+versions) are stored and fitted from scratch; then `--new` more labeled results arrive
+and the engine is updated incrementally. The update reads only the new rows, so its time
+tracks `--new` rather than `--rows`. Expected calibration error (10 bins) of the raw and
+calibrated scores is measured on a held-out sample.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.results import record
+from src.calibration import CalibrationEngine, ai_scores
+from src.results_store import ResultsStore
+
+MODELS = ["gemini-2.5-flash", "gemini-2.5-flash-lite"]
+PROMPTS = ["judge-text@v1", "judge-text@v2"]
+
+
+def _judge(count, seed):
+    """(models, prompts, predictions, confidences, labels): verdicts more confident than they are right."""
+    rng = np.random.default_rng(seed)
+    truth = rng.uniform(0.02, 0.98, count)
+    labels = np.where(rng.random(count) < truth, "AI-Generated", "Human-Generated")
+    # Each model/prompt pair sharpens the true probability differently
+    group = rng.integers(0, len(MODELS) * len(PROMPTS), count)
+    sharpness = np.array([2.0, 3.0, 1.5, 2.5])[group]
+    score = 1.0 / (1.0 + np.exp(-sharpness * np.log(truth / (1.0 - truth))))
+    predictions = np.where(score >= 0.5, "AI-Generated", "Human-Generated")
+    confidences = np.round(np.where(score >= 0.5, score, 1.0 - score), 3)
+    models = np.array(MODELS)[group // len(PROMPTS)]
+    prompts = np.array(PROMPTS)[group % len(PROMPTS)]
+    return models, prompts, predictions, confidences, labels
+
+
+def _store(store, start, batch):
+    models, prompts, predictions, confidences, labels = batch
+    for i in range(len(labels)):
+        store.add({
+            "created_at": time.time(), "content_hash": f"{start + i:064x}", "content_type": "text",
+            "source": "judge", "model": models[i], "prediction": predictions[i],
+            "confidence": float(confidences[i]), "prompt": prompts[i],
+        })
+    store.flush()
+    store.add_labels((f"{start + i:064x}", labels[i]) for i in range(len(labels)))
+
+
+def expected_calibration_error(probabilities, outcomes, bins=10):
+    edges = np.minimum((probabilities * bins).astype(np.int64), bins - 1)
+    counts = np.bincount(edges, minlength=bins)
+    filled = counts > 0
+    mean_p = np.bincount(edges, weights=probabilities, minlength=bins)[filled] / counts[filled]
+    mean_y = np.bincount(edges, weights=outcomes, minlength=bins)[filled] / counts[filled]
+    return float((counts[filled] * np.abs(mean_p - mean_y)).sum() / len(probabilities))
+
+
+def run(rows, new):
+    workdir = tempfile.mkdtemp()
+    try:
+        store = ResultsStore(os.path.join(workdir, "results.db"), batch_size=5000)
+        engine = CalibrationEngine(os.path.join(workdir, "calibration.json"))
+        try:
+            _store(store, 0, _judge(rows, seed=0))
+            start = time.perf_counter()
+            engine.refit(store)
+            full_seconds = time.perf_counter() - start
+
+            _store(store, rows, _judge(new, seed=1))
+            start = time.perf_counter()
+            added = engine.update(store)
+            update_seconds = time.perf_counter() - start
+        finally:
+            store.close()
+
+        models, prompts, predictions, confidences, labels = _judge(100000, seed=2)
+        outcomes = (labels == "AI-Generated").astype(np.float64)
+        start = time.perf_counter()
+        calibrated = engine.calibrate_many(models, prompts, predictions, confidences)
+        apply_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "rows": rows,
+        "new": added,
+        "full_fit_ms": full_seconds * 1000,
+        "incremental_update_ms": update_seconds * 1000,
+        "apply_per_row_us": apply_seconds / len(labels) * 1e6,
+        "ece_raw": expected_calibration_error(ai_scores(predictions, confidences), outcomes),
+        "ece_calibrated": expected_calibration_error(calibrated, outcomes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--new", type=int, default=10000)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {"rows": args.rows, "new": args.new}
+    report = run(**params)
+    print(f"full fit over {report['rows']} labeled results: {report['full_fit_ms']:8.1f} ms")
+    print(f"incremental update with {report['new']} new:   {report['incremental_update_ms']:8.1f} ms")
+    print(f"apply: {report['apply_per_row_us']:.2f} us/row  ECE raw {report['ece_raw']:.4f} -> calibrated {report['ece_calibrated']:.4f}")
+    if not args.no_record:
+        record("calibration", params, report)
+
+
+if __name__ == "__main__":
+    main()
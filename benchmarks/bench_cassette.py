@@ -0,0 +1,136 @@
+"""
+Cassette size, open time and lookup latency, and an offline parser regression pass.
+
+    python -m benchmarks.bench_cassette [--records 100000] [--lookups 100000] [--no-record]
+    python -m benchmarks.bench_cassette --cassette judge.cassette
+
+Without `--cassette`, `--records` synthetic judge calls (varied verdict JSON, as MockClient
+returns) are written to a temporary cassette. Either way the cassette is opened, looked up
+at random by request key, and every recorded response is run through the current parser
+and aggregated by prediction, with no network: the parse rate and verdict mix of a real
+recorded corpus show how a parser change behaves on real outputs.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.results import record
+from src.cassette import Cassette, CassetteWriter, request_key
+from src.cpu_pool import parse_evaluation
+
+MODEL = "gemini-2.5-flash"
+PREDICTIONS = ("Human-Generated", "AI-Generated", "Hybrid")
+
+
+def _response(rng):
+    verdict = {
+        "origin_analysis": {
+            "prediction": rng.choice(PREDICTIONS),
+            "confidence_score": round(rng.uniform(0.5, 1.0), 2),
+            "text_artifacts": ["Personal anecdotes", "Emotional depth"][:rng.randint(0, 2)],
+            "video_artifacts": [],
+            "technical_reasoning": "The content shows organic complexity and unique creative choices." * rng.randint(1, 3),
+        },
+        "social_performance": {"virality_score": rng.randint(1, 10), "performance_drivers": ["Authenticity"],
+                               "strategic_reasoning": "Focuses on community building rather than mass virality."},
+        "distribution_strategy": {"target_audiences": ["History buffs"], "resonance_factor": "High within niche"},
+        "metadata": {"analysis_summary": "Analysis confirms the verdict."},
+    }
+    return f"```json\n{json.dumps(verdict, indent=2)}\n```"
+
+
+def write_synthetic(path, records, seed=0):
+    rng = random.Random(seed)
+    keys = []
+    with CassetteWriter(path, append=False) as writer:
+        for i in range(records):
+            key, request = request_key(MODEL, f"Synthetic post {i}")
+            text = _response(rng)
+            writer.record(key, {
+                "request": request, "text": text, "model_version": MODEL,
+                "usage": {"prompt_token_count": 1500, "candidates_token_count": len(text) // 4,
+                          "total_token_count": 1500 + len(text) // 4},
+                "latency": rng.lognormvariate(1.0, 0.5), "recorded_at": time.time(),
+            })
+            keys.append(key)
+    return keys
+
+
+def run(path, keys, lookups, seed=1):
+    start = time.perf_counter()
+    cassette = Cassette(path)
+    open_seconds = time.perf_counter() - start
+    try:
+        if not keys:
+            keys = [key for key, _ in cassette.raw_records()]
+        rng = random.Random(seed)
+        sample = [rng.choice(keys) for _ in range(lookups)] if keys else []
+        start = time.perf_counter()
+        for key in sample:
+            cassette.lookup(key)
+        lookup_seconds = time.perf_counter() - start
+
+        predictions = {}
+        failed = 0
+        start = time.perf_counter()
+        for recording in cassette:
+            structured = parse_evaluation(recording["text"])
+            if structured is None:
+                failed += 1
+                continue
+            prediction = structured["origin_analysis"]["prediction"]
+            predictions[prediction] = predictions.get(prediction, 0) + 1
+        parse_seconds = time.perf_counter() - start
+        count = len(cassette)
+    finally:
+        cassette.close()
+    return {
+        "records": count,
+        "size_mb": os.path.getsize(path) / 1e6,
+        "open_ms": open_seconds * 1000,
+        "lookup_us": lookup_seconds / max(1, len(sample)) * 1e6,
+        "replay_parse_per_second": count / parse_seconds if parse_seconds > 0 else None,
+        "parse_failures": failed,
+        "predictions": predictions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--cassette", help="Benchmark this recorded cassette instead of a synthetic one")
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        if args.cassette:
+            params = {"cassette": os.path.basename(args.cassette), "lookups": args.lookups}
+            path, keys, write_seconds = args.cassette, None, None
+        else:
+            params = {"records": args.records, "lookups": args.lookups}
+            path = os.path.join(workdir, "synthetic.cassette")
+            start = time.perf_counter()
+            keys = write_synthetic(path, args.records)
+            write_seconds = time.perf_counter() - start
+        report = run(path, keys, args.lookups)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if write_seconds is not None:
+        report["write_records_per_second"] = report["records"] / write_seconds
+        print(f"write: {report['write_records_per_second']:,.0f} records/s")
+    print(f"{report['records']} records, {report['size_mb']:.1f} MB: open {report['open_ms']:.2f} ms, "
+          f"lookup {report['lookup_us']:.1f} us")
+    print(f"replay + parse: {report['replay_parse_per_second']:,.0f} responses/s, "
+          f"{report['parse_failures']} unparseable, predictions {report['predictions']}")
+    if not args.no_record:
+        record("cassette", params, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Scaling of the CPU-bound evaluation stages across worker processes.
+
+    python -m benchmarks.bench_cpu_pool [--workers 0 1 2 4] [--texts 400] [--videos 16]
+                                        [--threads 8] [--no-record]
+
+A batch of mixed text and video evaluations is run through Evaluator on `--threads`
+threads against a MockClient without latency or limiter, so the wall time is the local
+work: SimHash and JSON parsing for texts (always inline), hashing and fingerprinting for
+videos (fingerprints decoded by the workers). workers=0 runs every stage inline, i.e.
+bound by one GIL; the speedup of each worker count is relative to that, and cannot exceed the cores.
+"""
+import argparse
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.results import record
+from src.cpu_pool import CpuPool
+from src.dedup import NearDuplicateIndex
+from src.evaluator import Evaluator
+from src.mock_client import MockClient
+from src.video_fingerprint import VideoFingerprintIndex, cv2
+
+MODEL = "gemini-2.5-flash"
+WORDS = ("the", "ramen", "queue", "honestly", "rain", "broth", "crypto", "friend", "spicy", "waited",
+         "minutes", "overrated", "place", "finally", "tried", "street", "noodles", "again", "never", "cold")
+
+
+def _texts(count, seed=0):
+    # Distinct random texts, so none is answered from the near-duplicate index
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(200)) for _ in range(count)]
+
+
+def _videos(count, workdir, frames=60, size=(320, 240), seed=0):
+    """Noise clips (incompressible, a few MB each) as named in-memory files, like uploads."""
+    rng = np.random.default_rng(seed)
+    videos = []
+    for i in range(count):
+        path = os.path.join(workdir, f"clip{i}.mp4")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, size)
+        for _ in range(frames):
+            writer.write(rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8))
+        writer.release()
+        with open(path, "rb") as f:
+            video = io.BytesIO(f.read())
+        video.name = os.path.basename(path)
+        videos.append(video)
+    return videos
+
+
+def run_workers(workers, texts, videos, threads, workdir):
+    index_dir = tempfile.mkdtemp(dir=workdir)
+    text_index = NearDuplicateIndex(os.path.join(index_dir, "text"))
+    video_index = VideoFingerprintIndex(os.path.join(index_dir, "video"))
+    pool = CpuPool(max_workers=workers)
+    # A long response gives parsing realistic work
+    evaluator = Evaluator(MockClient(padding_tokens=400), near_duplicate_index=lambda h: text_index,
+                          video_fingerprint_index=lambda h: video_index, poll_interval=0, cpu_pool=pool)
+    jobs = [lambda t=t: evaluator.evaluate_text(t, MODEL) for t in texts]
+    jobs += [lambda v=v: evaluator.evaluate_video(v, MODEL, mime_type="video/mp4") for v in videos]
+    random.Random(1).shuffle(jobs)
+    try:
+        # Start the worker processes outside the measurement
+        pool.video_digest(videos[0], suffix=".mp4")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda job: job(), jobs))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+    return {"seconds": elapsed, "evaluations_per_second": len(jobs) / elapsed}
+
+
+def run(workers=(0, 1, 2, 4), texts=400, videos=16, threads=8):
+    if cv2 is None:
+        raise SystemExit("OpenCV (opencv-python-headless) is required for the video part of the batch")
+    workdir = tempfile.mkdtemp()
+    try:
+        text_batch = _texts(texts)
+        video_batch = _videos(videos, workdir)
+        report = {f"workers_{n}": run_workers(n, text_batch, video_batch, threads, workdir) for n in workers}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    baseline = report[f"workers_{workers[0]}"]["seconds"]
+    for result in report.values():
+        result["speedup"] = baseline / result["seconds"]
+    report["cpu_count"] = os.cpu_count()
+    report["video_mb"] = sum(len(v.getbuffer()) for v in video_batch) / len(video_batch) / 1e6
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--texts", type=int, default=400)
+    parser.add_argument("--videos", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {"workers": args.workers, "texts": args.texts, "videos": args.videos, "threads": args.threads}
+    report = run(**params)
+    print(f"{os.cpu_count()} cores, {args.texts} texts + {args.videos} videos ({report['video_mb']:.1f} MB each)")
+    for n in args.workers:
+        r = report[f"workers_{n}"]
+        print(f"workers {n}: {r['seconds']:6.2f} s  {r['evaluations_per_second']:7.1f} evals/s  speedup {r['speedup']:.2f}x")
+    if not args.no_record:
+        record("cpu_pool", params, report)
+
+
+if __name__ == "__main__":
+    main()
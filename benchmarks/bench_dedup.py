@@ -0,0 +1,108 @@
+"""
+Measures insert and query throughput of the near-duplicate text index.
+
+    python -m benchmarks.bench_dedup [--docs 1000000] [--queries 2000]
+
+Stored documents use random 64-bit hashes so large indexes build quickly; SimHash
+throughput on real text is measured separately on the pre-screen sample.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.results import record
+from src.dedup import NearDuplicateIndex, simhash
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "prescreen_sample.jsonl")
+
+
+def _percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def run(docs, queries, batch_size=50000, seed=0):
+    rng = np.random.default_rng(seed)
+    hashes = rng.integers(0, 2**63, size=docs, dtype=np.int64).astype(np.uint64)
+    verdict = {"raw_text": "{}", "model": "gemini-2.5-flash"}
+
+    with open(SAMPLE, 'r') as f:
+        texts = [json.loads(line)["text"] for line in f if line.strip()]
+    start = time.perf_counter()
+    rounds = max(1, 2000 // len(texts))
+    for _ in range(rounds):
+        for text in texts:
+            simhash(text)
+    simhash_rate = rounds * len(texts) / (time.perf_counter() - start)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        index = NearDuplicateIndex(os.path.join(workdir, "index"))
+        start = time.perf_counter()
+        for i in range(0, docs, batch_size):
+            index.add_many([(int(h), verdict) for h in hashes[i:i + batch_size]])
+        insert_seconds = time.perf_counter() - start
+
+        # Fresh instance: measure lazy load plus queries against the on-disk index
+        index = NearDuplicateIndex(os.path.join(workdir, "index"))
+        start = time.perf_counter()
+        len(index)
+        load_seconds = time.perf_counter() - start
+
+        # Half the queries are stored hashes with 5 flipped bits, half are random misses
+        flips = np.zeros(queries, dtype=np.uint64)
+        for _ in range(5):
+            flips |= np.uint64(1) << rng.integers(0, 64, size=queries).astype(np.uint64)
+        hits = hashes[rng.integers(0, docs, size=queries)] ^ flips
+        misses = rng.integers(0, 2**63, size=queries, dtype=np.int64).astype(np.uint64)
+
+        timings = {}
+        found = {}
+        for label, probe in (("near_duplicate", hits), ("miss", misses)):
+            samples = []
+            matched = 0
+            for value in probe:
+                t0 = time.perf_counter()
+                matched += index.lookup_hash(int(value)) is not None
+                samples.append(time.perf_counter() - t0)
+            timings[label] = samples
+            found[label] = matched
+    finally:
+        shutil.rmtree(workdir)
+
+    return {
+        "docs": docs,
+        "simhash_per_s": simhash_rate,
+        "insert_per_s": docs / insert_seconds,
+        "load_s": load_seconds,
+        "hit_rate": found["near_duplicate"] / queries,
+        "false_hit_rate": found["miss"] / queries,
+        "query_p50_ms": _percentile_ms(timings["near_duplicate"] + timings["miss"], 50),
+        "query_p99_ms": _percentile_ms(timings["near_duplicate"] + timings["miss"], 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    report = run(args.docs, args.queries)
+    print(f"Stored documents:  {report['docs']}")
+    print(f"SimHash:           {report['simhash_per_s']:,.0f} texts/s")
+    print(f"Insert:            {report['insert_per_s']:,.0f} docs/s")
+    print(f"Lazy load:         {report['load_s'] * 1000:.1f} ms")
+    print(f"Query p50 / p99:   {report['query_p50_ms']:.3f} / {report['query_p99_ms']:.3f} ms")
+    print(f"Hit rate (5-bit):  {report['hit_rate']:.1%}  false hits: {report['false_hit_rate']:.1%}")
+
+    if not args.no_record:
+        record("dedup", {k: v for k, v in vars(args).items() if k != "no_record"}, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Load test of LimitedClient against a MockClient with simulated latency, faults and quota.
+
+    python -m benchmarks.bench_load [--mode threads|processes|async] [--workers 8] [--requests 200]
+                                    [--latency-ms 200] [--sigma 0.5] [--rpm 600] [--tpm 4000000]
+                                    [--rate-limit-rate 0] [--error-rate 0] [--seed 0] [--no-record]
+                                    [--adaptive --start-rpm 60]
+
+The limiter and the mock server enforce the same quota, so limiter sleeps show up as
+queueing and any 429 that still reaches the server means the limiter under-throttled.
+In process mode each worker has its own mock server; the limiter state file is shared.
+With --adaptive the limiter starts from --start-rpm (may be above or below the server's
+--rpm, up to a ceiling of 4x) and learns the real quota from successes and 429s.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+from benchmarks.results import record
+from src.mock_client import MockClient, lognormal_latency
+from src.rate_limiter import read_state
+from src.wrapper import LimitedClient
+
+MODEL = "gemini-2.5-flash"
+PROMPT = "Analyze the following text and determine if it was written by an AI or a human. " * 4
+
+
+def _make_client(options, state_file, config_file, seed_offset=0):
+    latency = lognormal_latency(options["latency_ms"] / 1000, options["sigma"]) if options["latency_ms"] else None
+    mock = MockClient(
+        latency=latency,
+        error_rate=options["error_rate"],
+        rate_limit_rate=options["rate_limit_rate"],
+        quota={MODEL: options["quota"]},
+        seed=options["seed"] + seed_offset,
+    )
+    return mock, LimitedClient(mock, state_file=state_file, config_file=config_file, adaptive=options["adaptive"])
+
+
+def _one_request(client, index):
+    start = time.perf_counter()
+    try:
+        response = client.models.generate_content(model=MODEL, contents=f"{PROMPT} #{index}")
+        elapsed = time.perf_counter() - start
+        return {"ok": True, "latency": elapsed, "overhead": elapsed - response.latency_seconds,
+                "tokens": response.usage_metadata.total_token_count}
+    except Exception as e:
+        return {"ok": False, "latency": time.perf_counter() - start, "error": getattr(e, "code", type(e).__name__)}
+
+
+def _process_worker(args):
+    options, state_file, config_file, worker, indices = args
+    _, client = _make_client(options, state_file, config_file, seed_offset=worker)
+    return [_one_request(client, i) for i in indices]
+
+
+def run(mode="threads", workers=8, requests=200, latency_ms=200.0, sigma=0.5, rpm=600, tpm=4_000_000,
+        rpd=1_000_000, rate_limit_rate=0.0, error_rate=0.0, seed=0, adaptive=False, start_rpm=None):
+    options = {
+        "latency_ms": latency_ms, "sigma": sigma, "error_rate": error_rate,
+        "rate_limit_rate": rate_limit_rate, "seed": seed, "adaptive": adaptive,
+        "quota": {"rpm": rpm, "tpm": tpm, "rpd": rpd},
+    }
+    configured = {**options["quota"], "rpm": start_rpm or rpm}
+    workdir = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(workdir, "models_config.json")
+        state_file = os.path.join(workdir, "rate_limit_state.json")
+        with open(config_file, 'w') as f:
+            json.dump({
+                "free": {MODEL: configured},
+                "ceiling": {MODEL: {**configured, "rpm": configured["rpm"] * 4}},
+            }, f)
+
+        start = time.perf_counter()
+        if mode == "processes":
+            chunks = [list(range(w, requests, workers)) for w in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = [r for chunk in pool.map(
+                    _process_worker, [(options, state_file, config_file, w, c) for w, c in enumerate(chunks)]
+                ) for r in chunk]
+        else:
+            _, client = _make_client(options, state_file, config_file)
+            if mode == "threads":
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(lambda i: _one_request(client, i), range(requests)))
+            elif mode == "async":
+                async def drive():
+                    semaphore = asyncio.Semaphore(workers)
+
+                    async def one(i):
+                        async with semaphore:
+                            return await asyncio.to_thread(_one_request, client, i)
+                    return await asyncio.gather(*(one(i) for i in range(requests)))
+                results = asyncio.run(drive())
+            else:
+                raise ValueError(f"Unknown mode {mode!r}")
+        wall = time.perf_counter() - start
+        learned = read_state(state_file).get("_learned", {}).get(MODEL)
+    finally:
+        shutil.rmtree(workdir)
+
+    ok = [r for r in results if r["ok"]]
+    latencies = np.array([r["latency"] for r in ok]) if ok else np.zeros(1)
+    overhead = np.array([r["overhead"] for r in ok]) if ok else np.zeros(1)
+    errors = {}
+    for r in results:
+        if not r["ok"]:
+            errors[str(r["error"])] = errors.get(str(r["error"]), 0) + 1
+
+    # Share of the RPM quota used over the minute windows the run spanned
+    quota_windows = max(1.0, wall / 60)
+    return {
+        "requests": requests,
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "errors": errors,
+        "wall_s": wall,
+        "throughput_rps": len(ok) / wall,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "rpm_utilization": len(ok) / (rpm * quota_windows),
+        "tokens_per_s": sum(r["tokens"] for r in ok) / wall,
+        "overhead_p50_ms": float(np.percentile(overhead, 50)) * 1000,
+        "overhead_p99_ms": float(np.percentile(overhead, 99)) * 1000,
+        "learned_rpm": learned["rpm"] if learned else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["threads", "processes", "async"], default="threads")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=4_000_000)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--adaptive", action="store_true", help="Learn limits from observed 429s (AIMD)")
+    parser.add_argument("--start-rpm", type=int, default=None, help="Limiter's configured RPM (default: --rpm)")
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {k: v for k, v in vars(args).items() if k != "no_record"}
+    report = run(**params)
+    print(f"Mode: {args.mode}, workers: {args.workers}, requests: {args.requests}")
+    print(f"Succeeded / failed:   {report['succeeded']} / {report['failed']} {report['errors'] or ''}")
+    print(f"Wall time:            {report['wall_s']:.2f} s")
+    print(f"Throughput:           {report['throughput_rps']:.1f} req/s ({report['tokens_per_s']:,.0f} tokens/s)")
+    print(f"Latency p50 / p99:    {report['p50_ms']:.1f} / {report['p99_ms']:.1f} ms")
+    print(f"RPM utilization:      {report['rpm_utilization']:.1%}")
+    print(f"Limiter overhead p50 / p99: {report['overhead_p50_ms']:.2f} / {report['overhead_p99_ms']:.2f} ms")
+    if report["learned_rpm"] is not None:
+        print(f"Learned RPM:          {report['learned_rpm']:.1f} (server quota {args.rpm})")
+    if not args.no_record:
+        record("load", params, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Reports how many judge calls the local stylometric pre-screen avoids on a labeled sample.
+
+    python -m benchmarks.bench_prescreen [--sample PATH] [--lower 0.2] [--upper 0.8] [--fit]
+
+The sample is JSONL with one {"label": "AI-Generated" | "Human-Generated", "text": ...} per line.
+The shipped weights were fitted on the default sample, so their numbers on it are in-sample.
+The held-out numbers come from leave-one-out cross-validation: each text is scored by
+weights fitted with fit_weights() on all the other texts. `--fit` prints the weights fitted
+on the whole sample, for src/prescreen.py.
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.results import record
+from src.prescreen import extract_features, fit_weights, prescreen_text
+
+DEFAULT_SAMPLE = os.path.join(os.path.dirname(__file__), "data", "prescreen_sample.jsonl")
+
+
+def _screen(rows, lower, upper, models):
+    avoided = 0
+    correct = 0
+    for row, model in zip(rows, models):
+        result = prescreen_text(row["text"], lower=lower, upper=upper, model=model)
+        if result.escalate:
+            continue
+        avoided += 1
+        if result.origin_analysis["prediction"] == row["label"]:
+            correct += 1
+    return {
+        "avoided_calls": avoided,
+        "avoided_fraction": avoided / len(rows) if rows else 0.0,
+        "provisional_accuracy": correct / avoided if avoided else None,
+    }
+
+
+def run(sample_path, lower, upper):
+    with open(sample_path, 'r') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    start = time.perf_counter()
+    in_sample = _screen(rows, lower, upper, [None] * len(rows))
+    elapsed = time.perf_counter() - start
+
+    features = [extract_features(row["text"]) for row in rows]
+    labels = [row["label"] == "AI-Generated" for row in rows]
+    held_out = [
+        fit_weights(features[:i] + features[i + 1:], labels[:i] + labels[i + 1:])
+        for i in range(len(rows))
+    ]
+    return {
+        "samples": len(rows),
+        "held_out": _screen(rows, lower, upper, held_out),
+        "in_sample": in_sample,
+        "ms_per_text": elapsed * 1000 / len(rows) if rows else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE)
+    parser.add_argument("--lower", type=float, default=0.2)
+    parser.add_argument("--upper", type=float, default=0.8)
+    parser.add_argument("--fit", action="store_true", help="Print weights fitted on the whole sample")
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    report = run(args.sample, args.lower, args.upper)
+    print(f"Samples:              {report['samples']}")
+    for name, label in (("held_out", "held-out (leave-one-out)"), ("in_sample", "in-sample (shipped weights)")):
+        screen = report[name]
+        print(f"{label}:")
+        print(f"  API calls avoided:    {screen['avoided_calls']} ({screen['avoided_fraction']:.1%})")
+        if screen["provisional_accuracy"] is not None:
+            print(f"  Provisional accuracy: {screen['provisional_accuracy']:.1%}")
+    print(f"Pre-screen latency:   {report['ms_per_text']:.3f} ms/text")
+
+    if args.fit:
+        with open(args.sample, 'r') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        weights, bias = fit_weights([extract_features(row["text"]) for row in rows],
+                                    [row["label"] == "AI-Generated" for row in rows])
+        print("FEATURE_WEIGHTS = {")
+        for name, (weight, centre) in weights.items():
+            print(f'    "{name}": ({weight:.4g}, {centre:.4g}),')
+        print("}")
+        print(f"FEATURE_BIAS = {bias:.4g}")
+
+    if not args.no_record:
+        record("prescreen", {k: v for k, v in vars(args).items() if k not in ("no_record", "fit")}, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares the modality-specific judge prompts with the combined text+video prompt.
+
+    python -m benchmarks.bench_prompts [--tier free] [--rounds 20000] [--no-record]
+
+For the labeled text sample and a video request it reports:
+- prompt tokens per request with each prompt, and the share saved
+- requests per minute the tier's TPM allows with each prompt (RPM aside)
+- time to build a request: the former inline f-string plus a token estimate over the
+  whole prompt, against rendering the compiled template with its precomputed count
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.results import record
+from src.mock_client import MockFile
+from src.prompts import get_prompt
+from src.rate_limiter import load_config
+from src.tokens import estimate_tokens
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "prescreen_sample.jsonl")
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models_config.json")
+
+
+def _build_seconds(build, texts, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        build(texts[i % len(texts)])
+    return (time.perf_counter() - start) / rounds
+
+
+def run(tier="free", rounds=20000):
+    with open(SAMPLE, 'r') as f:
+        texts = [json.loads(line)["text"] for line in f if line.strip()]
+    video = MockFile("files/sample.mp4", "mock://files/sample.mp4", "video/mp4")
+    tpm = min(limits["tpm"] for limits in load_config(CONFIG)[tier].values())
+    combined = get_prompt("combined")
+
+    report = {}
+    for modality in ("text", "video"):
+        prompt = get_prompt(modality)
+        if modality == "text":
+            combined_tokens = sum(combined.estimate_tokens(text) for text in texts) / len(texts)
+            specific_tokens = sum(prompt.estimate_tokens(text) for text in texts) / len(texts)
+        else:
+            combined_tokens = combined.system_tokens + estimate_tokens([prompt.render(), video])
+            specific_tokens = prompt.system_tokens + estimate_tokens([prompt.render(), video])
+        report[modality] = {
+            "combined_tokens": combined_tokens,
+            "specific_tokens": specific_tokens,
+            "saved_pct": (1 - specific_tokens / combined_tokens) * 100,
+            "combined_requests_per_min": tpm / combined_tokens,
+            "specific_requests_per_min": tpm / specific_tokens,
+        }
+
+    text_prompt = get_prompt("text")
+
+    def inline(text):
+        user = f"Analyze the following text and determine if it was written by an AI or a human. Return your response ONLY in the specified JSON format:\n\n{text}"
+        return user, estimate_tokens(user, system_instruction=combined.system)
+
+    def compiled(text):
+        return text_prompt.render(text), text_prompt.estimate_tokens(text)
+
+    report["build_us"] = {
+        "inline": _build_seconds(inline, texts, rounds) * 1e6,
+        "compiled": _build_seconds(compiled, texts, rounds) * 1e6,
+    }
+    report["prompts"] = {modality: get_prompt(modality).key for modality in ("text", "video", "combined")}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tier", default="free")
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {"tier": args.tier, "rounds": args.rounds}
+    report = run(**params)
+    for modality in ("text", "video"):
+        r = report[modality]
+        print(f"{modality:<6} prompt tokens: {r['combined_tokens']:.0f} combined -> {r['specific_tokens']:.0f} "
+              f"({r['saved_pct']:.1f}% saved); requests/min under TPM: "
+              f"{r['combined_requests_per_min']:.0f} -> {r['specific_requests_per_min']:.0f}")
+    print(f"Request build: {report['build_us']['inline']:.1f} us inline -> {report['build_us']['compiled']:.1f} us compiled")
+    if not args.no_record:
+        record("prompts", params, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Measures write throughput, filtered query latency and aggregate latency of the results store.
+
+    python -m benchmarks.bench_results_store [--rows 1000000]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.results import record
+from src.results_store import ResultsStore
+
+MODELS = ["gemini-2.5-flash", "gemini-2.5-flash-lite"]
+PREDICTIONS = ["AI-Generated", "Human-Generated", "Hybrid"]
+
+
+def _rows(count, seed=0):
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    created = now - rng.uniform(0, 30 * 86400, count)
+    models = rng.integers(0, len(MODELS), count)
+    predictions = rng.integers(0, len(PREDICTIONS), count)
+    confidence = rng.uniform(0, 1, count)
+    prompt = rng.integers(300, 2000, count)
+    candidates = rng.integers(200, 600, count)
+    for i in range(count):
+        yield {
+            "created_at": float(created[i]),
+            "content_hash": f"{i:064x}",
+            "content_type": "text",
+            "source": "judge",
+            "model": MODELS[models[i]],
+            "prediction": PREDICTIONS[predictions[i]],
+            "confidence": float(confidence[i]),
+            "virality": 5.0,
+            "prompt_tokens": int(prompt[i]),
+            "candidates_tokens": int(candidates[i]),
+            "total_tokens": int(prompt[i] + candidates[i]),
+            "latency_ms": 1200.0,
+            "raw_text": None,
+        }
+
+
+def _time(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return min(samples) * 1000
+
+
+def run(rows):
+    workdir = tempfile.mkdtemp()
+    try:
+        store = ResultsStore(os.path.join(workdir, "results.db"), batch_size=5000)
+
+        start = time.perf_counter()
+        add_seconds = 0.0
+        for row in _rows(rows):
+            t0 = time.perf_counter()
+            store.add(row)
+            add_seconds += time.perf_counter() - t0
+        store.flush()
+        total_seconds = time.perf_counter() - start
+
+        since = time.time() - 86400
+        report = {
+            "rows": rows,
+            "add_us": add_seconds / rows * 1e6,
+            "write_per_s": rows / total_seconds,
+            "recent_filtered_ms": _time(lambda: store.query(model=MODELS[0], prediction=PREDICTIONS[0], since=since, limit=100)),
+            "hash_lookup_ms": _time(lambda: store.latest_for_hash(f"{rows // 2:064x}")),
+            "count_day_ms": _time(lambda: store.count(since=since)),
+            "aggregate_model_ms": _time(lambda: store.aggregate(group_by="model"), repeat=2),
+            "aggregate_day_ms": _time(lambda: store.aggregate(group_by="prediction", since=since)),
+        }
+        store.close()
+        return report
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    report = run(args.rows)
+    print(f"Rows:                       {report['rows']}")
+    print(f"add() cost on eval path:    {report['add_us']:.2f} us")
+    print(f"Batched write throughput:   {report['write_per_s']:,.0f} rows/s")
+    print(f"Filtered query (last day):  {report['recent_filtered_ms']:.2f} ms")
+    print(f"Content hash lookup:        {report['hash_lookup_ms']:.2f} ms")
+    print(f"Count (last day):           {report['count_day_ms']:.2f} ms")
+    print(f"Aggregate by model (all):   {report['aggregate_model_ms']:.2f} ms")
+    print(f"Aggregate by prediction 1d: {report['aggregate_day_ms']:.2f} ms")
+
+    if not args.no_record:
+        record("results_store", {k: v for k, v in vars(args).items() if k != "no_record"}, report)
+
+
+if __name__ == "__main__":
+    main()
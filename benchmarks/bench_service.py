@@ -0,0 +1,131 @@
+"""
+Load test of the HTTP evaluation service (src/service.py) backed by MockClient.
+
+    python -m benchmarks.bench_service [--workers 1 2 4] [--concurrency 64] [--requests 400]
+                                       [--latency-ms 200] [--threads 16] [--no-record]
+
+For each worker count the service is started with uvicorn in a scratch directory (its
+own limiter state, jobs and results databases, and a config with limits well above the
+offered load), and `--requests` distinct text evaluations are sent with `?wait=true` from
+`--concurrency` concurrent connections. Reports throughput and p50/p99 request latency;
+with the mock's simulated latency the ideal throughput is workers * threads / latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.results import record
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL = "gemini-2.5-flash"
+WORDS = ("the", "ramen", "queue", "honestly", "rain", "broth", "crypto", "friend", "spicy", "waited",
+         "minutes", "overrated", "place", "finally", "tried", "street", "noodles", "again", "never", "cold")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _texts(count, seed=0):
+    # Distinct random texts, so no request is answered from the near-duplicate index
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(60)) + f" #{i}" for i in range(count)]
+
+
+async def _load(base_url, texts, concurrency):
+    latencies, failures = [], 0
+    queue = list(texts)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits,
+                                 headers={"X-Goog-Api-Key": "bench-key"}) as http:
+        async def worker():
+            nonlocal failures
+            while queue:
+                text = queue.pop()
+                start = time.perf_counter()
+                response = await http.post("/v1/evaluations/text", params={"wait": "true"},
+                                           json={"text": text, "model": MODEL})
+                latencies.append(time.perf_counter() - start)
+                failures += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, failures, elapsed
+
+
+def run_workers(workers, concurrency, requests, latency_ms, threads):
+    workdir = tempfile.mkdtemp()
+    port = _free_port()
+    with open(os.path.join(workdir, "models_config.json"), 'w') as f:
+        json.dump({"free": {MODEL: {"rpm": 1000000, "tpm": 10 ** 10, "rpd": 10 ** 8}}}, f)
+    env = dict(os.environ, PYTHONPATH=ROOT, LLM_JUDGE_MOCK="1",
+               LLM_JUDGE_MOCK_LATENCY=str(latency_ms / 1000), LLM_JUDGE_SERVICE_THREADS=str(threads))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.service", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                if httpx.get(base_url + "/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError("Service did not start")
+            time.sleep(0.2)
+        latencies, failures, elapsed = asyncio.run(_load(base_url, _texts(requests), concurrency))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "throughput_rps": requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "failures": failures,
+    }
+
+
+def run(workers=(1, 2, 4), concurrency=64, requests=400, latency_ms=200, threads=16):
+    return {f"workers_{n}": run_workers(n, concurrency, requests, latency_ms, threads) for n in workers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--threads", type=int, default=16, help="Evaluation threads per worker")
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {"workers": args.workers, "concurrency": args.concurrency, "requests": args.requests,
+              "latency_ms": args.latency_ms, "threads": args.threads}
+    report = run(**params)
+    for name, r in report.items():
+        print(f"{name:<10} {r['throughput_rps']:7.1f} req/s  p50 {r['p50_ms']:7.1f} ms  "
+              f"p99 {r['p99_ms']:7.1f} ms  failures {r['failures']}")
+    if not args.no_record:
+        record("service", params, report)
+
+
+if __name__ == "__main__":
+    main()
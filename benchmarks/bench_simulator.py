@@ -0,0 +1,56 @@
+"""
+Speed of the quota simulator: simulated requests per wall-clock second.
+
+    python -m benchmarks.bench_simulator [--requests 1000000] [--tier tier1] [--models 2] [--no-record]
+
+A synthetic backlog of `--requests` evaluations, spread over `--models` models of the tier,
+is run through the real RateLimiter on a virtual clock. Reports wall time, simulated
+requests per second and how many times faster than real time the forecast runs.
+"""
+import argparse
+import time
+
+from benchmarks.results import record
+from src.rate_limiter import load_config
+from src.simulator import Simulator, synthetic_workload
+
+
+def run(requests, tier, models):
+    names = sorted(load_config("models_config.json")[tier])[:models]
+    workload = []
+    for i, model in enumerate(names):
+        workload += synthetic_workload(requests // len(names), model, seed=i)
+    simulator = Simulator(tier=tier)
+    start = time.perf_counter()
+    report = simulator.run(workload)
+    wall_seconds = time.perf_counter() - start
+    return {
+        "models": names,
+        "requests": len(workload),
+        "wall_seconds": wall_seconds,
+        "simulated_requests_per_second": len(workload) / wall_seconds,
+        "simulated_days": report["completion_seconds"] / 86400,
+        "speedup_over_real_time": report["completion_seconds"] / wall_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000000)
+    parser.add_argument("--tier", default="tier1")
+    parser.add_argument("--models", type=int, default=2)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {"requests": args.requests, "tier": args.tier, "models": args.models}
+    report = run(**params)
+    print(f"{report['requests']} requests over {', '.join(report['models'])}: "
+          f"{report['simulated_days']:.1f} simulated days in {report['wall_seconds']:.1f} s")
+    print(f"{report['simulated_requests_per_second']:,.0f} requests/s, "
+          f"{report['speedup_over_real_time']:,.0f}x faster than real time")
+    if not args.no_record:
+        record("simulator", params, report)
+
+
+if __name__ == "__main__":
+    main()
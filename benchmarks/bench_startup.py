@@ -0,0 +1,88 @@
+"""
+Cold-start audit of the Streamlit app based on `python -X importtime`.
+
+    python -m benchmarks.bench_startup [--runs 5] [--top 10] [--no-record]
+
+Each run imports src.app in a fresh interpreter, which executes the script up to the API
+key screen (Streamlit's bare mode), and parses the importtime report. Also reported:
+- deferred_ms: what the modules now imported on first use would add to the cold start
+- warm_up: time per warm-up step, i.e. the work moved off the first evaluation
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks.results import record
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules the app imports lazily; importing them eagerly is the pre-deferral baseline
+DEFERRED_MODULES = [
+    "google.genai", "google.genai.types", "src.mock_client", "src.parser",
+    "src.prescreen", "src.dedup", "src.video_fingerprint",
+]
+
+
+def importtime(statement):
+    """Runs `statement` in a fresh interpreter; returns ({module: cumulative µs}, wall seconds)."""
+    code = f"import time; _t = time.perf_counter(); {statement}; print(time.perf_counter() - _t)"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=ROOT, check=True
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative_us)
+    return modules, float(proc.stdout.strip().splitlines()[-1])
+
+
+def run(runs=5, top=10):
+    app_runs = [importtime("import src.app") for _ in range(runs)]
+    deferred_runs = [importtime("import " + ", ".join(DEFERRED_MODULES)) for _ in range(runs)]
+    warm_up = json.loads(subprocess.run(
+        [sys.executable, "-c", "import json; from src.warmup import warm_up; print(json.dumps(warm_up()))"],
+        capture_output=True, text=True, cwd=ROOT, check=True
+    ).stdout.strip().splitlines()[-1])
+
+    last_modules = app_runs[-1][0]
+    slowest = sorted(
+        ((name, us) for name, us in last_modules.items() if name.split(".")[0] == name or name.startswith("src.")),
+        key=lambda item: -item[1]
+    )[:top]
+    return {
+        "app_import_ms": float(np.median([wall for _, wall in app_runs])) * 1000,
+        "streamlit_ms": float(np.median([m.get("streamlit", 0) for m, _ in app_runs])) / 1000,
+        "deferred_ms": float(np.median([wall for _, wall in deferred_runs])) * 1000,
+        "warm_up_ms": {name: seconds * 1000 for name, seconds in warm_up.items()},
+        "slowest_modules_ms": {name: us / 1000 for name, us in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--no-record", action="store_true", help="Do not append to benchmarks/results/history.jsonl")
+    args = parser.parse_args()
+
+    params = {"runs": args.runs, "top": args.top}
+    report = run(**params)
+    print(f"App import (cold start, median): {report['app_import_ms']:.0f} ms "
+          f"(streamlit itself {report['streamlit_ms']:.0f} ms)")
+    print(f"Deferred modules, if eager:      {report['deferred_ms']:.0f} ms")
+    print("Warm-up steps:                   " + ", ".join(f"{k} {v:.0f} ms" for k, v in report["warm_up_ms"].items()))
+    print("Slowest top-level imports:")
+    for name, ms in report["slowest_modules_ms"].items():
+        print(f"  {name:<32} {ms:8.1f} ms")
+    if not args.no_record:
+        record("startup", params, report)
+
+
+if __name__ == "__main__":
+    main()
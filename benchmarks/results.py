@@ -0,0 +1,84 @@
+"""
+Benchmark result history, keyed by git commit so regressions show up across commits.
+
+    python -m benchmarks.results [benchmark-name]
+
+Each benchmark calls record() with its report; this module's CLI prints the latest
+run of every benchmark next to the previous one with the relative change.
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "results", "history.jsonl")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(name, params, report, path=HISTORY_FILE):
+    """Appends one benchmark run to the history file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {
+        "benchmark": name,
+        "commit": _git_commit(),
+        "timestamp": time.time(),
+        "params": params,
+        "report": report,
+    }
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def load(name=None, path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return [e for e in entries if name is None or e["benchmark"] == name]
+
+
+def compare(entries):
+    """Pairs the latest run of each benchmark/params combination with the one before it."""
+    runs = {}
+    for entry in entries:
+        key = (entry["benchmark"], json.dumps(entry["params"], sort_keys=True))
+        runs.setdefault(key, []).append(entry)
+    pairs = []
+    for (name, _), history in sorted(runs.items()):
+        latest = history[-1]
+        previous = history[-2] if len(history) > 1 else None
+        pairs.append((name, latest, previous))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("benchmark", nargs="?")
+    args = parser.parse_args()
+
+    for name, latest, previous in compare(load(args.benchmark)):
+        base = f"vs {previous['commit']}" if previous else "(first run)"
+        print(f"{name} @ {latest['commit']} {base}  params={latest['params']}")
+        for metric, value in latest["report"].items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            line = f"  {metric:<28} {value:>14.4f}"
+            old = previous["report"].get(metric) if previous else None
+            if isinstance(old, (int, float)) and old:
+                line += f"  ({(value - old) / abs(old):+.1%})"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
 import streamlit as st
 import os
-import json
-import time
+import uuid
 from dotenv import load_dotenv
-from google import genai
-from google.genai.types import GenerateContentConfig
-from src.mock_client import MockClient
 from src.wrapper import LimitedClient
-from src.parser import extract_json, sanitize_evaluation
-from src.prompts import system_prompt
+from src.rate_limiter import key_fingerprint
+from src.client_pool import ClientPool
+from src.results_store import ResultsStore
+from src.evaluator import MAX_VIDEO_BYTES, VIDEO_EXTENSIONS, Evaluator, truncate_text
+from src.cpu_pool import CpuPool
+from src.metrics import METRICS, configure_from_env
+from src.prompts import followup_prompt, get_prompt
+from src.batch import DEFAULT_WORKERS, BatchRunner, file_items, parse_text_list
+from src.warmup import start_warm_up
+from src.chat_history import ChatHistory, file_content, text_content
+# The SDK, parser, numpy-based indexes and OpenCV are imported where first used
+# (and preloaded by the warm-up thread), keeping them off the API key screen's cold start
 
 
 # Load environment variables
@@ -18,10 +24,79 @@ st.set_page_config(page_title="LLM Judge - AI vs Human", layout="wide")
 
 st.title("⚖️ LLM Judge: AI vs Human")
 
+@st.cache_resource
+def start_metrics():
+    # Once per process: enables metrics and the /metrics endpoint when LLM_JUDGE_METRICS=1
+    return configure_from_env()
+
+start_metrics()
+
+@st.cache_resource
+def warm_up():
+    # Once per process, in the background: SDK import, a first client, limits config, parser
+    return start_warm_up()
+
+warm_up()
+
+@st.cache_resource
+def get_near_duplicate_index(prompt_hash):
+    # Shared by all sessions; loaded from disk on first lookup. One index per judge prompt
+    # version, so a prompt change never serves verdicts produced by an older prompt.
+    from src.dedup import NearDuplicateIndex
+    return NearDuplicateIndex(os.path.join("near_duplicate_index", prompt_hash))
+
+@st.cache_resource
+def get_video_fingerprint_index(prompt_hash):
+    from src.video_fingerprint import VideoFingerprintIndex
+    return VideoFingerprintIndex(os.path.join("video_fingerprint_index", prompt_hash))
+
+@st.cache_resource
+def get_cpu_pool():
+    # Worker processes for hashing, fingerprinting and parsing, shared by all sessions
+    # (LLM_JUDGE_CPU_WORKERS; inline on a single core)
+    return CpuPool()
+
+@st.cache_resource
+def get_results_store():
+    return ResultsStore("results.db")
+
+@st.cache_resource
+def get_calibration():
+    # Fitted from labeled results by `python -m src.calibration`; picks up refits on its own
+    from src.calibration import CalibrationEngine
+    return CalibrationEngine("calibration.json")
+
+@st.cache_resource
+def get_client_pool():
+    # One upstream client (and HTTP connection pool) per API key, shared by all sessions
+    # from src.mock_client import MockClient
+    # return ClientPool(lambda api_key: MockClient(api_key=api_key)) # Mock for local development
+    # LLM_JUDGE_RECORD / LLM_JUDGE_REPLAY record calls to, or serve them from, a cassette
+    from src.cassette import cassette_factory
+    if os.environ.get("LLM_JUDGE_REPLAY"):
+        return ClientPool(cassette_factory(None))
+    from google import genai
+    return ClientPool(cassette_factory(lambda api_key: genai.Client(api_key=api_key)))
+
+# When set, evaluations are sent to the evaluation service (python -m src.service) at this URL
+SERVICE_URL = os.environ.get("LLM_JUDGE_SERVICE_URL")
+
+# Context tokens kept for follow-up questions; older turns are summarized beyond this
+FOLLOWUP_BUDGET_TOKENS = 8000
+
+# Seconds between refreshes of the batch progress table
+BATCH_REFRESH_SECONDS = 0.5
+# Columns of the batch progress table and results grid
+BATCH_COLUMNS = ("item", "type", "status", "detail", "prediction", "confidence", "calibrated_ai_probability",
+                 "model", "total_tokens", "seconds", "error")
+
 # Initialize session state
 if "api_key" not in st.session_state:
     st.session_state.api_key = None
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+
 if "evaluation_result" not in st.session_state:
     st.session_state.evaluation_result = None
 
@@ -35,19 +110,26 @@ if st.session_state.api_key is None:
     key_input = st.text_input("Gemini API Key", type="password", placeholder="Enter your key here...")
     
     if st.button("Enter Judge", disabled=not key_input):
-        os.environ["GEMINI_API_KEY"] = key_input
+        # The key stays in this session only (not os.environ, which every session shares)
         st.session_state.api_key = key_input
-        
-        # Initialize client with the provided key
-        # base_client = MockClient(api_key=key_input) # Mock for local development
-        base_client = genai.Client(api_key=key_input)
-        st.session_state.client = LimitedClient(base_client, tier="free")
         st.rerun()
 
 # 2. Main Evaluation Screen
 else:
     st.caption("Evaluate content authenticity using multimodal analysis")
 
+    # Sessions using the same key share one upstream client; rebuilt here if it was evicted while idle
+    base_client = get_client_pool().get(st.session_state.api_key, st.session_state.session_id)
+    if st.session_state.get("client") is None or st.session_state.client._client is not base_client:
+        # Quota state is partitioned per key; sessions sharing a key get fair turns
+        st.session_state.client = LimitedClient(
+            base_client, tier="free",
+            key_id=key_fingerprint(st.session_state.api_key), flow_id=st.session_state.session_id
+        )
+        # Batch items are admitted as batch traffic, which leaves the interactive headroom
+        # of every limit to single evaluations and follow-ups
+        st.session_state.batch_client = st.session_state.client.with_priority("batch")
+
     # Sidebar for configuration and navigation
     st.sidebar.header("Configuration")
     
@@ -56,9 +138,16 @@ else:
     selected_tier_label = st.sidebar.radio("Select Subscription Tier", list(tier_options.keys()), index=0)
     selected_tier = tier_options[selected_tier_label]
     
+    adaptive_limits = st.sidebar.checkbox(
+        "Adapt limits to observed quota",
+        value=True,
+        help="Start from the selected tier and learn the key's real RPM/TPM from successful and throttled (429) responses."
+    )
+
     # Update client tier
-    if "client" in st.session_state:
-        st.session_state.client.set_tier(selected_tier)
+    for limited in (st.session_state.client, st.session_state.batch_client):
+        limited.set_tier(selected_tier)
+        limited.set_adaptive(adaptive_limits)
 
     st.sidebar.divider()
     
@@ -66,62 +155,102 @@ else:
     model_options = ["gemini-2.5-flash", "gemini-2.5-flash-lite"]
     selected_model = st.sidebar.selectbox("Select Model for Analysis", model_options)
 
-    def run_evaluation(content, is_video=False):
-        """Business logic for content evaluation."""
-        uploaded_file = None
+    use_prescreen = st.sidebar.checkbox(
+        "Local pre-screen for text",
+        value=False,
+        help="Score text locally first and only call the judge when the stylometric verdict is uncertain."
+    )
+
+    def get_service_client():
+        # One connection pool per session and key, closed on "Change API Key"
+        if st.session_state.get("service_client") is None:
+            from src.service_client import ServiceClient
+            st.session_state.service_client = ServiceClient(SERVICE_URL, st.session_state.api_key)
+        return st.session_state.service_client
+
+    def get_evaluator(batch=False):
+        if SERVICE_URL:
+            # Thin client: evaluations run in the evaluation service
+            return get_service_client()
+        near_duplicate_index, video_fingerprint_index = get_near_duplicate_index, get_video_fingerprint_index
+        if batch:
+            # Batch items run on worker threads, which must not call Streamlit's cached
+            # functions; the current prompts' indexes are looked up here instead
+            text_hash, video_hash = get_prompt("text").hash, get_prompt("video").hash
+            near_duplicate_index = {text_hash: get_near_duplicate_index(text_hash)}.get
+            video_fingerprint_index = {video_hash: get_video_fingerprint_index(video_hash)}.get
+        return Evaluator(
+            st.session_state.batch_client if batch else st.session_state.client, get_results_store(),
+            near_duplicate_index=near_duplicate_index,
+            video_fingerprint_index=video_fingerprint_index,
+            cpu_pool=get_cpu_pool()
+        )
+
+    def write_metrics_file():
+        if METRICS.enabled and os.environ.get("LLM_JUDGE_METRICS_FILE"):
+            METRICS.write_textfile(os.environ["LLM_JUDGE_METRICS_FILE"])
+
+    def release_upload():
+        # The judged video stays uploaded for follow-up questions until its verdict is replaced
+        followup = st.session_state.get("followup")
+        uploaded_file = followup.get("uploaded_file") if followup else None
+        if uploaded_file is not None:
+            followup["uploaded_file"] = None
+            if Evaluator(st.session_state.client).delete_upload(uploaded_file):
+                st.sidebar.success(f"Cleaned up file: {uploaded_file.name}")
+            else:
+                st.sidebar.warning(f"Failed to cleanup file: {uploaded_file.name}")
+
+    def run_evaluation(content, is_video=False, caption=None):
+        """
+        Runs the evaluation and keeps the verdict and its follow-up context in the session.
+        A video with a `caption` is judged together with it in one call.
+        """
         try:
             with st.spinner("Analyzing content..."):
                 if is_video:
-                    # Pass the file object directly for upload
-                    st.info("Uploading video to Gemini File API...")
-                    uploaded_file = st.session_state.client.files.upload(
-                        file=content,
-                        config={"mime_type": content.type}
-                    )
-                    
-                    # Wait for video processing to complete
-                    # Video must be in 'ACTIVE' state before use
                     status_text = st.empty()
-                    while uploaded_file.state.name == "PROCESSING":
-                        status_text.info(f"Processing video: {uploaded_file.name} (State: {uploaded_file.state.name})")
-                        time.sleep(5)
-                        uploaded_file = st.session_state.client.files.get(name=uploaded_file.name)
-                    
-                    if uploaded_file.state.name != "ACTIVE":
-                        st.error(f"Video processing failed with state: {uploaded_file.state.name}")
-                        return
-
-                    status_text.success("Video processed and ready for analysis.")
-                    prompt = "Analyze this video and determine if it was created by an AI or a human. Return your response ONLY in the specified JSON format."
-                    contents = [prompt, uploaded_file]
+                    evaluator = get_evaluator()
+                    if caption:
+                        result = evaluator.evaluate_combined(
+                            caption, content, selected_model, mime_type=content.type, keep_upload=True,
+                            on_status=status_text.info
+                        )
+                    else:
+                        result = evaluator.evaluate_video(
+                            content, selected_model, mime_type=content.type, keep_upload=True, on_status=status_text.info
+                        )
+                    status_text.empty()
                 else:
-                    prompt = f"Analyze the following text and determine if it was written by an AI or a human. Return your response ONLY in the specified JSON format:\n\n{content}"
-                    contents = prompt
-
-                response = st.session_state.client.models.generate_content(
-                    model=selected_model,
-                    contents=contents,
-                    config=GenerateContentConfig(system_instruction=system_prompt)
-                )
-                
-                st.session_state.evaluation_result = {
-                    "raw_text": response.text,
-                    "metadata": response.usage_metadata,
-                    "type": "Video" if is_video else "Text"
-                }
+                    result = get_evaluator().evaluate_text(content, selected_model, prescreen=use_prescreen)
         except Exception as e:
             st.error(f"Analysis failed: {str(e)}")
+            return
         finally:
-            # Cleanup: Delete the file from Google's servers after use to respect quota
-            if uploaded_file and is_video:
-                try:
-                    st.session_state.client.files.delete(name=uploaded_file.name)
-                    st.sidebar.success(f"Cleaned up file: {uploaded_file.name}")
-                except Exception as cleanup_err:
-                    st.sidebar.warning(f"Failed to cleanup file: {str(cleanup_err)}")
+            write_metrics_file()
+
+        release_upload()
+        st.session_state.evaluation_result = result
+
+        # Follow-up questions continue from the judged content (reusing the uploaded file) and this verdict
+        uploaded_file = result.pop("uploaded_file", None)
+        caption_note = f"\n\nIts caption:\n{caption}" if caption else ""
+        if uploaded_file is not None:
+            subject = file_content("user", uploaded_file, "This is the video you analyzed." + caption_note)
+        elif is_video:
+            subject = text_content("user", "You analyzed a video that is no longer attached. Answer from your verdict." + caption_note)
+        else:
+            subject = text_content("user", f"This is the text you analyzed:\n\n{content}")
+        st.session_state.followup = {
+            "pinned": [subject, text_content("model", result["raw_text"])],
+            "model": result["model"],
+            "chat": None,
+            "messages": [],
+            "uploaded_file": uploaded_file
+        }
 
     # Tabs for different input types
-    tab_text, tab_video = st.tabs(["📝 Text Evaluation", "🎬 Video Evaluation"])
+    tab_text, tab_video, tab_batch = st.tabs(["📝 Text Evaluation", "🎬 Video Evaluation", "📚 Batch Evaluation"])
 
     with tab_text:
         text_input = st.text_area(
@@ -130,12 +259,7 @@ else:
             placeholder="Enter the content you want the judge to analyze..."
         )
         if st.button("Analyze Text", disabled=not text_input):
-            st.session_state.truncation_warning = False
-            words = text_input.split()
-            if len(words) > 1000:
-                text_input = " ".join(words[:1000])
-                st.session_state.truncation_warning = True
-            
+            text_input, st.session_state.truncation_warning = truncate_text(text_input)
             if st.session_state.truncation_warning:
                 st.warning("⚠️ Input text exceeded 1000 words. It has been truncated for analysis.")
             run_evaluation(text_input, is_video=False)
@@ -143,18 +267,63 @@ else:
     with tab_video:
         video_file = st.file_uploader(
             "Upload a video for evaluation:", 
-            type=["mp4", "mpeg", "mov", "avi", "webm"],
+            type=[extension.lstrip(".") for extension in VIDEO_EXTENSIONS],
 
         )
         if video_file:
-            MAX_FILE_SIZE = 20 * 1024 * 1024  # 20 MB
-            if video_file.size > MAX_FILE_SIZE:
+            if video_file.size > MAX_VIDEO_BYTES:
                 st.error(f"❌ Video file is too large ({video_file.size / (1024*1024):.1f} MB). Please upload a file smaller than 20 MB.")
             else:
                 st.video(video_file)
-                if st.button("Analyze Video"):
-                    st.session_state.truncation_warning = False
-                    run_evaluation(video_file, is_video=True)
+                caption = st.text_area(
+                    "Caption (optional):",
+                    height=100,
+                    placeholder="The post's text, judged together with the video in one call..."
+                )
+                if st.button("Analyze Post" if caption.strip() else "Analyze Video"):
+                    caption, st.session_state.truncation_warning = truncate_text(caption.strip())
+                    if st.session_state.truncation_warning:
+                        st.warning("⚠️ Caption exceeded 1000 words. It has been truncated for analysis.")
+                    run_evaluation(video_file, is_video=True, caption=caption or None)
+
+    with tab_batch:
+        batch_files = st.file_uploader(
+            "Upload videos or text files:",
+            type=[extension.lstrip(".") for extension in VIDEO_EXTENSIONS] + ["txt", "md"],
+            accept_multiple_files=True
+        )
+        batch_text = st.text_area(
+            "Or paste texts (separated by a line with only ---) or URLs, one per line:",
+            height=150,
+            placeholder="https://example.com/post/1\nhttps://example.com/clip.mp4"
+        )
+        batch_workers = st.slider("Parallel evaluations", 1, 16, DEFAULT_WORKERS,
+                                  help="Uploads and video processing overlap; judge calls are still paced by the rate limiter.")
+        batch_items = file_items(batch_files or []) + parse_text_list(batch_text or "")
+        runner = st.session_state.get("batch_runner")
+        running = runner is not None and not runner.done()
+        if st.button(f"Analyze Batch ({len(batch_items)} items)", disabled=not batch_items or running):
+            runner = st.session_state.batch_runner = BatchRunner(
+                get_evaluator(batch=True), selected_model, max_workers=batch_workers, prescreen=use_prescreen,
+                calibration=None if SERVICE_URL else get_calibration()
+            ).start(batch_items)
+
+        if runner is not None:
+            # The runner lives in the session, so a rerun mid-batch picks the progress back up
+            progress = st.progress(0.0)
+            table = st.empty()
+            while True:
+                finished = runner.wait(timeout=BATCH_REFRESH_SECONDS)
+                counts = runner.counts()
+                completed = counts["done"] + counts["failed"]
+                progress.progress(completed / max(1, len(runner.items)),
+                                  text=f"{completed} of {len(runner.items)} items in {runner.elapsed():.1f}s "
+                                       f"({counts['failed']} failed)")
+                table.dataframe([{k: row[k] for k in BATCH_COLUMNS} for row in runner.rows()],
+                                use_container_width=True)
+                if finished:
+                    break
+            write_metrics_file()
 
     # Result Section
     if st.session_state.evaluation_result:
@@ -162,11 +331,14 @@ else:
             st.warning("⚠️ Note: The input text was truncated to 1000 words for this analysis.")
         st.divider()
         res = st.session_state.evaluation_result
+        from src.parser import extract_json, sanitize_evaluation
         raw_data = extract_json(res["raw_text"])
         structured_data = sanitize_evaluation(raw_data)
 
         if structured_data:
             st.subheader(f"Judge Verdict ({res['type']})")
+            if "similarity" in res:
+                st.info(f"Near-duplicate of previously judged content ({res['similarity']*100:.0f}% similar). Reusing the stored verdict.")
             
             # 1. Origin Analysis
             origin = structured_data["origin_analysis"]
@@ -174,6 +346,15 @@ else:
             with col1:
                 st.metric("Prediction", origin["prediction"])
                 st.metric("Confidence", f"{float(origin['confidence_score'])*100:.1f}%")
+                # The service calibrates its own results; locally it is looked up per model and prompt
+                calibrated = res.get("calibrated_ai_probability")
+                if calibrated is None and not SERVICE_URL:
+                    calibrated = get_calibration().calibrate(
+                        res.get("model"), res.get("prompt"), origin["prediction"], origin["confidence_score"]
+                    )
+                if calibrated is not None:
+                    st.metric("Calibrated P(AI)", f"{calibrated*100:.1f}%",
+                              help="Probability that the content is AI-generated or hybrid, calibrated on labeled results for this model and prompt version.")
             with col2:
                 st.markdown(f"**Technical Reasoning:**\n{origin['technical_reasoning']}")
                 if origin["text_artifacts"] != "[Missing]":
@@ -212,27 +393,95 @@ else:
         
         # Metadata and Token Usage
         with st.expander("Technical Analysis Details"):
-            cols = st.columns(3)
             metadata = res["metadata"]
-            cols[0].metric("Prompt Tokens", metadata.prompt_token_count)
-            cols[1].metric("Response Tokens", metadata.candidates_token_count)
-            cols[2].metric("Total Tokens", metadata.total_token_count)
-            st.write(f"**Model used:** {selected_model}")
+            if metadata is None:
+                st.write("**Model used:** none (answered locally, no tokens spent)")
+            else:
+                cols = st.columns(3)
+                cols[0].metric("Prompt Tokens", metadata.prompt_token_count)
+                cols[1].metric("Response Tokens", metadata.candidates_token_count)
+                cols[2].metric("Total Tokens", metadata.total_token_count)
+                st.write(f"**Model used:** {res.get('model', selected_model)}")
+
+    # Follow-up Q&A on the verdict; the chat is created on the first question
+    followup = st.session_state.get("followup") if st.session_state.evaluation_result else None
+    if followup is not None:
+        st.subheader("Follow-up Questions")
+        for role, text in followup["messages"]:
+            with st.chat_message(role):
+                st.markdown(text)
+
+        # A replayed cassette has no recorded chats to answer with
+        if os.environ.get("LLM_JUDGE_REPLAY"):
+            st.caption("Follow-up questions are not available while replaying a cassette.")
+            question = None
+        else:
+            question = st.chat_input("Ask about this verdict, e.g. why a frame looks synthetic")
+        if question:
+            try:
+                if followup["chat"] is None:
+                    from google.genai.types import GenerateContentConfig
+                    followup["chat"] = st.session_state.client.chats.create(
+                        model=followup["model"] or selected_model,
+                        history=ChatHistory(followup["pinned"], budget_tokens=FOLLOWUP_BUDGET_TOKENS),
+                        config=GenerateContentConfig(system_instruction=followup_prompt)
+                    )
+                with st.spinner("Thinking..."):
+                    response = followup["chat"].send_message(question)
+                followup["messages"].extend([("user", question), ("assistant", response.text)])
+                st.rerun()
+            except Exception as e:
+                st.error(f"Follow-up failed: {str(e)}")
+
+    with st.expander("Evaluation History"):
+        if SERVICE_URL:
+            # Thin client: results are stored by the service, scoped to this key
+            store = get_service_client()
+            try:
+                summary = store.results_summary(group_by="model")
+                recent = store.results(limit=20) if summary else []
+            except Exception as e:
+                summary = None
+                st.error(f"Could not load history from the evaluation service: {str(e)}")
+        else:
+            store = get_results_store()
+            store.flush(timeout=2)
+            summary = store.aggregate(group_by="model")
+            recent = store.query(limit=20) if summary else []
+        if summary:
+            st.dataframe(summary, use_container_width=True)
+            st.dataframe(
+                [{k: row[k] for k in ("created_at", "content_type", "source", "model", "prediction", "confidence", "total_tokens", "latency_ms")}
+                 for row in recent],
+                use_container_width=True
+            )
+        elif summary is not None:
+            st.write("No evaluations stored yet.")
 
     st.sidebar.divider()
     st.sidebar.subheader("App Controls")
     st.sidebar.info(f"Active Model: {selected_model}")
 
     if st.sidebar.button("Reset Evaluation"):
+        release_upload()
+        if st.session_state.get("batch_runner") is not None and st.session_state.batch_runner.done():
+            st.session_state.batch_runner = None
         st.session_state.evaluation_result = None
+        st.session_state.followup = None
         st.session_state.truncation_warning = False
         st.rerun()
 
     if st.sidebar.button("Change API Key"):
-        # Clear sensitive state and environment variable
+        # Clear sensitive state; the shared client is closed if no other session uses this key
+        release_upload()
+        get_client_pool().checkout(st.session_state.api_key, st.session_state.session_id)
         st.session_state.api_key = None
         st.session_state.client = None
+        st.session_state.batch_client = None
+        if st.session_state.get("service_client") is not None:
+            st.session_state.service_client.close()
+            st.session_state.service_client = None
         st.session_state.evaluation_result = None
-        if "GEMINI_API_KEY" in os.environ:
-            del os.environ["GEMINI_API_KEY"]
+        st.session_state.followup = None
+        st.session_state.batch_runner = None
         st.rerun()
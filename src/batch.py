@@ -0,0 +1,316 @@
+"""
+Batch evaluation: many uploaded files, pasted texts or URLs judged concurrently.
+
+Items run on a thread pool through one evaluator, so downloads, uploads and File API
+processing of different items overlap while the rate-limited client paces the judge
+calls: a batch takes about N / effective RPM instead of the sum of its latencies.
+Worker threads only update item state; the caller renders progress by polling rows().
+"""
+import io
+import ipaddress
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+from src.evaluator import MAX_VIDEO_BYTES, VIDEO_EXTENSIONS, EvaluationError, truncate_text
+from src.results_store import build_record
+
+STATUSES = ("queued", "fetching", "running", "done", "failed")
+DEFAULT_WORKERS = 8
+# A line holding only this separates pasted texts
+ITEM_SEPARATOR = "---"
+TEXT_EXTENSIONS = (".txt", ".md")
+# Seconds to wait for a URL to respond
+FETCH_TIMEOUT = 30.0
+MAX_REDIRECTS = 5
+
+
+class BatchItem:
+    def __init__(self, name, kind, content=None, mime_type=None):
+        """`kind` is "text" (content is a str), "video" (a file object with a name) or "url" (content is the URL)."""
+        self.name = name
+        self.kind = kind
+        self.content = content
+        self.mime_type = mime_type
+        self.status = "queued"
+        # The latest progress message, e.g. while a video uploads and processes
+        self.detail = None
+        self.truncated = False
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+
+def _is_url(line):
+    return line.startswith(("http://", "https://")) and " " not in line
+
+
+def parse_text_list(raw):
+    """
+    Items from pasted input: texts separated by lines holding only "---", and URLs, one per
+    line. A block made only of URLs becomes one item per URL; any other block is one text.
+    """
+    items = []
+    block = []
+    for line in raw.splitlines() + [ITEM_SEPARATOR]:
+        if line.strip() != ITEM_SEPARATOR:
+            block.append(line)
+            continue
+        text, block = "\n".join(block).strip(), []
+        if not text:
+            continue
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        if all(_is_url(line) for line in lines):
+            items.extend(BatchItem(url, "url", url) for url in lines)
+        else:
+            items.append(BatchItem(f"Text {len(items) + 1}", "text", text))
+    return items
+
+
+def file_items(files):
+    """Items from uploaded files (e.g. Streamlit UploadedFiles): videos by extension, .txt/.md as text."""
+    items = []
+    for file in files:
+        extension = os.path.splitext(file.name)[1].lower()
+        size = getattr(file, "size", None)
+        error = None
+        if extension in VIDEO_EXTENSIONS:
+            item = BatchItem(file.name, "video", file, getattr(file, "type", None))
+            if size is not None and size > MAX_VIDEO_BYTES:
+                error = f"Video file is too large ({size / (1024 * 1024):.1f} MB)"
+        elif extension in TEXT_EXTENSIONS:
+            # getvalue() does not move the read position, so items can be rebuilt on every rerun
+            data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+            item = BatchItem(file.name, "text", data.decode("utf-8", errors="replace"))
+        else:
+            item = BatchItem(file.name, "text")
+            error = f"Unsupported file type: {extension or 'none'}"
+        if error:
+            item.status, item.error = "failed", error
+        items.append(item)
+    return items
+
+
+class _TextExtractor(HTMLParser):
+    SKIP = ("script", "style", "noscript", "head")
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping and data.strip():
+            self.parts.append(data.strip())
+
+
+def html_text(html):
+    """The visible text of an HTML page, one line per text node."""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return "\n".join(extractor.parts)
+
+
+def resolve_host(host, port):
+    """Every IP address `host` resolves to."""
+    return {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+
+
+def check_public_url(url):
+    """
+    Raises EvaluationError unless `url` is http(s) on a host whose addresses are all public,
+    so a pasted URL cannot make the app server request loopback, private or link-local
+    services (such as cloud metadata at 169.254.169.254).
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise EvaluationError(f"Only http(s) URLs can be fetched: {url}")
+    try:
+        addresses = resolve_host(parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80))
+    except (OSError, UnicodeError) as e:
+        raise EvaluationError(f"Cannot resolve {parsed.hostname}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise EvaluationError(f"{parsed.hostname} resolves to a non-public address ({ip}); not fetched")
+
+
+def _read_response(response, url, max_bytes):
+    response.raise_for_status()
+    path = urlparse(url).path
+    mime_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    is_video = mime_type.startswith("video/") or os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+    data = io.BytesIO()
+    for chunk in response.iter_bytes():
+        data.write(chunk)
+        if data.tell() > max_bytes:
+            raise EvaluationError(f"{url} is larger than {max_bytes // (1024 * 1024)} MB")
+    encoding = response.encoding or "utf-8"
+    if is_video:
+        data.seek(0)
+        data.name = os.path.basename(path) or "video.mp4"
+        return "video", data, mime_type if mime_type.startswith("video/") else None
+    text = data.getvalue().decode(encoding, errors="replace")
+    if "html" in mime_type:
+        text = html_text(text)
+    return "text", text, mime_type
+
+
+def fetch_url(http, url, max_bytes=MAX_VIDEO_BYTES):
+    """
+    Downloads `url` with the httpx client `http`. Returns ("video", file object, mime type)
+    for video responses or URLs with a video extension, else ("text", text, mime type).
+    Redirects are followed here rather than by httpx, so every hop passes check_public_url.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        check_public_url(url)
+        with http.stream("GET", url, follow_redirects=False) as response:
+            location = response.headers.get("location")
+            if response.is_redirect and location:
+                url = urljoin(url, location)
+                continue
+            return _read_response(response, url, max_bytes)
+    raise EvaluationError(f"Too many redirects fetching {url}")
+
+
+class BatchRunner:
+    def __init__(self, evaluator, model, max_workers=DEFAULT_WORKERS, prescreen=False, http_client=None,
+                 calibration=None):
+        """
+        `evaluator` is an Evaluator or ServiceClient; it is called from worker threads.
+        `http_client` fetches URL items (an httpx.Client is created when needed).
+        `calibration` is an optional CalibrationEngine for the calibrated column of rows().
+        """
+        self.evaluator = evaluator
+        self.model = model
+        self.max_workers = max_workers
+        self.prescreen = prescreen
+        self.calibration = calibration
+        self._http = http_client
+        self._owns_http = False
+        self._lock = threading.Lock()
+        self._finished_event = threading.Event()
+        self.items = []
+        self._remaining = 0
+        self.started = None
+        self.finished = None
+
+    def start(self, items):
+        """Submits `items` and returns at once; progress is read with rows() and done()."""
+        self.items = list(items)
+        self.started = time.perf_counter()
+        pending = [item for item in self.items if item.status == "queued"]
+        if any(item.kind == "url" for item in pending) and self._http is None:
+            import httpx
+            self._http = httpx.Client(timeout=FETCH_TIMEOUT)
+            self._owns_http = True
+        self._remaining = len(pending)
+        if not pending:
+            self._finish()
+            return self
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(pending))),
+                                      thread_name_prefix="batch")
+        for item in pending:
+            executor.submit(self._run, item)
+        # Queued items still run; the pool's threads exit once the queue is drained
+        executor.shutdown(wait=False)
+        return self
+
+    def _set(self, item, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(item, name, value)
+
+    def _run(self, item):
+        self._set(item, started=time.perf_counter(), status="fetching" if item.kind == "url" else "running")
+        try:
+            kind, content, mime_type = item.kind, item.content, item.mime_type
+            if kind == "url":
+                kind, content, mime_type = fetch_url(self._http, content)
+                self._set(item, status="running")
+            if kind == "video":
+                result = self.evaluator.evaluate_video(content, self.model, mime_type=mime_type,
+                                                       on_status=lambda message: self._set(item, detail=message))
+            else:
+                text, truncated = truncate_text(content)
+                if not text.strip():
+                    raise EvaluationError("No text to evaluate")
+                self._set(item, truncated=truncated)
+                result = self.evaluator.evaluate_text(text, self.model, prescreen=self.prescreen)
+                result["truncated"] = truncated
+            self._set(item, result=result, status="done", detail=None, finished=time.perf_counter())
+        except Exception as e:
+            self._set(item, error=str(e), status="failed", finished=time.perf_counter())
+        finally:
+            with self._lock:
+                self._remaining -= 1
+                last = self._remaining == 0
+            if last:
+                self._finish()
+
+    def _finish(self):
+        if self._owns_http:
+            self._http.close()
+        with self._lock:
+            self.finished = time.perf_counter()
+        self._finished_event.set()
+
+    def done(self):
+        return self._finished_event.is_set()
+
+    def wait(self, timeout=None):
+        """Blocks until every item has finished (or `timeout` seconds); returns done()."""
+        return self._finished_event.wait(timeout)
+
+    def counts(self):
+        with self._lock:
+            counts = dict.fromkeys(STATUSES, 0)
+            for item in self.items:
+                counts[item.status] += 1
+        return counts
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def rows(self):
+        """One row per item for a progress table or results grid."""
+        now = time.perf_counter()
+        with self._lock:
+            items = [(item.name, item.kind, item.status, item.detail, item.truncated, item.result, item.error,
+                      item.started, item.finished) for item in self.items]
+        rows = []
+        for name, kind, status, detail, truncated, result, error, started, finished in items:
+            row = {"item": name, "type": kind, "status": status, "detail": detail, "prediction": None, "confidence": None,
+                   "calibrated_ai_probability": None, "model": None, "source": None, "total_tokens": None,
+                   "seconds": (finished or now) - started if started is not None else None,
+                   "truncated": truncated, "error": error}
+            if result is not None:
+                record = build_record(result["structured"], result["metadata"], result["model"], None, None, None)
+                row.update(type=result["type"], model=result["model"], source=result["source"],
+                           prediction=record["prediction"], confidence=record["confidence"],
+                           total_tokens=record["total_tokens"])
+                calibrated = result.get("calibrated_ai_probability")
+                if calibrated is None and self.calibration is not None and record["confidence"] is not None:
+                    calibrated = self.calibration.calibrate(result["model"], result.get("prompt"),
+                                                            record["prediction"], record["confidence"])
+                row["calibrated_ai_probability"] = calibrated
+            rows.append(row)
+        return rows
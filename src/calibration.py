@@ -0,0 +1,330 @@
+"""
+Calibrated AI-probability for judge verdicts, fitted per model and prompt version from
+labeled results.
+
+    python -m src.calibration label labels.csv [--db results.db]   # content_hash,label rows
+    python -m src.calibration fit [--db results.db] [--full]
+    python -m src.calibration show
+
+The judge's verdict is turned into a raw score, its P(AI-Generated): the confidence for
+"AI-Generated", one minus it for "Human-Generated", and 0.5 for "Hybrid". A label counts
+as positive unless it is "Human-Generated", since hybrid content is AI-assisted.
+
+Labeled results are reduced to per-bin counts of the raw score (sufficient statistics).
+New labels are binned and added to those counts, and each fit reads only the bins. So
+recalibrating after a batch of labels costs the new rows plus a fit over CALIBRATION_BINS
+points, however large the history. A group is calibrated once it has MIN_LABELS labels.
+It uses Platt scaling below ISOTONIC_MIN_LABELS labels, where isotonic regression would
+overfit, and isotonic regression from there on.
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import numpy as np
+
+from src.results_store import ResultsStore
+
+CALIBRATION_BINS = 50
+MIN_LABELS = 30
+ISOTONIC_MIN_LABELS = 500
+METHODS = ("auto", "isotonic", "platt")
+
+
+def bin_centers(bins=CALIBRATION_BINS):
+    return (np.arange(bins) + 0.5) / bins
+
+
+def ai_scores(predictions, confidences):
+    """The judge's P(AI-Generated) per verdict; NaN where the prediction or confidence is missing."""
+    predictions = np.asarray(predictions, dtype=object)
+    confidences = np.clip(np.asarray(confidences, dtype=np.float64), 0.0, 1.0)
+    scores = np.full(len(confidences), np.nan)
+    ai = predictions == "AI-Generated"
+    human = predictions == "Human-Generated"
+    scores[ai] = confidences[ai]
+    scores[human] = 1.0 - confidences[human]
+    scores[predictions == "Hybrid"] = 0.5
+    return scores
+
+
+def _bin_index(scores, bins):
+    return np.minimum((scores * bins).astype(np.int64), bins - 1)
+
+
+def fit_isotonic(counts, positives):
+    """Pool-adjacent-violators over the non-empty bins; returns the calibrated value per bin."""
+    bins = len(counts)
+    filled = np.flatnonzero(counts)
+    # Blocks of (weighted sum, weight, number of bins)
+    sums, weights, sizes = [], [], []
+    for i in filled:
+        sums.append(float(positives[i]))
+        weights.append(float(counts[i]))
+        sizes.append(1)
+        while len(sums) > 1 and sums[-2] / weights[-2] > sums[-1] / weights[-1]:
+            s, w, n = sums.pop(), weights.pop(), sizes.pop()
+            sums[-1] += s
+            weights[-1] += w
+            sizes[-1] += n
+    values = np.repeat(np.array(sums) / np.array(weights), sizes)
+    # Empty bins are interpolated between their filled neighbours
+    return np.interp(bin_centers(bins), bin_centers(bins)[filled], values)
+
+
+def fit_platt(counts, positives, iterations=50):
+    """
+    Logistic fit p = sigmoid(a * logit(score) + b) on the binned scores, with Platt's
+    smoothed targets; returns the calibrated value per bin.
+    """
+    bins = len(counts)
+    x = np.log(bin_centers(bins) / (1.0 - bin_centers(bins)))
+    negatives = counts - positives
+    total_pos, total_neg = positives.sum(), negatives.sum()
+    target_pos = (total_pos + 1.0) / (total_pos + 2.0)
+    target_neg = 1.0 / (total_neg + 2.0)
+    # Weighted target per bin: the expected count of positives under the smoothed targets
+    weight_pos = positives * target_pos + negatives * target_neg
+    features = np.stack([x, np.ones(bins)], axis=1)
+
+    def loss(params):
+        z = features @ params
+        return float((weight_pos * np.logaddexp(0, -z) + (counts - weight_pos) * np.logaddexp(0, z)).sum())
+
+    params = np.array([1.0, 0.0])
+    current = loss(params)
+    for _ in range(iterations):
+        p = 0.5 * (1.0 + np.tanh(0.5 * (features @ params)))
+        gradient = features.T @ (counts * p - weight_pos)
+        hessian = (features * (counts * p * (1.0 - p))[:, None]).T @ features + 1e-9 * np.eye(2)
+        step = np.linalg.solve(hessian, gradient)
+        # Backtracking line search, as in Platt's algorithm: Newton steps overshoot on near-separable data
+        scale = 1.0
+        while scale > 1e-6:
+            candidate = params - scale * step
+            value = loss(candidate)
+            if value <= current + 1e-4 * scale * (gradient @ -step):
+                break
+            scale /= 2
+        else:
+            break
+        params, current = candidate, value
+        if np.abs(scale * step).max() < 1e-9:
+            break
+    return 0.5 * (1.0 + np.tanh(0.5 * (features @ params)))
+
+
+def _group_key(model, prompt):
+    return f"{model}|{prompt or ''}"
+
+
+class CalibrationEngine:
+    def __init__(self, path="calibration.json", method="auto", bins=CALIBRATION_BINS, min_labels=MIN_LABELS):
+        if method not in METHODS:
+            raise ValueError(f"Unknown calibration method {method!r}; expected one of {METHODS}")
+        self.path = path
+        self.method = method
+        self.bins = bins
+        self.min_labels = min_labels
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.watermark = {"evaluation": 0, "label": 0}
+        self._groups = {}
+        self._tables = {}
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read calibration state {self.path}: {e}")
+            return
+        if state.get("bins") != self.bins:
+            print(f"Warning: Ignoring calibration state with {state.get('bins')} bins; run a full fit")
+            return
+        self._reset()
+        self.watermark = state["watermark"]
+        for key, group in state["groups"].items():
+            self._groups[key] = {
+                "model": group["model"],
+                "prompt": group["prompt"],
+                "counts": np.array(group["counts"], dtype=np.int64),
+                "positives": np.array(group["positives"], dtype=np.int64),
+            }
+            self._fit(key)
+        self._mtime = mtime
+
+    def save(self):
+        state = {
+            "bins": self.bins,
+            "watermark": self.watermark,
+            "groups": {
+                key: {"model": g["model"], "prompt": g["prompt"],
+                      "counts": g["counts"].tolist(), "positives": g["positives"].tolist()}
+                for key, g in self._groups.items()
+            },
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def _method_for(self, labels):
+        if self.method != "auto":
+            return self.method
+        return "isotonic" if labels >= ISOTONIC_MIN_LABELS else "platt"
+
+    def _fit(self, key):
+        group = self._groups[key]
+        labels = int(group["counts"].sum())
+        if labels < self.min_labels:
+            self._tables.pop(key, None)
+            return
+        fit = fit_isotonic if self._method_for(labels) == "isotonic" else fit_platt
+        self._tables[key] = fit(group["counts"], group["positives"])
+
+    def update(self, store, batch_size=100000):
+        """
+        Adds labeled results the engine has not seen yet, refits the groups they touch
+        and saves the state. Returns the number of labeled results added.
+        """
+        with self._lock:
+            self._load()
+            return self._add_labeled(store, batch_size)
+
+    def refit(self, store, batch_size=100000):
+        """Rebuilds every group from all labeled results."""
+        with self._lock:
+            self._reset()
+            return self._add_labeled(store, batch_size)
+
+    def _add_labeled(self, store, batch_size):
+        added = 0
+        touched = set()
+        evaluation_mark, label_mark = self.watermark["evaluation"], self.watermark["label"]
+        for rows in store.iter_labeled(evaluation_mark, label_mark, batch_size=batch_size):
+            evaluation_ids, label_ids, models, prompts, predictions, confidences, labels = zip(*rows)
+            evaluation_mark = max(evaluation_mark, max(evaluation_ids))
+            label_mark = max(label_mark, max(label_ids))
+            scores = ai_scores(predictions, np.array(confidences, dtype=np.float64))
+            usable = ~np.isnan(scores)
+            if not usable.any():
+                continue
+            keys = np.array([_group_key(m, p) for m, p in zip(models, prompts)], dtype=object)[usable]
+            positives = np.array([label != "Human-Generated" for label in labels])[usable]
+            bins = _bin_index(scores[usable], self.bins)
+            unique_keys, group_index = np.unique(keys, return_inverse=True)
+            cells = group_index * self.bins + bins
+            size = len(unique_keys) * self.bins
+            counts = np.bincount(cells, minlength=size).reshape(-1, self.bins)
+            hits = np.bincount(cells, weights=positives, minlength=size).reshape(-1, self.bins).astype(np.int64)
+            for i, key in enumerate(unique_keys):
+                group = self._groups.get(key)
+                if group is None:
+                    model, prompt = key.split("|", 1)
+                    group = self._groups[key] = {
+                        "model": model, "prompt": prompt or None,
+                        "counts": np.zeros(self.bins, dtype=np.int64),
+                        "positives": np.zeros(self.bins, dtype=np.int64),
+                    }
+                group["counts"] += counts[i]
+                group["positives"] += hits[i]
+                touched.add(key)
+            added += int(usable.sum())
+        for key in touched:
+            self._fit(key)
+        self.watermark = {"evaluation": evaluation_mark, "label": label_mark}
+        self.save()
+        return added
+
+    def calibrate_many(self, models, prompts, predictions, confidences):
+        """Calibrated P(AI-Generated) per verdict; NaN where the group is not calibrated yet."""
+        self.reload()
+        scores = ai_scores(predictions, confidences)
+        calibrated = np.full(len(scores), np.nan)
+        keys = np.array([_group_key(m, p) for m, p in zip(models, prompts)], dtype=object)
+        centers = bin_centers(self.bins)
+        for key in set(keys.tolist()) if len(keys) else ():
+            table = self._tables.get(key)
+            if table is None:
+                continue
+            rows = (keys == key) & ~np.isnan(scores)
+            calibrated[rows] = np.interp(scores[rows], centers, table)
+        return calibrated
+
+    def calibrate(self, model, prompt, prediction, confidence):
+        """Calibrated P(AI-Generated) of one verdict, or None."""
+        try:
+            confidence = float(confidence)
+        except (TypeError, ValueError):
+            return None
+        value = self.calibrate_many([model], [prompt], [prediction], [confidence])[0]
+        return None if np.isnan(value) else float(value)
+
+    def reload(self):
+        """Picks up state saved by another process (e.g. the CLI after labeling)."""
+        with self._lock:
+            self._load()
+
+    def summary(self):
+        """Per group: labels, method, and the Brier score of raw and calibrated scores on the bins."""
+        centers = bin_centers(self.bins)
+        report = {}
+        for key, group in self._groups.items():
+            counts, positives = group["counts"], group["positives"]
+            labels = int(counts.sum())
+            entry = {"model": group["model"], "prompt": group["prompt"], "labels": labels, "method": None}
+            if labels:
+                negatives = counts - positives
+                entry["brier_raw"] = float(((positives * (1 - centers) ** 2) + negatives * centers ** 2).sum() / labels)
+            table = self._tables.get(key)
+            if table is not None:
+                entry["method"] = self._method_for(labels)
+                entry["brier_calibrated"] = float(((positives * (1 - table) ** 2) + negatives * table ** 2).sum() / labels)
+            report[key] = entry
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit and inspect confidence calibration from labeled results.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    label_cmd = sub.add_parser("label", help="Import content_hash,label rows from a CSV file, then update the fit")
+    label_cmd.add_argument("file")
+    fit_cmd = sub.add_parser("fit", help="Add newly labeled results to the fit")
+    fit_cmd.add_argument("--full", action="store_true", help="Rebuild from all labeled results")
+    sub.add_parser("show", help="Print the calibrated groups")
+    for cmd in (label_cmd, fit_cmd):
+        cmd.add_argument("--db", default="results.db")
+    parser.add_argument("--state", default="calibration.json")
+    parser.add_argument("--method", choices=METHODS, default="auto")
+    args = parser.parse_args()
+
+    engine = CalibrationEngine(args.state, method=args.method)
+    if args.command in ("label", "fit"):
+        store = ResultsStore(args.db)
+        try:
+            if args.command == "label":
+                with open(args.file, newline="") as f:
+                    rows = [(row[0].strip(), row[1].strip()) for row in csv.reader(f) if len(row) >= 2 and row[0] != "content_hash"]
+                print(f"Stored {store.add_labels(rows)} new labels")
+            added = engine.refit(store) if args.command == "fit" and args.full else engine.update(store)
+            print(f"Added {added} labeled results")
+        finally:
+            store.close()
+    print(json.dumps(engine.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
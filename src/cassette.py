@@ -0,0 +1,558 @@
+"""
+Cassettes: recorded judge calls, replayed offline with their original latencies.
+
+    LimitedClient(RecordingClient(genai.Client(api_key=key), CassetteWriter("judge.cassette")))
+    LimitedClient(ReplayClient(Cassette("judge.cassette")))
+    python -m src.cassette show judge.cassette
+    python -m src.cassette recover judge.cassette
+
+RecordingClient sits between LimitedClient and the upstream client, so it records exactly
+what went over the wire: each generate_content request with its response text, usage
+metadata, served model and latency (without the limiter's waits and retries, which the
+LimitedClient around a ReplayClient applies again). ReplayClient serves the recorded
+responses, sleeping for the recorded latency times `speed` (0 for none), so parser and
+aggregation changes can be benchmarked against real outputs with no network.
+
+Requests are keyed by a SHA-256 of the model, system instruction and contents, where an
+uploaded video counts as the hash of its bytes rather than its (random) File API name.
+A cassette file is a header, zlib-compressed JSON records each framed by its key and
+length, and an index of fixed-size (key, offset, length) entries sorted by key at the end.
+The reader maps the file and binary-searches the index in place, so opening a cassette of
+millions of calls reads nothing but the header. Requests recorded more than once are
+served in turn.
+
+A writer appends framed records to its own journal next to the cassette and flushes each
+one, so a recording survives the process being killed. Closing the writer (at exit) merges
+its journal into the cassette under an exclusive flock, together with journals left by
+writers that died before closing; `python -m src.cassette recover` does the latter alone.
+Several processes (e.g. service workers) can therefore record to one cassette.
+
+The app and the service record with LLM_JUDGE_RECORD=<path> and replay with
+LLM_JUDGE_REPLAY=<path> (LLM_JUDGE_REPLAY_SPEED, default 1). Follow-up chats are not
+recorded; in replay, creating one raises CassetteMiss.
+"""
+import argparse
+import atexit
+import fcntl
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from src.results_store import content_hash
+from src.tokens import estimate_tokens
+
+MAGIC = b"JUDGECAS"
+VERSION = 2
+# magic, version, record count, index offset
+_HEADER = struct.Struct("<8sIIQ")
+# request key, record length: precedes every record, so a journal needs no index
+_FRAME = struct.Struct("<32sI")
+# request key, record offset, record length
+_ENTRY = struct.Struct("<32sQI")
+JOURNAL_SUFFIX = ".journal"
+
+_WRITERS = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+class CassetteMiss(LookupError):
+    """A request that the cassette has no recording of."""
+    code = 404
+
+
+def _system_text(config):
+    system = getattr(config, "system_instruction", None)
+    if system is None and isinstance(config, dict):
+        system = config.get("system_instruction")
+    return str(system) if system is not None else ""
+
+
+def _normalize(contents, file_digest):
+    """Contents as JSON-able data, with files replaced by the hash of their bytes."""
+    if contents is None or isinstance(contents, (str, int, float, bool)):
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return [_normalize(part, file_digest) for part in contents]
+    if isinstance(contents, dict):
+        if "file_data" in contents:
+            return {"file": file_digest(contents["file_data"].get("file_uri"))}
+        return {k: _normalize(v, file_digest) for k, v in sorted(contents.items())}
+    name = getattr(contents, "name", None)
+    if name is not None and getattr(contents, "mime_type", None) is not None:
+        return {"file": file_digest(name)}
+    return str(contents)
+
+
+def request_key(model, contents, config=None, file_digest=None):
+    """(32-byte key, normalized request) of a generate_content call."""
+    file_digest = file_digest or (lambda name: name)
+    request = {
+        "model": model,
+        "system": hashlib.sha256(_system_text(config).encode("utf-8")).hexdigest(),
+        "contents": _normalize(contents, file_digest),
+    }
+    key = hashlib.sha256(json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")).digest()
+    return key, request
+
+
+def _usage_dict(metadata):
+    if metadata is None:
+        return None
+    return {name: getattr(metadata, name, None)
+            for name in ("prompt_token_count", "candidates_token_count", "total_token_count")}
+
+
+def _read_journal(path):
+    """(key, data) of each complete record in a journal; a record cut short by a crash is dropped."""
+    with open(path, "rb") as f:
+        while True:
+            frame = f.read(_FRAME.size)
+            if len(frame) < _FRAME.size:
+                return
+            key, length = _FRAME.unpack(frame)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield key, data
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def orphaned_journals(path):
+    """Journals of `path` whose writer process is gone (killed or crashed before closing)."""
+    orphaned = []
+    for journal in sorted(glob.glob(glob.escape(path) + ".*" + JOURNAL_SUFFIX)):
+        # <path>.<pid>-<writer id>.journal
+        pid = journal[len(path) + 1:-len(JOURNAL_SUFFIX)].split("-")[0]
+        if pid.isdigit() and int(pid) != os.getpid() and not _process_alive(int(pid)):
+            orphaned.append(journal)
+    return orphaned
+
+
+@contextmanager
+def _locked(path):
+    """Exclusive flock serializing the processes that rewrite the cassette at `path`."""
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def merge_journals(path, journals, keep_existing=True):
+    """
+    Rewrites the cassette at `path` with its records (if `keep_existing`) followed by those of
+    `journals`, moves it into place and removes the journals. Returns the record count.
+    """
+    with _locked(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        entries = []
+        with open(tmp_path, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, VERSION, 0, 0))
+
+            def write(key, data):
+                out.write(_FRAME.pack(key, len(data)))
+                entries.append((key, out.tell(), len(data)))
+                out.write(data)
+
+            if keep_existing and os.path.exists(path):
+                with Cassette(path) as old:
+                    for key, data in old.raw_records():
+                        write(key, data)
+            for journal in journals:
+                for key, data in _read_journal(journal):
+                    write(key, data)
+            # Stable sort: repeated recordings of a request stay in recording order
+            entries.sort(key=lambda entry: entry[0])
+            index_offset = out.tell()
+            for entry in entries:
+                out.write(_ENTRY.pack(*entry))
+            out.seek(0)
+            out.write(_HEADER.pack(MAGIC, VERSION, len(entries), index_offset))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+        for journal in journals:
+            os.remove(journal)
+        return len(entries)
+
+
+class CassetteWriter:
+    def __init__(self, path, append=True):
+        """
+        Records go to this writer's journal until close() merges it into the cassette; with
+        `append`, the cassette's existing records and orphaned journals are kept.
+        """
+        self.path = path
+        self.append = append
+        self._journal_path = f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}{JOURNAL_SUFFIX}"
+        self._file = open(self._journal_path, "wb")
+        self._count = 0
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def record(self, key, record):
+        """Appends one recorded call under the 32-byte `key`."""
+        data = zlib.compress(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+        with self._lock:
+            if self.closed:
+                raise ValueError("Cassette writer is closed")
+            self._file.write(_FRAME.pack(key, len(data)))
+            self._file.write(data)
+            # In the OS's hands, so the record outlives this process
+            self._file.flush()
+            self._count += 1
+
+    def close(self):
+        """Merges the journal into the cassette."""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._file.close()
+            journals = [self._journal_path]
+            if self.append:
+                journals += orphaned_journals(self.path)
+            merge_journals(self.path, journals, keep_existing=self.append)
+
+
+def get_writer(path):
+    """The process-wide writer for `path`, closed at exit."""
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(path)
+        if writer is None or writer.closed:
+            writer = _WRITERS[path] = CassetteWriter(path)
+            atexit.register(writer.close)
+        return writer
+
+
+class Cassette:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self._index_offset = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a cassette")
+        if version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is cassette version {version}; expected {VERSION}")
+        self._turns = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mmap.close()
+
+    def _key_at(self, i):
+        start = self._index_offset + i * _ENTRY.size
+        return self._mmap[start:start + 32]
+
+    def _entry(self, i):
+        return _ENTRY.unpack_from(self._mmap, self._index_offset + i * _ENTRY.size)
+
+    def _decode(self, offset, length):
+        return json.loads(zlib.decompress(self._mmap[offset:offset + length]))
+
+    def _range(self, key):
+        """Index positions [first, last) holding `key`."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        end = lo
+        while end < self.count and self._key_at(end) == key:
+            end += 1
+        return lo, end
+
+    def lookup(self, key):
+        """Every recording of `key`, in recording order."""
+        first, last = self._range(key)
+        return [self._decode(*self._entry(i)[1:]) for i in range(first, last)]
+
+    def next(self, key):
+        """The next recording of `key`, cycling through repeated recordings; None if absent."""
+        first, last = self._range(key)
+        if first == last:
+            return None
+        with self._lock:
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+        return self._decode(*self._entry(first + turn % (last - first))[1:])
+
+    def raw_records(self):
+        """(key, compressed record) pairs, in key order."""
+        for i in range(self.count):
+            key, offset, length = self._entry(i)
+            yield key, self._mmap[offset:offset + length]
+
+    def __iter__(self):
+        """Every record, in key order."""
+        for i in range(self.count):
+            yield self._decode(*self._entry(i)[1:])
+
+
+class _FileDigests:
+    """Hash of the bytes behind each uploaded file, by File API name and URI."""
+
+    def __init__(self):
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def add(self, uploaded, digest):
+        with self._lock:
+            for name in (getattr(uploaded, "name", None), getattr(uploaded, "uri", None)):
+                if name:
+                    self._digests[name] = digest
+
+    def __call__(self, name):
+        with self._lock:
+            return self._digests.get(name, name)
+
+
+class _RecordingModels:
+    def __init__(self, models, writer, digests):
+        self._models = models
+        self._writer = writer
+        self._digests = digests
+
+    def count_tokens(self, **kwargs):
+        return self._models.count_tokens(**kwargs)
+
+    def generate_content(self, model, contents, **kwargs):
+        started = time.perf_counter()
+        response = self._models.generate_content(model=model, contents=contents, **kwargs)
+        latency = time.perf_counter() - started
+        key, request = request_key(model, contents, kwargs.get("config"), self._digests)
+        self._writer.record(key, {
+            "request": request,
+            "text": response.text,
+            "usage": _usage_dict(getattr(response, "usage_metadata", None)),
+            "model_version": getattr(response, "model_version", None),
+            # The mock reports its simulated latency; a real call is timed
+            "latency": getattr(response, "latency_seconds", None) or latency,
+            "recorded_at": time.time(),
+        })
+        return response
+
+
+class _RecordingFiles:
+    def __init__(self, files, digests):
+        self._files = files
+        self._digests = digests
+
+    def upload(self, file, **kwargs):
+        digest = content_hash(file) if hasattr(file, "read") else None
+        uploaded = self._files.upload(file=file, **kwargs)
+        if digest is not None:
+            self._digests.add(uploaded, digest)
+        return uploaded
+
+    def get(self, name):
+        return self._files.get(name=name)
+
+    def delete(self, name):
+        return self._files.delete(name=name)
+
+
+class RecordingClient:
+    """Records the generate_content calls of `client` to a CassetteWriter; chats pass through unrecorded."""
+
+    def __init__(self, client, writer):
+        self._client = client
+        self.writer = writer
+        digests = _FileDigests()
+        self.models = _RecordingModels(client.models, writer, digests)
+        self.files = _RecordingFiles(client.files, digests)
+        self.chats = client.chats
+
+    def close(self):
+        # The writer is shared by every recording client and closed at exit
+        close = getattr(self._client, "close", None)
+        if close is not None:
+            close()
+
+
+class _ReplayFile:
+    def __init__(self, name, uri, mime_type):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.state = SimpleNamespace(name="ACTIVE")
+        self.video_metadata = None
+
+
+class _ReplayFiles:
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def upload(self, file, config=None, **kwargs):
+        digest = content_hash(file)
+        mime_type = (config or {}).get("mime_type") or getattr(file, "type", None) or "application/octet-stream"
+        uploaded = _ReplayFile(f"files/{digest[:16]}", f"cassette://{digest}", mime_type)
+        with self._lock:
+            self._files[uploaded.name] = uploaded
+        return uploaded
+
+    def get(self, name):
+        with self._lock:
+            uploaded = self._files.get(name)
+        if uploaded is None:
+            raise CassetteMiss(f"File {name} was not uploaded")
+        return uploaded
+
+    def delete(self, name):
+        with self._lock:
+            self._files.pop(name, None)
+        return True
+
+    def digest(self, name):
+        with self._lock:
+            uploaded = self._files.get(name)
+        if uploaded is None:
+            return name
+        return uploaded.uri[len("cassette://"):]
+
+
+class _ReplayModels:
+    def __init__(self, cassette, files, speed):
+        self._cassette = cassette
+        self._files = files
+        self.speed = speed
+
+    def _digest(self, name):
+        if name and name.startswith("cassette://"):
+            return name[len("cassette://"):]
+        return self._files.digest(name)
+
+    def count_tokens(self, model, contents, config=None):
+        key, _ = request_key(model, contents, config, self._digest)
+        recorded = self._cassette.lookup(key)
+        usage = recorded[0]["usage"] if recorded else None
+        if usage and usage.get("prompt_token_count") is not None:
+            return SimpleNamespace(total_tokens=usage["prompt_token_count"])
+        return SimpleNamespace(total_tokens=estimate_tokens(contents, system_instruction=_system_text(config) or None))
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        key, _ = request_key(model, contents, config, self._digest)
+        recorded = self._cassette.next(key)
+        if recorded is None:
+            raise CassetteMiss(f"No recording of this {model} request in {self._cassette.path}")
+        latency = recorded["latency"] * self.speed
+        if latency > 0:
+            time.sleep(latency)
+        usage = recorded["usage"]
+        return SimpleNamespace(
+            text=recorded["text"],
+            usage_metadata=SimpleNamespace(**usage) if usage is not None else None,
+            model_version=recorded["model_version"],
+            latency_seconds=recorded["latency"],
+        )
+
+
+class _ReplayChats:
+    def __init__(self, cassette):
+        self._cassette = cassette
+
+    def create(self, model, **kwargs):
+        raise CassetteMiss(f"Follow-up chats are not recorded, so {self._cassette.path} cannot replay them")
+
+
+class ReplayClient:
+    """Serves generate_content from a Cassette, with the recorded latency times `speed`."""
+
+    def __init__(self, cassette, speed=1.0):
+        self.cassette = cassette
+        self.files = _ReplayFiles()
+        self.models = _ReplayModels(cassette, self.files, speed)
+        self.chats = _ReplayChats(cassette)
+
+
+def cassette_factory(factory):
+    """
+    `factory(api_key)` wrapped for LLM_JUDGE_RECORD / LLM_JUDGE_REPLAY: recording its
+    clients to the cassette, or replaced by one replaying the cassette (for any key).
+    """
+    record_path = os.environ.get("LLM_JUDGE_RECORD")
+    replay_path = os.environ.get("LLM_JUDGE_REPLAY")
+    if replay_path:
+        cassette = Cassette(replay_path)
+        speed = float(os.environ.get("LLM_JUDGE_REPLAY_SPEED", "1"))
+        return lambda api_key: ReplayClient(cassette, speed)
+    if record_path:
+        return lambda api_key: RecordingClient(factory(api_key), get_writer(record_path))
+    return factory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a judge call cassette.")
+    parser.add_argument("command", choices=["show", "recover"])
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "recover":
+        journals = orphaned_journals(args.path)
+        count = merge_journals(args.path, journals)
+        print(f"{args.path}: merged {len(journals)} orphaned journals, {count} recorded calls")
+        return
+
+    started = time.perf_counter()
+    with Cassette(args.path) as cassette:
+        opened = time.perf_counter() - started
+        models = {}
+        latencies = []
+        for record in cassette:
+            model = record["model_version"] or record["request"]["model"]
+            models[model] = models.get(model, 0) + 1
+            latencies.append(record["latency"])
+    print(f"{args.path}: {len(latencies)} recorded calls, {os.path.getsize(args.path) / 1e6:.1f} MB, "
+          f"opened in {opened * 1000:.2f} ms")
+    for model, count in sorted(models.items()):
+        print(f"  {model}: {count}")
+    if latencies:
+        latencies.sort()
+        print(f"  latency p50 {latencies[len(latencies) // 2]:.2f} s, p99 {latencies[int(len(latencies) * 0.99)]:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
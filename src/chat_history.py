@@ -0,0 +1,96 @@
+"""
+Token-budgeted conversation history for follow-up questions on a verdict.
+
+The history is sent with every chat turn, so without a bound each turn costs more than the
+last. ChatHistory keeps:
+- pinned turns (the judged content, including an already uploaded file, and the verdict),
+  always sent first so the prompt prefix stays stable between turns for context caching
+- a short extractive summary of evicted turns
+- the most recent turns, evicted oldest first once the total exceeds the budget
+Token totals are maintained incrementally from local estimates and corrected with the
+usage metadata of each response, so no turn needs a count_tokens call over the history.
+"""
+from src.tokens import estimate_tokens
+
+SUMMARY_HEADER = "Summary of earlier follow-up questions in this conversation:"
+# Characters kept per evicted question and answer, and evicted turns kept in the summary
+SUMMARY_SNIPPET_CHARS = 160
+SUMMARY_MAX_TURNS = 8
+# Share of the budget the summary may take; older summary lines are dropped beyond it
+SUMMARY_BUDGET_FRACTION = 0.25
+
+
+def text_content(role, text):
+    return {"role": role, "parts": [{"text": text}]}
+
+
+def file_content(role, file, text=None):
+    """Content referencing an uploaded file by URI, so follow-ups never re-upload it."""
+    parts = [{"file_data": {"file_uri": file.uri, "mime_type": file.mime_type}}]
+    if text:
+        parts.append({"text": text})
+    return {"role": role, "parts": parts}
+
+
+def _snippet(text):
+    text = " ".join(str(text).split())
+    return text if len(text) <= SUMMARY_SNIPPET_CHARS else text[:SUMMARY_SNIPPET_CHARS - 3] + "..."
+
+
+class ChatHistory:
+    def __init__(self, pinned=None, budget_tokens=8000, keep_turns=2):
+        self.pinned = list(pinned or [])
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.pinned_tokens = estimate_tokens(self.pinned)
+        self.turns = []
+        self.turn_tokens = 0
+        self.summary_lines = []
+        self.summary_tokens = 0
+        # Set when turns were evicted, i.e. the chat has to be re-seeded with contents()
+        self.changed = False
+
+    @property
+    def total_tokens(self):
+        return self.pinned_tokens + self.summary_tokens + self.turn_tokens
+
+    def contents(self):
+        """The history to send: pinned turns, the summary of evicted turns, then recent turns."""
+        contents = list(self.pinned)
+        if self.summary_lines:
+            contents.append(text_content("user", "\n".join([SUMMARY_HEADER, *self.summary_lines])))
+            contents.append(text_content("model", "Noted."))
+        for question, answer, _ in self.turns:
+            contents.append(text_content("user", question))
+            contents.append(text_content("model", answer))
+        return contents
+
+    def estimate_prompt(self, message):
+        """Prompt tokens of the next turn: the running total plus the new message."""
+        return self.total_tokens + estimate_tokens(message)
+
+    def add_turn(self, question, answer, usage_metadata=None):
+        tokens = estimate_tokens(question) + estimate_tokens(answer)
+        self.turns.append((question, answer, tokens))
+        self.turn_tokens += tokens
+        actual = getattr(usage_metadata, "total_token_count", None)
+        if actual:
+            # The server's count covers everything sent plus the answer. The estimate is least
+            # reliable for media in the pinned turns, so the difference is attributed there.
+            self.pinned_tokens += actual - self.total_tokens
+        self._trim()
+
+    def _trim(self):
+        while self.total_tokens > self.budget_tokens and len(self.turns) > self.keep_turns:
+            question, answer, tokens = self.turns.pop(0)
+            self.turn_tokens -= tokens
+            self.summary_lines.append(f"- Q: {_snippet(question)} A: {_snippet(answer)}")
+            del self.summary_lines[:-SUMMARY_MAX_TURNS]
+            self.summary_tokens = self._summary_tokens()
+            while len(self.summary_lines) > 1 and self.summary_tokens > self.budget_tokens * SUMMARY_BUDGET_FRACTION:
+                del self.summary_lines[0]
+                self.summary_tokens = self._summary_tokens()
+            self.changed = True
+
+    def _summary_tokens(self):
+        return estimate_tokens([SUMMARY_HEADER, *self.summary_lines, "Noted."])
@@ -0,0 +1,95 @@
+"""
+Process-wide pool of upstream clients keyed by hashed API key.
+
+Streamlit sessions that log in with the same key share one client, and with it one
+keep-alive HTTP connection pool. A client is closed and dropped as soon as its last
+session checks out (e.g. "Change API Key"), or once nobody has used it for `idle_timeout`
+seconds, since sessions whose browser tab was closed never check out. Every API call
+counts as use, so a long batch or video job keeps its client open.
+"""
+import threading
+import time
+from src.rate_limiter import key_fingerprint
+
+
+class _Entry:
+    __slots__ = ("client", "handle", "sessions", "last_used")
+
+    def __init__(self, client):
+        self.client = client
+        self.handle = _PooledClient(client, self)
+        self.sessions = set()
+        self.last_used = time.monotonic()
+
+
+class _PooledClient:
+    """The client as handed out by the pool; each API call starts with an attribute lookup, which marks it used."""
+    __slots__ = ("_client", "_entry")
+
+    def __init__(self, client, entry):
+        self._client = client
+        self._entry = entry
+
+    def __getattr__(self, name):
+        self._entry.last_used = time.monotonic()
+        return getattr(self._client, name)
+
+
+class ClientPool:
+    def __init__(self, factory, idle_timeout=1800):
+        """`factory(api_key)` builds a client, e.g. `lambda key: genai.Client(api_key=key)`."""
+        self._factory = factory
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, api_key, session_id):
+        """Returns the shared client for `api_key`, creating it on first use, and registers the session."""
+        key_id = key_fingerprint(api_key)
+        with self._lock:
+            entry = self._entries.get(key_id)
+            if entry is not None:
+                # Refreshed first, so a client idle just past the timeout is not closed under its caller
+                entry.last_used = time.monotonic()
+            self._evict_idle()
+            if entry is None:
+                entry = self._entries[key_id] = _Entry(self._factory(api_key))
+            entry.sessions.add(session_id)
+            return entry.handle
+
+    def checkout(self, api_key, session_id):
+        """Unregisters a session; the client is torn down when no session uses it anymore."""
+        key_id = key_fingerprint(api_key)
+        with self._lock:
+            entry = self._entries.get(key_id)
+            if entry is None:
+                return
+            entry.sessions.discard(session_id)
+            if not entry.sessions:
+                self._close(key_id)
+
+    def close(self):
+        with self._lock:
+            for key_id in list(self._entries):
+                self._close(key_id)
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key_id in [k for k, e in self._entries.items() if now - e.last_used > self.idle_timeout]:
+            self._close(key_id)
+
+    def _close(self, key_id):
+        entry = self._entries.pop(key_id)
+        close = getattr(entry.client, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"Warning: Error closing client: {e}")
+        # Drop the last references to the client (and the key it holds)
+        entry.client = None
+        entry.sessions.clear()
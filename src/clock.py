@@ -0,0 +1,35 @@
+"""
+Clocks for the rate limiter: wall time for real traffic, virtual time for simulation.
+
+RateLimiter and LimitedClient read the time and sleep only through their clock, so the
+same admission logic can run on a VirtualClock, where sleeping advances time instantly.
+"""
+import time
+
+
+class SystemClock:
+    # time.time / time.sleep are looked up on each call, so tests patching them still apply
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulated time in seconds; sleep() advances it instead of blocking."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def advance_to(self, when):
+        self.now = max(self.now, when)
+
+
+SYSTEM_CLOCK = SystemClock()
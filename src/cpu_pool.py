@@ -0,0 +1,104 @@
+"""
+Process pool for the CPU-bound stage around the judge call: video fingerprinting.
+
+Evaluations stay on threads because they mostly wait on the network. Decoding and hashing
+frames is handed to a worker process, and the calling thread blocks on the result without
+holding the GIL, so fingerprinting one video no longer stalls every other session. The
+worker opens the video by path, as OpenCV needs: a file already on disk is read in place,
+and an in-memory upload is streamed to a temporary file once. Hashing uploads, SimHash and
+response parsing take micro- to milliseconds (hashlib releases the GIL on large chunks),
+less than a round trip to a worker, so they run inline. With max_workers=0 every stage
+runs inline in the calling thread.
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+CHUNK_SIZE = 1024 * 1024
+# Workers are started with "spawn": forking a process that runs threads (Streamlit, uvicorn) is unsafe
+START_METHOD = "spawn"
+
+
+def default_workers():
+    """LLM_JUDGE_CPU_WORKERS, or one worker per spare core (at most 4); 0 on a single core."""
+    configured = os.environ.get("LLM_JUDGE_CPU_WORKERS")
+    if configured is not None:
+        return max(0, int(configured))
+    return min(4, (os.cpu_count() or 1) - 1)
+
+
+def parse_evaluation(raw_text):
+    from src.parser import extract_json, sanitize_evaluation
+    return sanitize_evaluation(extract_json(raw_text))
+
+
+def text_simhash(text):
+    from src.dedup import simhash
+    return simhash(text)
+
+
+def fingerprint_video(path):
+    from src.video_fingerprint import fingerprint_path
+    return fingerprint_path(path)
+
+
+def file_path(file_obj):
+    """The on-disk path of an open file object, or None for in-memory files (e.g. uploads)."""
+    name = getattr(file_obj, "name", None)
+    if not isinstance(name, str):
+        return None
+    try:
+        return name if os.path.samestat(os.fstat(file_obj.fileno()), os.stat(name)) else None
+    except (AttributeError, OSError, ValueError):
+        # io.BytesIO and friends have no file descriptor
+        return None
+
+
+class CpuPool:
+    def __init__(self, max_workers=None):
+        self.max_workers = default_workers() if max_workers is None else max_workers
+        self._executor = None
+        if self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context(START_METHOD))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        return self._executor.submit(fn, *args).result()
+
+    def video_digest(self, file_obj, suffix=".mp4", fingerprint=True):
+        """(sha256 hex, fingerprint or None) of a seekable binary file; its position is restored."""
+        # Streamed in chunks rather than read into memory
+        from src.results_store import content_hash
+        digest = content_hash(file_obj)
+        if not fingerprint:
+            return digest, None
+        from src.video_fingerprint import cv2
+        if cv2 is None:
+            return digest, None
+        path = file_path(file_obj)
+        if path is not None:
+            return digest, self._run(fingerprint_video, path)
+        position = file_obj.tell()
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                file_obj.seek(0)
+                shutil.copyfileobj(file_obj, tmp, CHUNK_SIZE)
+            return digest, self._run(fingerprint_video, path)
+        finally:
+            os.remove(path)
+            file_obj.seek(position)
+
+    def parse(self, raw_text):
+        return parse_evaluation(raw_text)
+
+    def simhash(self, text):
+        return text_simhash(text)
@@ -0,0 +1,221 @@
+import fcntl
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import numpy as np
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# 64-bit SimHash split into 4 bands of 16 bits. Two hashes within Hamming distance d
+# differ in at most d // 4 bits of at least one band (pigeonhole), so probing every
+# band key within that radius finds every match.
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+SHINGLE_SIZE = 3
+
+# On-disk record: simhash, byte offset and length of the verdict in verdicts.jsonl
+_RECORD_DTYPE = np.dtype([("hash", "<u8"), ("offset", "<u8"), ("length", "<u4")])
+
+# Pending inserts are scanned linearly until this many accumulate, then merged into the bands.
+_MERGE_THRESHOLD = 4096
+
+_BIT_POSITIONS = np.arange(HASH_BITS, dtype=np.uint64)
+
+
+def popcount(values):
+    """Vectorized population count over a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    as_bytes = values.astype("<u8").view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1)
+
+
+def append_verdicts(verdicts_file, verdicts, records_file, encode_records):
+    """
+    Appends verdicts as JSON lines and returns their (offset, length) spans.
+    `encode_records(spans)` returns the bytes appended to `records_file` under the
+    same lock, so the two files never disagree about which verdicts exist.
+    """
+    with open(verdicts_file, 'ab') as vf:
+        fcntl.flock(vf, fcntl.LOCK_EX)
+        try:
+            offset = vf.seek(0, os.SEEK_END)
+            payload = []
+            spans = []
+            for verdict in verdicts:
+                line = json.dumps(verdict).encode("utf-8")
+                spans.append((offset, len(line)))
+                payload.append(line + b"\n")
+                offset += len(line) + 1
+            vf.write(b"".join(payload))
+            vf.flush()
+            with open(records_file, 'ab') as rf:
+                rf.write(encode_records(spans))
+        finally:
+            fcntl.flock(vf, fcntl.LOCK_UN)
+    return spans
+
+
+def read_verdict(verdicts_file, offset, length):
+    with open(verdicts_file, 'rb') as f:
+        f.seek(int(offset))
+        return json.loads(f.read(int(length)))
+
+
+def simhash(text):
+    """
+    Computes a 64-bit SimHash over word trigrams of the normalized text.
+    Light edits (typos, inserted words, punctuation) flip only a few bits.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) >= SHINGLE_SIZE:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    else:
+        shingles = [" ".join(words)]
+
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    hashes = np.frombuffer(digests, dtype="<u8")
+    bits = (hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)
+    votes = bits.sum(axis=0).astype(np.int64) * 2 - len(hashes)
+    return int(((votes > 0).astype(np.uint64) << _BIT_POSITIONS).sum())
+
+
+class NearDuplicateIndex:
+    """
+    Disk-backed SimHash index of previously judged texts.
+
+    Layout of `path`:
+    - hashes.bin: fixed-size records (simhash, verdict offset, verdict length)
+    - verdicts.jsonl: one stored verdict per line
+
+    Nothing is read from disk until the first lookup or insert.
+    """
+
+    def __init__(self, path="near_duplicate_index", max_distance=7):
+        self.path = path
+        self.max_distance = max_distance
+        self._probe_masks = self._build_probe_masks(max_distance // BANDS)
+        self._hashes_file = os.path.join(path, "hashes.bin")
+        self._verdicts_file = os.path.join(path, "verdicts.jsonl")
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._records) + len(self._pending)
+
+    @staticmethod
+    def _build_probe_masks(radius):
+        masks = [0]
+        for r in range(1, radius + 1):
+            for bits in itertools.combinations(range(BAND_BITS), r):
+                masks.append(sum(1 << b for b in bits))
+        return np.array(masks, dtype=np.uint64)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._hashes_file):
+            records = np.fromfile(self._hashes_file, dtype=_RECORD_DTYPE)
+        else:
+            records = np.empty(0, dtype=_RECORD_DTYPE)
+        self._pending = []
+        self._build_bands(records)
+        self._loaded = True
+
+    def _build_bands(self, records):
+        self._records = records
+        self._band_keys = []
+        self._band_order = []
+        mask = np.uint64((1 << BAND_BITS) - 1)
+        for band in range(BANDS):
+            keys = (records["hash"] >> np.uint64(band * BAND_BITS)) & mask
+            order = np.argsort(keys, kind="stable")
+            self._band_keys.append(keys[order])
+            self._band_order.append(order)
+
+    def _merge_pending(self):
+        if self._pending:
+            merged = np.concatenate([self._records, np.array(self._pending, dtype=_RECORD_DTYPE)])
+            self._pending = []
+            self._build_bands(merged)
+
+    def _candidates(self, value):
+        ids = []
+        for band in range(BANDS):
+            key = (value >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)
+            probes = self._probe_masks ^ np.uint64(key)
+            keys = self._band_keys[band]
+            lows = np.searchsorted(keys, probes, side="left")
+            highs = np.searchsorted(keys, probes, side="right")
+            order = self._band_order[band]
+            for lo, hi in zip(lows[highs > lows], highs[highs > lows]):
+                ids.append(order[lo:hi])
+        if not ids:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(ids))
+
+    def _read_verdict(self, record):
+        return read_verdict(self._verdicts_file, record["offset"], record["length"])
+
+    def lookup_hash(self, value):
+        """
+        Returns (verdict, distance) for the closest stored hash within max_distance,
+        or None if there is no near-duplicate.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            best = None
+            target = np.uint64(value)
+
+            ids = self._candidates(value)
+            if ids.size:
+                distances = popcount(self._records["hash"][ids] ^ target)
+                i = int(np.argmin(distances))
+                if distances[i] <= self.max_distance:
+                    best = (self._records[ids[i]], int(distances[i]))
+
+            if self._pending:
+                pending = np.array(self._pending, dtype=_RECORD_DTYPE)
+                distances = popcount(pending["hash"] ^ target)
+                i = int(np.argmin(distances))
+                if distances[i] <= self.max_distance and (best is None or distances[i] < best[1]):
+                    best = (pending[i], int(distances[i]))
+
+            if best is None:
+                return None
+            return self._read_verdict(best[0]), best[1]
+
+    def lookup(self, text):
+        """Returns (verdict, similarity) for a near-duplicate of `text`, or None."""
+        match = self.lookup_hash(simhash(text))
+        if match is None:
+            return None
+        verdict, distance = match
+        return verdict, 1.0 - distance / HASH_BITS
+
+    def add_many(self, items):
+        """Appends (simhash, verdict) pairs to the index in one write per file."""
+        if not items:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            records = []
+
+            def encode(spans):
+                records.extend((value, offset, length) for (value, _), (offset, length) in zip(items, spans))
+                return np.array(records, dtype=_RECORD_DTYPE).tobytes()
+
+            append_verdicts(self._verdicts_file, [verdict for _, verdict in items], self._hashes_file, encode)
+            self._pending.extend(records)
+            if len(self._pending) >= _MERGE_THRESHOLD:
+                self._merge_pending()
+
+    def add(self, text, verdict):
+        self.add_many([(simhash(text), verdict)])
@@ -0,0 +1,259 @@
+"""
+The evaluation pipeline behind both the Streamlit app and the HTTP service.
+
+Text: near-duplicate lookup, optional local pre-screen, then the judge.
+Video: local fingerprint lookup, upload to the File API, wait for processing, then the judge.
+Text + video (e.g. a caption and its clip): upload, then one judge call with both parts.
+Every verdict is parsed, sanitized and queued to the results store; judged verdicts are
+added to the near-duplicate indexes, which are kept per prompt hash.
+"""
+import json
+import os
+import time
+from src.cpu_pool import CpuPool
+from src.metrics import METRICS
+from src.prompts import get_prompt
+from src.results_store import build_record, content_hash
+from src.tokens import estimate_tokens
+
+MAX_TEXT_WORDS = 1000
+MAX_VIDEO_BYTES = 20 * 1024 * 1024  # 20 MB
+VIDEO_EXTENSIONS = (".mp4", ".mpeg", ".mov", ".avi", ".webm")
+# Seconds between File API status checks while a video is processing
+PROCESSING_POLL_INTERVAL = 5
+
+
+class EvaluationError(Exception):
+    pass
+
+
+def truncate_text(text, max_words=MAX_TEXT_WORDS):
+    """Returns (text, truncated): the text cut to its first `max_words` words if longer."""
+    words = text.split()
+    if len(words) > max_words:
+        return " ".join(words[:max_words]), True
+    return text, False
+
+
+def usage_dict(metadata):
+    """Token usage of a response as a plain dict, or None for verdicts answered locally."""
+    if metadata is None:
+        return None
+    return {
+        "prompt_token_count": getattr(metadata, "prompt_token_count", None),
+        "candidates_token_count": getattr(metadata, "candidates_token_count", None),
+        "total_token_count": getattr(metadata, "total_token_count", None),
+    }
+
+
+class Evaluator:
+    def __init__(self, client, results_store=None, near_duplicate_index=None, video_fingerprint_index=None,
+                 poll_interval=PROCESSING_POLL_INTERVAL, cpu_pool=None, owner=None):
+        """
+        `client` is a LimitedClient (or anything with its models/files interface).
+        `near_duplicate_index` and `video_fingerprint_index` map a prompt hash to the index
+        of verdicts made with that prompt; either may be None to skip the lookup.
+        `cpu_pool` fingerprints videos in worker processes; inline when None.
+        `owner` is stored with each result (the service's caller key fingerprint).
+        """
+        self.client = client
+        self.cpu_pool = cpu_pool or CpuPool(max_workers=0)
+        self.results_store = results_store
+        self.near_duplicate_index = near_duplicate_index
+        self.video_fingerprint_index = video_fingerprint_index
+        self.poll_interval = poll_interval
+        self.owner = owner
+
+    def _complete(self, result, source, model, content_type, digest, started, prompt=None):
+        with METRICS.span("parse", model=model or ""):
+            structured = self.cpu_pool.parse(result["raw_text"])
+        elapsed = time.perf_counter() - started
+        METRICS.observe_stage(f"evaluation_{source}", elapsed, model=model or "")
+        if self.results_store is not None:
+            self.results_store.add(build_record(
+                structured,
+                result["metadata"],
+                model=model,
+                content_type=content_type,
+                content_hash=digest,
+                latency_ms=elapsed * 1000,
+                source=source,
+                raw_text=result["raw_text"],
+                prompt=prompt,
+                owner=self.owner
+            ))
+        result.update(source=source, model=model, structured=structured, content_hash=digest, latency_ms=elapsed * 1000,
+                      prompt=prompt)
+        return result
+
+    def _judge(self, model, contents, prompt, prompt_tokens=None):
+        from google.genai.types import GenerateContentConfig
+        # A prompt estimate lets the limited client skip its count_tokens call
+        estimate = {"prompt_tokens": prompt_tokens} if prompt_tokens is not None else {}
+        response = self.client.models.generate_content(
+            model=model,
+            contents=contents,
+            config=GenerateContentConfig(system_instruction=prompt.system),
+            **estimate
+        )
+        # The wrapper may fall back to another model when the selected one is failing
+        return response, getattr(response, "model_version", None) or model
+
+    def evaluate_text(self, text, model, prescreen=False):
+        """Judges `text` (already truncated by the caller) and returns the result dict."""
+        started = time.perf_counter()
+        digest = content_hash(text)
+        prompt = get_prompt("text")
+
+        index = self.near_duplicate_index(prompt.hash) if self.near_duplicate_index else None
+        if index is not None:
+            from src.dedup import HASH_BITS
+            with METRICS.span("near_duplicate_lookup"):
+                text_hash = self.cpu_pool.simhash(text)
+                match = index.lookup_hash(text_hash)
+            if match:
+                verdict, distance = match
+                return self._complete({
+                    "raw_text": verdict["raw_text"],
+                    "metadata": None,
+                    "type": "Text (near-duplicate)",
+                    "similarity": 1.0 - distance / HASH_BITS
+                }, "near-duplicate", verdict.get("model"), "text", digest, started, prompt.key)
+
+        if prescreen:
+            from src.prescreen import prescreen_text
+            with METRICS.span("prescreen"):
+                screen = prescreen_text(text)
+            if not screen.escalate:
+                return self._complete({
+                    "raw_text": json.dumps(screen.to_evaluation()),
+                    "metadata": None,
+                    "type": "Text (pre-screen)"
+                }, "pre-screen", None, "text", digest, started)
+
+        # Priced from the template's precomputed token count, without a count_tokens round trip
+        response, served_model = self._judge(model, prompt.render(text), prompt, prompt.estimate_tokens(text))
+        result = self._complete({
+            "raw_text": response.text,
+            "metadata": response.usage_metadata,
+            "type": "Text"
+        }, "judge", served_model, "text", digest, started, prompt.key)
+        if index is not None and response.text:
+            index.add_many([(text_hash, {"raw_text": response.text, "model": served_model})])
+        return result
+
+    def evaluate_video(self, file, model, mime_type=None, keep_upload=False, on_status=None):
+        """
+        Judges a video given as a seekable binary file object with a `name`.
+        The uploaded copy is deleted afterwards unless `keep_upload`, in which case it is
+        returned as result["uploaded_file"] and the caller deletes it with delete_upload().
+        `on_status(message)` receives progress messages.
+        """
+        started = time.perf_counter()
+        prompt = get_prompt("video")
+        status = on_status or (lambda message: None)
+        mime_type = mime_type or getattr(file, "type", None)
+
+        # Fingerprint locally first so re-encoded copies of a judged video skip the upload.
+        # Without OpenCV the fingerprint is None and the lookup misses.
+        index = self.video_fingerprint_index(prompt.hash) if self.video_fingerprint_index else None
+        with METRICS.span("fingerprint"):
+            digest, fingerprint = self.cpu_pool.video_digest(
+                file, suffix=os.path.splitext(file.name)[1], fingerprint=index is not None
+            )
+        if index is not None:
+            match = index.lookup(fingerprint)
+            if match:
+                from src.video_fingerprint import HASH_BITS
+                verdict, distance = match
+                return self._complete({
+                    "raw_text": verdict["raw_text"],
+                    "metadata": None,
+                    "type": "Video (near-duplicate)",
+                    "similarity": 1.0 - distance / HASH_BITS
+                }, "near-duplicate", verdict.get("model"), "video", digest, started, prompt.key)
+
+        uploaded_file = None
+        try:
+            uploaded_file = self._upload(file, mime_type, status)
+            prompt_tokens = prompt.tokens + estimate_tokens(uploaded_file)
+            response, served_model = self._judge(model, [prompt.render(), uploaded_file], prompt, prompt_tokens)
+            result = self._complete({
+                "raw_text": response.text,
+                "metadata": response.usage_metadata,
+                "type": "Video"
+            }, "judge", served_model, "video", digest, started, prompt.key)
+            if index is not None and response.text:
+                index.add(fingerprint, {"raw_text": response.text, "model": served_model})
+            if keep_upload:
+                result["uploaded_file"] = uploaded_file
+                uploaded_file = None
+            return result
+        finally:
+            if uploaded_file is not None:
+                self.delete_upload(uploaded_file)
+
+    def evaluate_combined(self, text, file, model, mime_type=None, keep_upload=False, on_status=None):
+        """
+        Judges a post made of `text` (e.g. a caption, already truncated by the caller) and a
+        video in one call: both go in one `contents` list under the combined prompt, so one
+        verdict fills text_artifacts and video_artifacts. The near-duplicate indexes hold
+        single-modality verdicts and are not consulted. Arguments are as in evaluate_video.
+        """
+        started = time.perf_counter()
+        prompt = get_prompt("combined")
+        status = on_status or (lambda message: None)
+        mime_type = mime_type or getattr(file, "type", None)
+
+        with METRICS.span("fingerprint"):
+            video_digest, _ = self.cpu_pool.video_digest(file, suffix=os.path.splitext(file.name)[1], fingerprint=False)
+        digest = content_hash(f"{video_digest}\0{text}")
+
+        uploaded_file = None
+        try:
+            uploaded_file = self._upload(file, mime_type, status)
+            # Estimated locally, as count_tokens would cost a round trip; the video part is
+            # priced by its duration once the File API reports it (see src/tokens.py)
+            prompt_tokens = prompt.estimate_tokens(text) + estimate_tokens(uploaded_file)
+            response, served_model = self._judge(model, [prompt.render(text), uploaded_file], prompt, prompt_tokens)
+            result = self._complete({
+                "raw_text": response.text,
+                "metadata": response.usage_metadata,
+                "type": "Text + Video"
+            }, "judge", served_model, "text+video", digest, started, prompt.key)
+            if keep_upload:
+                result["uploaded_file"] = uploaded_file
+                uploaded_file = None
+            return result
+        finally:
+            if uploaded_file is not None:
+                self.delete_upload(uploaded_file)
+
+    def _upload(self, file, mime_type, status):
+        """Uploads a video to the File API and waits until it is ACTIVE; returns the File."""
+        status("Uploading video to Gemini File API...")
+        with METRICS.span("upload"):
+            uploaded_file = self.client.files.upload(file=file, config={"mime_type": mime_type})
+        try:
+            # Video must be in 'ACTIVE' state before use
+            with METRICS.span("processing"):
+                while uploaded_file.state.name == "PROCESSING":
+                    status(f"Processing video: {uploaded_file.name} (State: {uploaded_file.state.name})")
+                    time.sleep(self.poll_interval)
+                    uploaded_file = self.client.files.get(name=uploaded_file.name)
+            if uploaded_file.state.name != "ACTIVE":
+                raise EvaluationError(f"Video processing failed with state: {uploaded_file.state.name}")
+        except BaseException:
+            self.delete_upload(uploaded_file)
+            raise
+        status("Video processed and ready for analysis.")
+        return uploaded_file
+
+    def delete_upload(self, uploaded_file):
+        """Deletes an uploaded file from the File API to respect storage quota; returns success."""
+        try:
+            self.client.files.delete(name=uploaded_file.name)
+            return True
+        except Exception as e:
+            print(f"Warning: Failed to clean up file {uploaded_file.name}: {e}")
+            return False
@@ -0,0 +1,198 @@
+"""
+Columnar export of stored evaluation results for analytics.
+
+    python -m src.export export --db results.db --out exports/
+    python -m src.export summary --out exports/
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from src.results_store import ResultsStore
+
+EXPORT_SCHEMA = pa.schema([
+    ("created_at", pa.timestamp("ms", tz="UTC")),
+    ("content_hash", pa.string()),
+    ("content_type", pa.string()),
+    ("source", pa.string()),
+    ("prediction", pa.string()),
+    ("confidence", pa.float64()),
+    ("virality", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("candidates_tokens", pa.int64()),
+    ("total_tokens", pa.int64()),
+    ("latency_ms", pa.float64()),
+    ("prompt", pa.string()),
+    ("date", pa.string()),
+    ("model", pa.string()),
+])
+
+PARTITION_COLUMNS = ["date", "model"]
+
+# Filters that select whole date/model partitions, so an export can replace them
+WHOLE_PARTITION_FILTERS = ("since", "model")
+
+# Partition value for rows answered locally (pre-screen) without a model
+NO_MODEL = "none"
+
+
+def _to_record_batch(rows, columns, schema, calibration=None):
+    values = dict(zip(columns, zip(*rows)))
+    created = np.array(values["created_at"], dtype=np.float64)
+    days = (created // 86400).astype(np.int64).astype("datetime64[D]").astype(str)
+    arrays = {
+        "created_at": pa.array((created * 1000).astype(np.int64), type=pa.int64()).cast(schema.field("created_at").type),
+        "date": pa.array(days, type=pa.string()),
+        "model": pa.array([m if m is not None else NO_MODEL for m in values["model"]], type=pa.string()),
+    }
+    if calibration is not None:
+        calibrated = calibration.calibrate_many(
+            values["model"], values["prompt"], values["prediction"], np.array(values["confidence"], dtype=np.float64)
+        )
+        arrays["calibrated_ai_probability"] = pa.array(calibrated, type=pa.float64(), from_pandas=True)
+    for field in schema:
+        if field.name not in arrays:
+            arrays[field.name] = pa.array(values[field.name], type=field.type)
+    return pa.RecordBatch.from_arrays([arrays[f.name] for f in schema], schema=schema)
+
+
+def export_results(store, out_dir, include_raw_text=False, batch_size=50000, rows_per_group=100000,
+                   calibration=None, **filters):
+    """
+    Streams rows from a ResultsStore into a Parquet dataset partitioned as
+    out_dir/date=YYYY-MM-DD/model=<model>/. Rows are read and written in batches
+    and grouped into row groups of up to `rows_per_group` rows, so memory use is
+    bounded by the batch size rather than the table size. With a CalibrationEngine,
+    a calibrated_ai_probability column is added (null where the group is uncalibrated).
+    Filters are those of ResultsStore.iter_batches. When they select whole partitions
+    (only `since`, rounded down to the start of its UTC day, and `model`), each partition
+    written replaces its previous export, so exporting again never duplicates rows and
+    partitions outside the filters are kept. Any other filter selects part of a
+    partition: its rows are added as new files next to what is already exported, so
+    such exports are best written to their own `out_dir`.
+    Returns the row count.
+    """
+    if filters.get("since") is not None:
+        filters["since"] = filters["since"] // 86400 * 86400
+    whole_partitions = all(value is None for name, value in filters.items() if name not in WHOLE_PARTITION_FILTERS)
+    schema = EXPORT_SCHEMA
+    if include_raw_text:
+        schema = schema.insert(len(schema) - 2, pa.field("raw_text", pa.string()))
+    if calibration is not None:
+        schema = schema.insert(len(schema) - 2, pa.field("calibrated_ai_probability", pa.float64()))
+    columns = [name for name in schema.names if name not in ("date", "calibrated_ai_probability")]
+    exported = 0
+
+    def batches():
+        nonlocal exported
+        for rows in store.iter_batches(batch_size=batch_size, columns=columns, **filters):
+            exported += len(rows)
+            yield _to_record_batch(rows, columns, schema, calibration)
+
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(schema, batches()),
+        out_dir,
+        format="parquet",
+        partitioning=PARTITION_COLUMNS,
+        partitioning_flavor="hive",
+        basename_template="part-{i}.parquet" if whole_partitions else f"part-{int(time.time() * 1000)}-{{i}}.parquet",
+        min_rows_per_group=min(rows_per_group, batch_size),
+        max_rows_per_group=rows_per_group,
+        existing_data_behavior="delete_matching" if whole_partitions else "overwrite_or_ignore",
+    )
+    return exported
+
+
+def summarize(path, bins=10, batch_size=65536):
+    """
+    Builds a report over an exported dataset by scanning it batch by batch:
+    prediction distribution, confidence histogram and per-model token totals.
+    Only the needed columns are read and nothing is materialized in full.
+    """
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    columns = ["model", "prediction", "confidence", "prompt_tokens", "candidates_tokens", "total_tokens", "latency_ms"]
+    edges = np.linspace(0.0, 1.0, bins + 1)
+
+    rows = 0
+    predictions = {}
+    histogram = np.zeros(bins, dtype=np.int64)
+    models = {}
+    sums = ["prompt_tokens", "candidates_tokens", "total_tokens", "latency_ms"]
+
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        if not batch.num_rows:
+            continue
+        rows += batch.num_rows
+
+        for entry in pc.value_counts(batch.column("prediction")).to_pylist():
+            key = entry["values"] if entry["values"] is not None else "[Missing]"
+            predictions[key] = predictions.get(key, 0) + entry["counts"]
+
+        confidence = batch.column("confidence").to_numpy(zero_copy_only=False)
+        confidence = confidence[~np.isnan(confidence)]
+        histogram += np.histogram(np.clip(confidence, 0.0, 1.0), bins=edges)[0]
+
+        grouped = pa.Table.from_batches([batch]).group_by("model").aggregate(
+            [(c, "sum") for c in sums] + [("latency_ms", "count"), ("model", "count")]
+        )
+        for row in grouped.to_pylist():
+            totals = models.setdefault(row["model"], {"count": 0, "latency_count": 0, **{c: 0 for c in sums}})
+            totals["count"] += row["model_count"]
+            totals["latency_count"] += row["latency_ms_count"]
+            for c in sums:
+                totals[c] += row[f"{c}_sum"] or 0
+
+    for totals in models.values():
+        latency_count = totals.pop("latency_count")
+        totals["avg_latency_ms"] = totals.pop("latency_ms") / latency_count if latency_count else None
+
+    return {
+        "rows": rows,
+        "predictions": predictions,
+        "confidence_histogram": {"edges": edges.tolist(), "counts": histogram.tolist()},
+        "models": models,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export evaluation results to Parquet and summarize them.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="Stream results.db into a partitioned Parquet dataset")
+    export_cmd.add_argument("--db", default="results.db")
+    export_cmd.add_argument("--out", default="exports")
+    export_cmd.add_argument("--since", help="Only rewrite partitions from this date on (YYYY-MM-DD, UTC); earlier ones are kept")
+    export_cmd.add_argument("--raw-text", action="store_true", help="Include the raw model response")
+    export_cmd.add_argument("--calibration", help="Calibration state (calibration.json) for a calibrated_ai_probability column")
+
+    summary_cmd = sub.add_parser("summary", help="Report over an exported dataset")
+    summary_cmd.add_argument("--out", default="exports")
+    summary_cmd.add_argument("--bins", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        since = None
+        if args.since:
+            since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+        store = ResultsStore(args.db)
+        try:
+            calibration = None
+            if args.calibration:
+                from src.calibration import CalibrationEngine
+                calibration = CalibrationEngine(args.calibration)
+            count = export_results(store, args.out, include_raw_text=args.raw_text, since=since,
+                                   calibration=calibration)
+        finally:
+            store.close()
+        print(f"Exported {count} rows to {args.out}")
+    else:
+        print(json.dumps(summarize(args.out, bins=args.bins), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Status of asynchronous evaluation jobs, in SQLite so every service worker process can
+answer for a job started by another.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+STATUSES = ("queued", "running", "succeeded", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at);
+"""
+
+
+class JobStore:
+    def __init__(self, path="jobs.db", retention=24 * 3600):
+        """Finished jobs older than `retention` seconds are purged as new jobs are created."""
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        if "owner" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections are per-thread; each thread keeps its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind, owner=None):
+        """`owner` (a key fingerprint) is the only caller `get` shows the job to."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+                (now - self.retention,)
+            )
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, created_at, updated_at, owner) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, now, now, owner)
+            )
+        return job_id
+
+    def update(self, job_id, status, result=None, error=None):
+        if status not in STATUSES:
+            raise ValueError(f"Unknown job status: {status}")
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, result = ?, error = ? WHERE id = ?",
+                (status, time.time(), json.dumps(result) if result is not None else None, error, job_id)
+            )
+
+    def get(self, job_id, owner=None):
+        """The job as a dict, or None if it does not exist (or was purged) or belongs to another owner."""
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row["owner"] != owner:
+            return None
+        job = dict(row)
+        del job["owner"]
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
@@ -0,0 +1,311 @@
+"""
+Lightweight latency and throughput metrics with Prometheus text exposition.
+
+Metrics are disabled by default and every recording call returns after a single
+flag check. Enable them with LLM_JUDGE_METRICS=1 (see configure_from_env) or enable().
+"""
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from sub-millisecond local work to multi-minute limiter waits
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+THROUGHPUT_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels):
+        """Returns (bucket counts, sum, count) for one label set, mainly for tests."""
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            if series is None:
+                return [0] * (len(self.buckets) + 1), 0.0, 0
+            return list(series[0]), series[1], series[2]
+
+    def _render_series(self, key, series):
+        counts, total, count = series
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, (("le", _format_value(float(bound))),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("registry", "stage", "labels", "start")
+
+    def __init__(self, registry, stage, labels):
+        self.registry = registry
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        outcome = "error" if exc_type else "ok"
+        self.registry.stage_seconds.observe(elapsed, stage=self.stage, outcome=outcome, **self.labels)
+        self.registry._export_otel("llm_judge_stage_seconds", elapsed, {"stage": self.stage, "outcome": outcome, **self.labels})
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = False
+        self._otel_instruments = None
+        self.stage_seconds = Histogram(
+            "llm_judge_stage_seconds", "Wall time per evaluation stage.", ("stage", "model", "outcome"))
+        self.limiter_wait_seconds = Histogram(
+            "llm_judge_limiter_wait_seconds", "Time spent queued in RateLimiter.wait_if_needed.", ("model",))
+        self.limiter_sleeps = Counter(
+            "llm_judge_limiter_sleeps_total", "Limiter sleeps by the limit that triggered them.", ("model", "reason"))
+        self.tokens = Counter(
+            "llm_judge_tokens_total", "Tokens reported by usage metadata.", ("model", "kind"))
+        self.token_throughput = Histogram(
+            "llm_judge_output_tokens_per_second", "Response tokens per second of generation time.",
+            ("model",), buckets=THROUGHPUT_BUCKETS)
+        self.retries = Counter(
+            "llm_judge_retries_total", "Upstream calls retried, by status code.", ("model", "code"))
+        self.admission_wait_seconds = Histogram(
+            "llm_judge_admission_wait_seconds", "Limiter admission wait by priority class.", ("model", "priority"))
+        self.admission_queue = Gauge(
+            "llm_judge_admission_queue_depth", "Requests waiting for limiter admission.", ("model", "priority"))
+        self._metrics = [self.stage_seconds, self.limiter_wait_seconds, self.limiter_sleeps,
+                         self.tokens, self.token_throughput, self.retries,
+                         self.admission_wait_seconds, self.admission_queue]
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def span(self, stage, **labels):
+        """Times a block as one observation of llm_judge_stage_seconds{stage=...}."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage, labels)
+
+    def observe_stage(self, stage, seconds, **labels):
+        """Records a stage duration measured by the caller."""
+        if self.enabled:
+            self.stage_seconds.observe(seconds, stage=stage, outcome="ok", **labels)
+            self._export_otel("llm_judge_stage_seconds", seconds, {"stage": stage, "outcome": "ok", **labels})
+
+    def observe_wait(self, model, seconds):
+        if self.enabled:
+            self.limiter_wait_seconds.observe(seconds, model=model)
+            self._export_otel("llm_judge_limiter_wait_seconds", seconds, {"model": model})
+
+    def admission_queue_depth(self, model, priority, delta):
+        if self.enabled:
+            self.admission_queue.inc(delta, model=model, priority=priority)
+
+    def observe_admission_wait(self, model, priority, seconds):
+        if self.enabled:
+            self.admission_wait_seconds.observe(seconds, model=model, priority=priority)
+
+    def record_sleep(self, model, reason):
+        if self.enabled:
+            self.limiter_sleeps.inc(model=model, reason=reason)
+
+    def record_retry(self, model, code):
+        if self.enabled:
+            self.retries.inc(model=model, code=code)
+
+    def record_usage(self, model, usage_metadata, generation_seconds):
+        if not self.enabled or usage_metadata is None:
+            return
+        prompt = getattr(usage_metadata, "prompt_token_count", None) or 0
+        candidates = getattr(usage_metadata, "candidates_token_count", None) or 0
+        self.tokens.inc(prompt, model=model, kind="prompt")
+        self.tokens.inc(candidates, model=model, kind="candidates")
+        if generation_seconds > 0 and candidates:
+            self.token_throughput.observe(candidates / generation_seconds, model=model)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Atomically writes the exposition to `path` (node_exporter textfile collector)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port=9464, addr="0.0.0.0"):
+        """Serves /metrics from a daemon thread and returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((addr, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def enable_otel(self):
+        """
+        Mirrors histogram observations to the OpenTelemetry metrics API.
+        Exporter setup (OTLP endpoint etc.) is left to the standard OTEL_* configuration.
+        """
+        try:
+            from opentelemetry import metrics as otel_metrics
+        except ImportError:
+            print("Warning: opentelemetry-api is not installed; OpenTelemetry export disabled.")
+            return False
+        meter = otel_metrics.get_meter("llm_judge")
+        self._otel_instruments = {
+            name: meter.create_histogram(name, unit="s")
+            for name in ("llm_judge_stage_seconds", "llm_judge_limiter_wait_seconds")
+        }
+        return True
+
+    def _export_otel(self, name, value, attributes):
+        if self._otel_instruments is not None:
+            self._otel_instruments[name].record(value, attributes=attributes)
+
+
+METRICS = Registry()
+
+
+def span(stage, **labels):
+    return METRICS.span(stage, **labels)
+
+
+def configure_from_env():
+    """
+    Enables metrics according to the environment:
+    - LLM_JUDGE_METRICS=1 turns recording on
+    - LLM_JUDGE_METRICS_PORT serves /metrics over HTTP (default 9464, 0 disables)
+    - LLM_JUDGE_OTEL=1 mirrors histograms to OpenTelemetry
+    Returns the HTTP server if one was started.
+    """
+    if os.environ.get("LLM_JUDGE_METRICS", "0").lower() not in ("1", "true", "yes"):
+        return None
+    METRICS.enable()
+    if os.environ.get("LLM_JUDGE_OTEL", "0").lower() in ("1", "true", "yes"):
+        METRICS.enable_otel()
+    port = int(os.environ.get("LLM_JUDGE_METRICS_PORT", "9464"))
+    if port:
+        return METRICS.start_http_server(port)
+    return None
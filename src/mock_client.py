@@ -1,5 +1,10 @@
 import os
 import json
+import math
+import random
+import threading
+import time
+from src.tokens import estimate_tokens
 
 try:
     from google.genai.types import GenerateContentConfig
@@ -20,10 +25,147 @@ class MockUsageMetadata:
         self.total_token_count = self.prompt_token_count + self.candidates_token_count
 
 class MockResponse:
-    def __init__(self, text, prompt_tokens, candidate_tokens=None):
+    def __init__(self, text, prompt_tokens, candidate_tokens=None, latency_seconds=0.0, model_version=None):
         self.text = text
+        self.model_version = model_version
         # If only total tokens provided (old way), treat as prompt tokens for metadata
         self.usage_metadata = MockUsageMetadata(prompt_tokens, candidate_tokens)
+        # Simulated server time, so benchmarks can separate client overhead from service latency
+        self.latency_seconds = latency_seconds
+
+class MockAPIError(Exception):
+    """
+    Mirrors the attributes of google.genai.errors.APIError (code, status, message, details)
+    so retry and error handling code can be exercised without the network.
+    """
+    def __init__(self, code, status, message, details=None):
+        super().__init__(f"{code} {status}. {message}")
+        self.code = code
+        self.status = status
+        self.message = message
+        self.details = details or {"error": {"code": code, "status": status, "message": message}}
+
+def _rate_limit_error(retry_after):
+    return MockAPIError(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).", {
+        "error": {
+            "code": 429,
+            "status": "RESOURCE_EXHAUSTED",
+            "message": "Resource has been exhausted (e.g. check quota).",
+            "details": [{
+                "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                "retryDelay": f"{max(1, int(retry_after + 0.999))}s"
+            }]
+        }
+    })
+
+def constant_latency(seconds):
+    return lambda rng: seconds
+
+def uniform_latency(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+def lognormal_latency(median, sigma):
+    """Right-skewed latency with the given median, typical of LLM APIs."""
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+class MockServer:
+    """
+    Simulated server-side behavior shared by a MockClient's models and chats:
+    latency, injected failures, response sizes and per-model quota enforcement.
+    All randomness comes from one seeded RNG, so runs are reproducible.
+    """
+    def __init__(self, latency=None, error_rate=0.0, rate_limit_rate=0.0,
+                 padding_tokens=None, quota=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.padding_tokens = padding_tokens
+        self.quota = quota
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._scripted = []
+        self.stats = {"requests": 0, "succeeded": 0, "rate_limited": 0, "errors": 0}
+
+    def inject(self, *codes, model=None):
+        """
+        Queues deterministic failures: the next requests (to `model`, or any model)
+        fail with the given status codes in order, before quota and random faults apply.
+        """
+        with self._lock:
+            self._scripted.extend((model, code) for code in codes)
+
+    def _scripted_error(self, model):
+        for i, (target, code) in enumerate(self._scripted):
+            if target is None or target == model:
+                del self._scripted[i]
+                if code == 429:
+                    self.stats["rate_limited"] += 1
+                    return _rate_limit_error(1)
+                self.stats["errors"] += 1
+                return MockAPIError(code, "UNAVAILABLE" if code == 503 else "INTERNAL", "Injected failure.")
+        return None
+
+    def _sample(self, fn):
+        with self._lock:
+            return fn(self._rng)
+
+    def _quota_for(self, model):
+        if not self.quota:
+            return None
+        if any(k in self.quota for k in ("rpm", "tpm", "rpd")):
+            return self.quota
+        return self.quota.get(model)
+
+    def admit(self, model, tokens):
+        """Applies quota and fault injection; raises MockAPIError when the request is rejected."""
+        now = time.time()
+        with self._lock:
+            self.stats["requests"] += 1
+            error = self._scripted_error(model)
+            if error is not None:
+                raise error
+            quota = self._quota_for(model)
+            if quota:
+                window = [e for e in self._requests.get(model, []) if e[0] > now - 86400]
+                self._requests[model] = window
+                minute = [e for e in window if e[0] > now - 60]
+                over = (
+                    len(minute) >= quota.get("rpm", float("inf"))
+                    or sum(t for _, t in minute) + tokens > quota.get("tpm", float("inf"))
+                    or len(window) >= quota.get("rpd", float("inf"))
+                )
+                if over:
+                    self.stats["rate_limited"] += 1
+                    retry_after = 60 - (now - minute[0][0]) if minute else 1
+                    raise _rate_limit_error(retry_after)
+                window.append((now, tokens))
+
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                raise _rate_limit_error(self._rng.uniform(1, 5))
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                raise MockAPIError(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+
+    def respond(self):
+        """Sleeps for the simulated latency and returns it."""
+        latency = self._sample(self.latency) if self.latency else 0.0
+        if latency > 0:
+            time.sleep(latency)
+        with self._lock:
+            self.stats["succeeded"] += 1
+        return latency
+
+    def padding(self):
+        """Filler appended to the reasoning text to add roughly `padding_tokens` response tokens."""
+        if not self.padding_tokens:
+            return ""
+        tokens = self.padding_tokens if isinstance(self.padding_tokens, int) else self._sample(self.padding_tokens)
+        # 4 characters per token, matching _estimate_tokens
+        return " lorem" * (max(0, int(tokens)) * 4 // 6)
 
 class MockFile:
     def __init__(self, name, uri, mime_type):
@@ -41,52 +183,16 @@ def _get_sys_inst(config):
         return config.get('system_instruction')
     return getattr(config, 'system_instruction', None)
 
-def _estimate_tokens(contents, system_instruction=None):
-    """
-    Estimates tokens based on content type:
-    - Text: 1 token per 4 characters
-    - Image: 70 tokens (simplified)
-    - Video: 280 tokens (simplified)
-    """
-    total = 0
-    if system_instruction:
-        total += _estimate_tokens(str(system_instruction))
-
-    if contents is None:
-        return total
-    
-    if isinstance(contents, str):
-        total += len(contents) // 4 + 1
-        return total
-    
-    if isinstance(contents, list):
-        total += sum(_estimate_tokens(part) for part in contents)
-        return total
-    
-    # Check for objects with mime_type (like MockFile or GenAI File)
-    mime_type = getattr(contents, 'mime_type', None)
-    if mime_type:
-        if mime_type.startswith('image/'):
-            total += 70
-        elif mime_type.startswith('video/'):
-            total += 280
-        return total
-            
-    # Check for PIL Image or similar objects
-    if hasattr(contents, 'size') and hasattr(contents, 'format'):
-        total += 70
-        return total
-        
-    # Fallback to string conversion
-    total += len(str(contents)) // 4 + 1
-    return total
+# Mock usage accounting uses the same local estimate the app uses
+_estimate_tokens = estimate_tokens
 
 class MockChat:
-    def __init__(self, model, config=None):
+    def __init__(self, model, config=None, server=None, history=None):
         self.model = model
         self.config = config
+        self.server = server or MockServer()
         self.system_instruction = _get_sys_inst(config)
-        self.history = []
+        self.history = list(history or [])
 
     def get_history(self):
         return self.history
@@ -96,7 +202,9 @@ class MockChat:
         config = kwargs.get('config', self.config)
         sys_inst = _get_sys_inst(config) or self.system_instruction
         
-        input_tokens = _estimate_tokens(message, system_instruction=sys_inst)
+        # Like the real API, every turn is billed for the whole history plus the new message
+        input_tokens = _estimate_tokens([*self.history, message], system_instruction=sys_inst)
+        self.server.admit(self.model, input_tokens)
         
         # JSON formatted response for the judge
         json_content = {
@@ -105,7 +213,7 @@ class MockChat:
                 "confidence_score": 0.85,
                 "text_artifacts": [],
                 "video_artifacts": ["Consistent frame flickering", "Static background"],
-                "technical_reasoning": "The content exhibits high perplexity variance characteristic of generative models."
+                "technical_reasoning": "The content exhibits high perplexity variance characteristic of generative models." + self.server.padding()
             },
             "social_performance": {
                 "virality_score": 7,
@@ -123,12 +231,16 @@ class MockChat:
         text = f"```json\n{json.dumps(json_content, indent=2)}\n```"
         output_tokens = _estimate_tokens(text)
         
+        latency = self.server.respond()
         self.history.append({"role": "user", "parts": [message]})
         self.history.append({"role": "model", "parts": [text]})
         
-        return MockResponse(text, input_tokens, output_tokens)
+        return MockResponse(text, input_tokens, output_tokens, latency, model_version=self.model)
 
 class MockModels:
+    def __init__(self, server=None):
+        self.server = server or MockServer()
+
     def count_tokens(self, model, contents, config=None):
         sys_inst = _get_sys_inst(config)
         tokens = _estimate_tokens(contents, system_instruction=sys_inst)
@@ -139,6 +251,7 @@ class MockModels:
         sys_inst = _get_sys_inst(config)
         
         input_tokens = _estimate_tokens(contents, system_instruction=sys_inst)
+        self.server.admit(model, input_tokens)
         
         json_content = {
             "origin_analysis": {
@@ -146,7 +259,7 @@ class MockModels:
                 "confidence_score": 0.92,
                 "text_artifacts": ["Personal anecdotes", "Emotional depth"],
                 "video_artifacts": [],
-                "technical_reasoning": "The content shows organic complexity and unique creative choices reflecting personal intent."
+                "technical_reasoning": "The content shows organic complexity and unique creative choices reflecting personal intent." + self.server.padding()
             },
             "social_performance": {
                 "virality_score": 4,
@@ -163,12 +276,16 @@ class MockModels:
         }
         text = f"```json\n{json.dumps(json_content, indent=2)}\n```"
         output_tokens = _estimate_tokens(text)
+        latency = self.server.respond()
         
-        return MockResponse(text, input_tokens, output_tokens)
+        return MockResponse(text, input_tokens, output_tokens, latency, model_version=model)
 
 class MockChats:
+    def __init__(self, server=None):
+        self.server = server or MockServer()
+
     def create(self, model, **kwargs):
-        return MockChat(model, config=kwargs.get('config'))
+        return MockChat(model, config=kwargs.get('config'), server=self.server, history=kwargs.get('history'))
 
 class MockFiles:
     def __init__(self):
@@ -233,11 +350,19 @@ class MockFiles:
             print(f"Warning: Mock delete failed, file {name} not found.")
 
 class MockClient:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, **server_options):
         """
         Mock client that mimics the google.genai.Client interface.
         Accepts api_key for drop-in compatibility with main.py.
+
+        Optional load-testing behavior (see MockServer):
+        - latency: callable(rng) -> seconds, e.g. lognormal_latency(0.8, 0.5)
+        - error_rate / rate_limit_rate: probability of an injected 503 / 429
+        - padding_tokens: int or callable(rng) -> extra tokens added to each response
+        - quota: {"rpm", "tpm", "rpd"} enforced server-side, globally or per model
+        - seed: makes latency and fault injection reproducible
         """
-        self.models = MockModels()
-        self.chats = MockChats()
+        self.server = MockServer(**server_options)
+        self.models = MockModels(self.server)
+        self.chats = MockChats(self.server)
         self.files = MockFiles()
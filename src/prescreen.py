@@ -0,0 +1,201 @@
+import re
+import numpy as np
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]*")
+
+# Texts shorter than this carry too little signal for stylometry and always escalate.
+MIN_WORDS = 40
+
+# Segment length for the mean segmental type/token ratio (length-independent TTR).
+SEGMENT_WORDS = 50
+
+# Logistic weights over the stylometric features, as (weight, centre) pairs, plus a bias.
+# Positive weights push towards "AI-Generated". Fitted with fit_weights() on the labeled
+# sample in benchmarks/data/prescreen_sample.jsonl; benchmarks/bench_prescreen.py reports
+# their accuracy on held-out texts by leave-one-out cross-validation.
+FEATURE_WEIGHTS = {
+    "sentence_length_cv": (-1.966, 0.4283),
+    "trigram_repetition": (22.2, 0.001382),
+    "segmental_ttr": (-0.7775, 0.8722),
+    "mean_word_length": (1.333, 5.543),
+    "unigram_entropy": (29.16, 0.937),
+}
+FEATURE_BIAS = 0.3253
+
+# Typical spread of each feature across texts. fit_weights standardizes by these rather
+# than by the sample's spread, so a feature that barely varies in a small sample (e.g.
+# trigram repetition) cannot get an outsized weight.
+FEATURE_SCALES = {
+    "sentence_length_cv": 0.25,
+    "trigram_repetition": 0.05,
+    "segmental_ttr": 0.05,
+    "mean_word_length": 1.0,
+    "unigram_entropy": 0.02,
+}
+
+# L2 penalty and gradient descent schedule of fit_weights (on standardized features)
+FIT_L2 = 0.01
+FIT_STEPS = 3000
+FIT_LEARNING_RATE = 0.5
+
+
+class PrescreenResult:
+    def __init__(self, score, features, escalate, origin_analysis):
+        self.score = score
+        self.features = features
+        self.escalate = escalate
+        self.origin_analysis = origin_analysis
+
+    def to_evaluation(self):
+        """
+        Returns a raw evaluation dict accepted by sanitize_evaluation.
+        Sections the pre-screen cannot judge are left out and surface as "[Missing]".
+        """
+        return {
+            "origin_analysis": self.origin_analysis,
+            "metadata": {
+                "analysis_summary": "Provisional verdict from the local stylometric pre-screen; the LLM judge was not called."
+            }
+        }
+
+
+def extract_features(text):
+    """
+    Computes stylometric features for a text with vectorized NumPy:
+    - sentence_length_cv: coefficient of variation of sentence lengths (burstiness)
+    - trigram_repetition: share of word trigrams that repeat an earlier trigram
+    - segmental_ttr: mean type/token ratio over fixed-size word segments
+    - mean_word_length: average characters per word
+    - unigram_entropy: word entropy normalized by log(word count), a perplexity proxy
+    Returns None when the text has no words.
+    """
+    words = _WORD_RE.findall(text.lower())
+    n = len(words)
+    if n == 0:
+        return None
+
+    vocab, ids, counts = np.unique(np.array(words), return_inverse=True, return_counts=True)
+    ids = ids.astype(np.int64)
+
+    sentence_lengths = np.array(
+        [len(_WORD_RE.findall(s.lower())) for s in _SENTENCE_RE.findall(text)],
+        dtype=np.float64
+    )
+    sentence_lengths = sentence_lengths[sentence_lengths > 0]
+    if sentence_lengths.size > 1 and sentence_lengths.mean() > 0:
+        sentence_length_cv = float(sentence_lengths.std() / sentence_lengths.mean())
+    else:
+        sentence_length_cv = 0.0
+
+    if n >= 3:
+        v = np.int64(len(vocab))
+        trigrams = (ids[:-2] * v + ids[1:-1]) * v + ids[2:]
+        trigram_repetition = 1.0 - np.unique(trigrams).size / trigrams.size
+    else:
+        trigram_repetition = 0.0
+
+    segments = n // SEGMENT_WORDS
+    if segments:
+        block = np.sort(ids[:segments * SEGMENT_WORDS].reshape(segments, SEGMENT_WORDS), axis=1)
+        distinct = 1 + np.count_nonzero(np.diff(block, axis=1), axis=1)
+        segmental_ttr = float(distinct.mean() / SEGMENT_WORDS)
+    else:
+        segmental_ttr = len(vocab) / n
+
+    word_lengths = np.char.str_len(vocab)
+    mean_word_length = float((word_lengths * counts).sum() / n)
+
+    p = counts / n
+    entropy = float(-(p * np.log(p)).sum())
+    unigram_entropy = entropy / np.log(n) if n > 1 else 0.0
+
+    return {
+        "sentence_length_cv": sentence_length_cv,
+        "trigram_repetition": float(trigram_repetition),
+        "segmental_ttr": segmental_ttr,
+        "mean_word_length": mean_word_length,
+        "unigram_entropy": float(unigram_entropy),
+    }
+
+
+def fit_weights(feature_rows, labels, l2=FIT_L2, steps=FIT_STEPS, learning_rate=FIT_LEARNING_RATE):
+    """
+    Fits (FEATURE_WEIGHTS-style weights, bias) by L2-regularized logistic regression.
+    `feature_rows` are extract_features() dicts and `labels` are true for AI-generated texts.
+    """
+    names = list(FEATURE_SCALES)
+    x = np.array([[row[name] for name in names] for row in feature_rows], dtype=np.float64)
+    y = np.asarray(labels, dtype=np.float64)
+    centres = x.mean(axis=0)
+    scales = np.array([FEATURE_SCALES[name] for name in names])
+    z = (x - centres) / scales
+    w = np.zeros(len(names))
+    bias = 0.0
+    for _ in range(steps):
+        error = 1.0 / (1.0 + np.exp(-(z @ w + bias))) - y
+        w -= learning_rate * (z.T @ error / len(y) + l2 * w)
+        bias -= learning_rate * float(error.mean())
+    # Back to raw feature units, centred on the training means
+    weights = {name: (float(w[i] / scales[i]), float(centres[i])) for i, name in enumerate(names)}
+    return weights, bias
+
+
+def _score(features, model=None):
+    weights, bias = model or (FEATURE_WEIGHTS, FEATURE_BIAS)
+    pairs = np.array([weights[name] for name in FEATURE_WEIGHTS])
+    values = np.array([features[name] for name in FEATURE_WEIGHTS])
+    logit = float(np.dot(pairs[:, 0], values - pairs[:, 1])) + bias
+    return 1.0 / (1.0 + np.exp(-logit))
+
+
+def _artifacts(features, ai_leaning):
+    artifacts = []
+    if ai_leaning:
+        if features["sentence_length_cv"] < 0.35:
+            artifacts.append(f"Uniform sentence lengths (CV {features['sentence_length_cv']:.2f})")
+        if features["trigram_repetition"] > 0.05:
+            artifacts.append(f"Repeated word trigrams ({features['trigram_repetition']:.0%})")
+        if features["mean_word_length"] > 5.5:
+            artifacts.append(f"Long average word length ({features['mean_word_length']:.1f} chars)")
+        if features["segmental_ttr"] > 0.9:
+            artifacts.append(f"Consistently high lexical diversity (TTR {features['segmental_ttr']:.2f})")
+    else:
+        if features["sentence_length_cv"] > 0.55:
+            artifacts.append(f"Bursty sentence lengths (CV {features['sentence_length_cv']:.2f})")
+        if features["mean_word_length"] < 4.5:
+            artifacts.append(f"Short, conversational vocabulary ({features['mean_word_length']:.1f} chars/word)")
+        if features["segmental_ttr"] < 0.8:
+            artifacts.append(f"Informal word reuse (TTR {features['segmental_ttr']:.2f})")
+    return artifacts
+
+
+def prescreen_text(text, lower=0.2, upper=0.8, model=None):
+    """
+    Scores a text locally and returns a PrescreenResult.
+    `score` is the estimated probability that the text is AI-generated. Scores inside
+    the (lower, upper) band are uncertain and set `escalate`, meaning the caller
+    should fall back to the LLM judge. `model` is a (weights, bias) pair from
+    fit_weights(); FEATURE_WEIGHTS and FEATURE_BIAS by default.
+    """
+    features = extract_features(text) if text else None
+    word_count = len(_WORD_RE.findall(text.lower())) if text else 0
+
+    if features is None or word_count < MIN_WORDS:
+        return PrescreenResult(None, features, True, None)
+
+    score = _score(features, model)
+    escalate = lower < score < upper
+    ai_leaning = score >= 0.5
+
+    origin_analysis = {
+        "prediction": "AI-Generated" if ai_leaning else "Human-Generated",
+        "confidence_score": round(score if ai_leaning else 1.0 - score, 2),
+        "text_artifacts": _artifacts(features, ai_leaning),
+        "video_artifacts": [],
+        "technical_reasoning": (
+            f"Local stylometric pre-screen: sentence-length CV {features['sentence_length_cv']:.2f}, "
+            f"segmental TTR {features['segmental_ttr']:.2f}, trigram repetition {features['trigram_repetition']:.2f}."
+        )
+    }
+    return PrescreenResult(score, features, escalate, origin_analysis)
@@ -1,10 +1,98 @@
-
-system_prompt = '''
+"""
+Versioned judge prompts, registered per modality.
+
+A judge prompt is a system instruction plus a user template. Text-only and video-only
+evaluations get a system prompt without the other modality's guidance; the combined
+prompt is kept for mixed content. Templates are compiled once at import: token estimates
+are precomputed and each carries a hash of its name, version and text, which the app
+uses to key cached verdicts so a prompt change never serves verdicts from an older one.
+A changed prompt is registered as a new version rather than edited in place.
+"""
+import hashlib
+from src.tokens import estimate_tokens
+
+# The placeholder a user template may contain for the judged content
+CONTENT_SLOT = "{content}"
+
+
+class PromptTemplate:
+    def __init__(self, name, version, system, user):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+        # Split around the slot once, so rendering is a concatenation and content is never parsed
+        self._prefix, slot, self._suffix = user.partition(CONTENT_SLOT)
+        self.has_content = bool(slot)
+        self.system_tokens = estimate_tokens(system)
+        self.user_tokens = estimate_tokens(self._prefix + self._suffix)
+        self.hash = hashlib.sha256(f"{name}\0{version}\0{system}\0{user}".encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def key(self):
+        return f"{self.name}@v{self.version}"
+
+    @property
+    def tokens(self):
+        """Estimated tokens of the system instruction and the template without content."""
+        return self.system_tokens + self.user_tokens
+
+    def render(self, content=None):
+        if not self.has_content:
+            return self.user
+        return self._prefix + content + self._suffix
+
+    def estimate_tokens(self, content=None):
+        """Prompt tokens of a request made from this template, without a count_tokens call."""
+        return self.tokens + (estimate_tokens(content) if content is not None else 0)
+
+
+class PromptRegistry:
+    def __init__(self):
+        self._templates = {}
+
+    def __iter__(self):
+        for versions in self._templates.values():
+            yield from versions.values()
+
+    def register(self, template):
+        versions = self._templates.setdefault(template.name, {})
+        existing = versions.get(template.version)
+        if existing is not None and existing.hash != template.hash:
+            raise ValueError(f"{template.key} is already registered with different text; register a new version")
+        versions[template.version] = template
+        return template
+
+    def versions(self, name):
+        return sorted(self._templates.get(name, {}))
+
+    def get(self, name, version=None):
+        """The template `name` at `version`, or its latest version."""
+        versions = self._templates.get(name)
+        if not versions:
+            raise KeyError(f"Unknown prompt: {name}")
+        if version is None:
+            version = max(versions)
+        if version not in versions:
+            raise KeyError(f"Unknown version {version} of prompt {name}; available: {sorted(versions)}")
+        return versions[version]
+
+
+PROMPTS = PromptRegistry()
+
+
+def get_prompt(modality, version=None):
+    """The judge prompt for "text", "video" or "combined" content."""
+    return PROMPTS.get(f"judge-{modality}", version)
+
+
+def _judge_system_prompt(task, origin_signals, hook, artifacts_contract):
+    return f'''
 ## System Prompt: Content Authenticity & Virality Analyst
 
 **Role:** You are an expert Digital Forensic Analyst and Social Media Strategist specializing in AI-detection and viral content behavior.
 
-**Task:** Evaluate the provided content — which may include text, video, or both — and produce a structured verdict covering its origin, social potential, and distribution fit.
+**Task:** {task}
 
 ---
 
@@ -13,12 +101,10 @@ system_prompt = '''
 Before producing output, reason across these dimensions:
 
 **Origin Detection — signals to examine:**
-- *Text:* Syntactic perfection, over-formality, absence of colloquialisms, repetitive sentence cadence, hedging language patterns typical of LLMs.
-- *Video:* Facial rendering artifacts ("uncanny valley"), unnatural blinking or micro-expressions, overly smooth skin/hair, background inconsistencies, audio-lip sync drift, lighting uniformity.
-- *Human markers:* Natural speech disfluencies, improvised framing, genuine emotional inconsistency, environmental noise, cultural slang.
+{origin_signals}
 
 **Virality Assessment — signals to examine:**
-- Presence of a strong hook in the first 3 seconds or opening line.
+- Presence of a strong hook in {hook}.
 - Emotional trigger type: outrage, awe, humor, relatability, aspiration.
 - Alignment with current platform algorithm preferences (short-form, retention loops, shareability).
 - Novelty vs. familiarity balance (the "fresh but recognizable" principle).
@@ -35,33 +121,33 @@ Before producing output, reason across these dimensions:
 Return your analysis **only** as a valid JSON object. No markdown outside the JSON block. No conversational filler.
 
 ```json
-{
-"origin_analysis": {
+{{
+"origin_analysis": {{
     "prediction": "AI-Generated | Human-Generated | Hybrid",
     "confidence_score": 0.00,
     "text_artifacts": ["string"],
     "video_artifacts": ["string"],
     "technical_reasoning": "string"
-},
-"social_performance": {
+}},
+"social_performance": {{
     "virality_score": 0,
     "performance_drivers": ["string", "string"],
     "strategic_reasoning": "string"
-},
-"distribution_strategy": {
+}},
+"distribution_strategy": {{
     "target_audiences": ["string", "string"],
     "resonance_factor": "string"
-},
-"metadata": {
+}},
+"metadata": {{
     "analysis_summary": "string"
-}
-}
+}}
+}}
 ```
 
 ### Field Contracts:
 - `prediction`: One of exactly three string literals — `"AI-Generated"`, `"Human-Generated"`, `"Hybrid"`.
 - `confidence_score`: Float, range 0.0 to 1.0.
-- `text_artifacts` / `video_artifacts`: Array of specific observed signals justifying the prediction. Empty array `[]` if content type is absent.
+{artifacts_contract}
 - `technical_reasoning`: 1 to 3 sentences. Cite the specific artifacts listed above.
 - `virality_score`: Integer, 1 to 10.
 - `performance_drivers`: 2 to 3 specific hooks, triggers, or structural elements observed in the content.
@@ -73,3 +159,53 @@ Return your analysis **only** as a valid JSON object. No markdown outside the JS
 '''
 
 
+_TEXT_SIGNALS = "- *Text:* Syntactic perfection, over-formality, absence of colloquialisms, repetitive sentence cadence, hedging language patterns typical of LLMs."
+_VIDEO_SIGNALS = "- *Video:* Facial rendering artifacts (\"uncanny valley\"), unnatural blinking or micro-expressions, overly smooth skin/hair, background inconsistencies, audio-lip sync drift, lighting uniformity."
+_TEXT_USER = "Analyze the following text and determine if it was written by an AI or a human. Return your response ONLY in the specified JSON format:\n\n" + CONTENT_SLOT
+_VIDEO_USER = "Analyze this video and determine if it was created by an AI or a human. Return your response ONLY in the specified JSON format."
+_POST_USER = "Analyze this post, made of the attached video and the caption below, and determine if it was created by an AI or a human. Judge the caption and the video each on its own evidence. Return your response ONLY in the specified JSON format.\n\nCaption:\n" + CONTENT_SLOT
+
+_COMBINED_SYSTEM = _judge_system_prompt(
+    task="Evaluate the provided content — which may include text, video, or both — and produce a structured verdict covering its origin, social potential, and distribution fit.",
+    origin_signals="\n".join([
+        _TEXT_SIGNALS,
+        _VIDEO_SIGNALS,
+        "- *Human markers:* Natural speech disfluencies, improvised framing, genuine emotional inconsistency, environmental noise, cultural slang.",
+    ]),
+    hook="the first 3 seconds or opening line",
+    artifacts_contract="- `text_artifacts` / `video_artifacts`: Array of specific observed signals justifying the prediction. Empty array `[]` if content type is absent.",
+)
+
+PROMPTS.register(PromptTemplate("judge-combined", 1, _COMBINED_SYSTEM, _TEXT_USER))
+# Caption and video judged in one call (Evaluator.evaluate_combined)
+PROMPTS.register(PromptTemplate("judge-combined", 2, _COMBINED_SYSTEM, _POST_USER))
+
+PROMPTS.register(PromptTemplate("judge-text", 1, _judge_system_prompt(
+    task="Evaluate the provided text and produce a structured verdict covering its origin, social potential, and distribution fit.",
+    origin_signals="\n".join([
+        _TEXT_SIGNALS,
+        "- *Human markers:* Natural disfluencies and typos, genuine emotional inconsistency, cultural slang.",
+    ]),
+    hook="the opening line",
+    artifacts_contract="- `text_artifacts`: Array of specific observed signals justifying the prediction. `video_artifacts`: always `[]`.",
+), _TEXT_USER))
+
+PROMPTS.register(PromptTemplate("judge-video", 1, _judge_system_prompt(
+    task="Evaluate the provided video and produce a structured verdict covering its origin, social potential, and distribution fit.",
+    origin_signals="\n".join([
+        _VIDEO_SIGNALS,
+        "- *Human markers:* Natural speech disfluencies, improvised framing, genuine emotional inconsistency, environmental noise, cultural slang.",
+    ]),
+    hook="the first 3 seconds",
+    artifacts_contract="- `video_artifacts`: Array of specific observed signals justifying the prediction, including any on-screen or spoken text. `text_artifacts`: always `[]`.",
+), _VIDEO_USER))
+
+# The original single prompt for text and video, kept for callers that predate the registry
+system_prompt = get_prompt("combined", 1).system
+
+followup_prompt = '''
+You are the same Digital Forensic Analyst who produced the JSON verdict earlier in this conversation.
+Answer the user's follow-up questions about that verdict in concise plain prose (not JSON).
+Point to the specific evidence behind your reasoning: timestamps or frames for video, quoted phrases for text.
+If the content is no longer attached, answer from your verdict and say when a question cannot be answered without it.
+'''
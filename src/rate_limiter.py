@@ -1,116 +1,372 @@
+import hashlib
 import json
 import os
-import time
-import fcntl
-from datetime import datetime, timedelta
+from bisect import bisect_right
+from operator import itemgetter
+from src.clock import SYSTEM_CLOCK
+from src.metrics import METRICS
+from src.scheduler import get_scheduler
+from src.state_log import get_state_log
+
+# Reserved state key (model names never start with "_") holding observed server throttling
+THROTTLE_KEY = "_throttle"
+# Fraction of the configured RPM allowed for THROTTLE_PENALTY seconds after a 429
+THROTTLE_RPM_FACTOR = 0.5
+THROTTLE_PENALTY = 60
+
+# Reserved state key holding limits learned in adaptive mode, per model (state is already per API key)
+LEARNED_KEY = "_learned"
+# AIMD parameters: a saturated minute grows the limit by about one request's worth,
+# a 429 halves the limit that was closer to exhaustion (at most once per holdoff)
+ADAPTIVE_UTILIZATION = 0.8
+ADAPTIVE_DECREASE = 0.5
+ADAPTIVE_HOLDOFF = 5
+ADAPTIVE_MIN_TPM_FRACTION = 0.1
+
+# Reserved state key holding, per model, [cutoff, tokens of the history entries after it]:
+# the TPM window's running sum, updated as changes are applied and advanced past entries
+# leaving the window, so an admission does not re-sum the whole minute
+WINDOW_KEY = "_window"
+
+# Admission classes, highest priority first
+PRIORITIES = ("interactive", "batch")
+# Share of every limit that batch traffic leaves free for interactive requests
+INTERACTIVE_HEADROOM = 0.2
+
+_CONFIG_CACHE = {}
+
+# Entries of a model's history are appended in time order (under the state lock), so the
+# entries of a window are a suffix found by bisection
+_TIMESTAMP = itemgetter('timestamp')
+_TOKENS = itemgetter('tokens')
+
+def load_config(config_file="models_config.json"):
+    """Parsed limits config, shared by every limiter in the process and reloaded when the file changes."""
+    mtime = os.stat(config_file).st_mtime_ns
+    cached = _CONFIG_CACHE.get(config_file)
+    if cached is None or cached[0] != mtime:
+        with open(config_file, 'r') as f:
+            cached = _CONFIG_CACHE[config_file] = (mtime, json.load(f))
+    return cached[1]
+
+def key_fingerprint(api_key):
+    """Stable, non-reversible identity for an API key, safe to persist in the state file."""
+    if not api_key:
+        return "default"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+def partition_state_file(state_file, key_id):
+    """
+    Each API key has its own quota, so each gets its own state files (and flock):
+    rate_limit_state.json -> rate_limit_state.<key_id>.json. The default key keeps the base path.
+    """
+    if key_id == "default":
+        return state_file
+    root, ext = os.path.splitext(state_file)
+    return f"{root}.{key_id}{ext or '.json'}"
+
+# Open reservation id -> (history list, entry) as applied in this process, so a settle finds
+# its entry directly instead of scanning past everything admitted after it
+_OPEN_RESERVATIONS = {}
+
+def _find_reservation(history, reservation):
+    if not reservation:
+        return None
+    owner, entry = _OPEN_RESERVATIONS.pop(reservation, (None, None))
+    # Valid only if applied to this very list and not yet cleaned off its (oldest-first) front
+    if owner is history and history and entry['timestamp'] >= history[0]['timestamp']:
+        return entry
+    # Open reservations are the most recent entries
+    return next((e for e in reversed(history) if e.get('reservation') == reservation), None)
+
+def _window_add(state, model, timestamp, tokens):
+    window = state.get(WINDOW_KEY, {}).get(model)
+    if window is not None and timestamp > window[0]:
+        window[1] += tokens
+
+def _window_tokens(state, model, cutoff, window_start):
+    """Tokens of the model's history entries after `cutoff` (from index `window_start` on)."""
+    history = state[model]
+    windows = state.setdefault(WINDOW_KEY, {})
+    window = windows.get(model)
+    # Recounted if the window moved back or entries it counted may have expired with the day
+    if window is None or cutoff < window[0] or not history or history[0]['timestamp'] > window[0]:
+        tokens = sum(map(_TOKENS, history[window_start:]))
+    else:
+        left = history[bisect_right(history, window[0], key=_TIMESTAMP):window_start]
+        tokens = window[1] - sum(map(_TOKENS, left))
+    windows[model] = [cutoff, tokens]
+    return tokens
+
+def _apply_change(state, change):
+    """Applies one logged limiter change to the quota state (see src/state_log.py)."""
+    op, model = change['op'], change['model']
+    if op == 'reserve':
+        history = state.setdefault(model, [])
+        entry = {'timestamp': change['ts'], 'tokens': change['tokens'], 'reservation': change['id']}
+        history.append(entry)
+        _OPEN_RESERVATIONS[change['id']] = (history, entry)
+        _window_add(state, model, entry['timestamp'], entry['tokens'])
+    elif op == 'settle':
+        history = state.setdefault(model, [])
+        entry = _find_reservation(history, change.get('id'))
+        if entry is not None:
+            _window_add(state, model, entry['timestamp'], change['tokens'] - entry['tokens'])
+            entry['tokens'] = change['tokens']
+            del entry['reservation']
+        else:
+            history.append({'timestamp': change['ts'], 'tokens': change['tokens']})
+            _window_add(state, model, change['ts'], change['tokens'])
+    elif op == 'release':
+        history = state.get(model, [])
+        entry = _find_reservation(history, change['id'])
+        if entry is not None:
+            # Open reservations are the most recent entries
+            del history[next(i for i in range(len(history) - 1, -1, -1) if history[i] is entry)]
+            _window_add(state, model, entry['timestamp'], -entry['tokens'])
+    elif op == 'throttle':
+        state.setdefault(THROTTLE_KEY, {})[model] = {'until': change['until'], 'penalty_until': change['penalty_until']}
+    elif op == 'learned':
+        state.setdefault(LEARNED_KEY, {})[model] = dict(change['limit'])
+
+def read_state(state_file, key_id="default"):
+    """A copy of the quota state kept for `key_id` (snapshot plus logged changes)."""
+    return get_state_log(partition_state_file(state_file, key_id), _apply_change).read()
 
 class RateLimiter:
-    def __init__(self, state_file="rate_limit_state.json", config_file="models_config.json", tier="free"):
-        self.state_file = state_file
+    def __init__(self, state_file="rate_limit_state.json", config_file="models_config.json", tier="free",
+                 adaptive=False, key_id="default", flow_id=None, weight=1.0, priority="interactive",
+                 clock=None, state_log=None):
+        self.state_file = partition_state_file(state_file, key_id)
         self.config_file = config_file
         self.all_limits = self._load_config()
         self.tier = tier
-        self._ensure_state_file()
+        # In adaptive mode the configured tier limits are only the starting point (see _learned_limit)
+        self.adaptive = adaptive
+        self.key_id = key_id
+        # Fair-share identity among limiters sharing the key in this process (one per session)
+        self.flow_id = flow_id if flow_id is not None else id(self)
+        self.weight = weight
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}; expected one of {PRIORITIES}")
+        self.priority = priority
+        # Time is read and slept through the clock, so the simulator can run this logic on virtual time
+        self.clock = clock or SYSTEM_CLOCK
+        # Quota state lives in memory, shared by the process's limiters for the key; every
+        # change is a small append to the log (state_file + ".wal") that other processes replay.
+        # A MemoryStateLog keeps it in this limiter only.
+        self._log = state_log or get_state_log(self.state_file, _apply_change)
 
     @property
     def limits(self):
         return self.all_limits.get(self.tier, {})
 
-    def _load_config(self):
-        with open(self.config_file, 'r') as f:
-            return json.load(f)
+    def _ceiling(self, model):
+        """Highest limits configured for the model in any tier; adaptive limits never exceed these."""
+        tiers = [t[model] for t in self.all_limits.values() if model in t]
+        return max(t['rpm'] for t in tiers), max(t['tpm'] for t in tiers)
 
-    def _ensure_state_file(self):
-        if not os.path.exists(self.state_file):
-            with open(self.state_file, 'w') as f:
-                json.dump({}, f)
+    def _learned_limit(self, state, model):
+        """A copy of the learned limits to adjust; changes reach the state only through _save_learned."""
+        learned = state.get(LEARNED_KEY, {}).get(model)
+        if learned is None:
+            limit = self.limits[model]
+            return {'rpm': float(limit['rpm']), 'tpm': float(limit['tpm']), 'decreased_at': 0}
+        return dict(learned)
 
-    def _get_state(self, lock_file):
-        try:
-            lock_file.seek(0)
-            data = lock_file.read()
-            if not data:
-                return {}
-            return json.loads(data)
-        except json.JSONDecodeError:
-            return {}
-
-    def _save_state(self, lock_file, state):
-        lock_file.seek(0)
-        lock_file.truncate()
-        json.dump(state, lock_file, indent=2)
+    def effective_limit(self, model, state=None):
+        """The limits enforced for `model`: the tier's, or the learned ones in adaptive mode."""
+        limit = self.limits[model]
+        if not self.adaptive:
+            return limit
+        if state is None:
+            with self._log.locked() as state:
+                return self.effective_limit(model, state)
+        learned = state.get(LEARNED_KEY, {}).get(model)
+        if learned is None:
+            return limit
+        return {**limit, 'rpm': max(1, int(learned['rpm'])), 'tpm': int(learned['tpm'])}
+
+    def _load_config(self):
+        return load_config(self.config_file)
 
     def _clean_history(self, history):
-        now = time.time()
-        one_day_ago = now - 86400
-        return [entry for entry in history if entry['timestamp'] > one_day_ago]
+        """Drops entries older than a day, in place."""
+        one_day_ago = self.clock.time() - 86400
+        expired = bisect_right(history, one_day_ago, key=_TIMESTAMP)
+        if expired:
+            del history[:expired]
+        return history
 
-    def wait_if_needed(self, model, prompt_tokens):
+    def wait_if_needed(self, model, prompt_tokens, priority=None):
+        """
+        Blocks until `model` has capacity for the request, then reserves it: the reservation
+        counts against RPM/TPM/RPD immediately, so concurrent callers cannot overshoot before
+        update_usage records the actual tokens. Returns the reservation id (None if unlimited).
+        """
         if model not in self.limits:
             print(f"Warning: No limits configured for model {model}. Proceeding without rate limiting.")
+            return None
+
+        priority = priority or self.priority
+        scheduler = get_scheduler(self.key_id, model)
+        wait_start = self.clock.time()
+        METRICS.admission_queue_depth(model, priority, 1)
+        # Sessions sharing this key are admitted one at a time in weighted fair order,
+        # interactive before batch. The request keeps its place in line while it sleeps for
+        # capacity, so later arrivals of a heavy flow cannot overtake it; the sleep happens
+        # outside the turn and the file lock, so an interactive arrival still goes first.
+        entry = scheduler.enqueue(self.flow_id, self.weight, 1.0, PRIORITIES.index(priority))
+        try:
+            while True:
+                with scheduler.holding(entry):
+                    wait_time, reservation = self.try_admit(model, prompt_tokens, priority)
+                if wait_time is None:
+                    return reservation
+                self.clock.sleep(max(0, wait_time))
+        finally:
+            scheduler.dequeue(entry)
+            METRICS.admission_queue_depth(model, priority, -1)
+            METRICS.observe_admission_wait(model, priority, self.clock.time() - wait_start)
+
+    def try_admit(self, model, prompt_tokens, priority=None):
+        """
+        One non-blocking admission attempt, without the fair-queuing turn of wait_if_needed.
+        Returns (None, reservation id) if admitted, else (seconds to wait, None).
+        """
+        priority = priority or self.priority
+        with self._log.locked() as state:
+            limit = self.effective_limit(model, state)
+            history = state.get(model, [])
+            history = self._clean_history(history)
+            state[model] = history
+
+            now = self.clock.time()
+            one_minute_ago = now - 60
+
+            # Server throttle check: honor the retry-after of a recent 429
+            throttle = state.get(THROTTLE_KEY, {}).get(model)
+            if throttle and now < throttle['until']:
+                wait_time = throttle['until'] - now
+                print(f"Server throttled {model}. Waiting {wait_time:.2f}s...")
+                METRICS.record_sleep(model, "throttle")
+                return wait_time, None
+
+            # After a 429 the effective RPM is reduced until the penalty window passes
+            rpm, tpm, rpd = limit['rpm'], limit['tpm'], limit['rpd']
+            if throttle and now < throttle['penalty_until']:
+                rpm = max(1, int(rpm * THROTTLE_RPM_FACTOR))
+
+            # Batch traffic may not use the headroom reserved for interactive requests
+            if priority == "batch":
+                share = 1 - INTERACTIVE_HEADROOM
+                rpm, tpm, rpd = max(1, int(rpm * share)), int(tpm * share), max(1, int(rpd * share))
+
+            wait_time = None
+            window_start = bisect_right(history, one_minute_ago, key=_TIMESTAMP)
+            recent_count = len(history) - window_start
+            # RPM check
+            if recent_count >= rpm:
+                wait_time = 60 - (now - history[window_start]['timestamp']) + 0.1
+                print(f"RPM limit reached for {model}. Waiting {wait_time:.2f}s...")
+                METRICS.record_sleep(model, "rpm")
+
+            # TPM check
+            elif _window_tokens(state, model, one_minute_ago, window_start) + prompt_tokens > tpm:
+                if not recent_count:
+                    raise ValueError(f"Prompt tokens ({prompt_tokens}) exceed model TPM limit ({tpm}) for {model}")
+
+                # This is a bit simplistic; we wait until the oldest request in the window expires
+                wait_time = 60 - (now - history[window_start]['timestamp']) + 0.1
+                print(f"TPM limit reached for {model}. Waiting {wait_time:.2f}s...")
+                METRICS.record_sleep(model, "tpm")
+
+            # RPD check
+            elif len(history) >= rpd:
+                wait_time = 86400 - (now - history[0]['timestamp']) + 1
+                print(f"RPD limit reached for {model}. Waiting {wait_time:.2f}s...")
+                METRICS.record_sleep(model, "rpd")
+
+            reservation = None
+            if wait_time is None:
+                # Within limits: reserve the slot with the prompt tokens until the call completes
+                # Random like uuid4().hex, at a fraction of its cost per admission
+                reservation = os.urandom(16).hex()
+                self._log.append({'op': 'reserve', 'model': model, 'ts': now, 'tokens': prompt_tokens, 'id': reservation})
+            return wait_time, reservation
+
+    def update_usage(self, model, tokens, reservation=None):
+        """Records a completed request, settling its reservation with the actual token count."""
+        if model not in self.limits:
             return
 
-        limit = self.limits[model]
-        
-        while True:
-            with open(self.state_file, 'r+') as f:
-                fcntl.flock(f, fcntl.LOCK_EX)
-                try:
-                    state = self._get_state(f)
-                    history = state.get(model, [])
-                    history = self._clean_history(history)
-                    state[model] = history
-                    self._save_state(f, state)
-
-                    now = time.time()
-                    one_minute_ago = now - 60
-                    
-                    # RPM check
-                    recent_requests = [e for e in history if e['timestamp'] > one_minute_ago]
-                    if len(recent_requests) >= limit['rpm']:
-                        wait_time = 60 - (now - recent_requests[0]['timestamp']) + 0.1
-                        print(f"RPM limit reached for {model}. Waiting {wait_time:.2f}s...")
-                        time.sleep(max(0, wait_time))
-                        continue
-
-                    # TPM check
-                    recent_tokens = sum(e['tokens'] for e in recent_requests)
-                    if recent_tokens + prompt_tokens > limit['tpm']:
-                        if not recent_requests:
-                            raise ValueError(f"Prompt tokens ({prompt_tokens}) exceed model TPM limit ({limit['tpm']}) for {model}")
-                        
-                        # This is a bit simplistic; we wait until the oldest request in the window expires
-                        wait_time = 60 - (now - recent_requests[0]['timestamp']) + 0.1
-                        print(f"TPM limit reached for {model}. Waiting {wait_time:.2f}s...")
-                        time.sleep(max(0, wait_time))
-                        continue
-
-                    # RPD check
-                    if len(history) >= limit['rpd']:
-                        wait_time = 86400 - (now - history[0]['timestamp']) + 1
-                        print(f"RPD limit reached for {model}. Waiting {wait_time:.2f}s...")
-                        time.sleep(max(0, wait_time))
-                        continue
-
-                    # If we got here, we are within limits
-                    break
-                finally:
-                    fcntl.flock(f, fcntl.LOCK_UN)
-
-    def update_usage(self, model, tokens):
+        with METRICS.span("limiter_update", model=model), self._log.locked() as state:
+            now = self.clock.time()
+            self._log.append({'op': 'settle', 'model': model, 'ts': now, 'tokens': tokens, 'id': reservation})
+            state[model] = self._clean_history(state[model])
+            if self.adaptive:
+                self._increase(state, model, now)
+
+    def release(self, model, reservation):
+        """Returns an unused reservation, e.g. after the call failed before reaching the quota."""
+        if model not in self.limits or reservation is None:
+            return
+
+        with self._log.locked():
+            self._log.append({'op': 'release', 'model': model, 'id': reservation})
+
+    def record_throttle(self, model, retry_after=None):
+        """
+        Records a 429 from the server. Further requests for the model wait out
+        `retry_after` seconds and run at a reduced RPM for THROTTLE_PENALTY seconds,
+        across every process sharing the state file.
+        """
         if model not in self.limits:
             return
 
-        with open(self.state_file, 'r+') as f:
-            fcntl.flock(f, fcntl.LOCK_EX)
-            try:
-                state = self._get_state(f)
-                history = state.get(model, [])
-                history.append({
-                    'timestamp': time.time(),
-                    'tokens': tokens
-                })
-                state[model] = self._clean_history(history)
-                self._save_state(f, state)
-            finally:
-                fcntl.flock(f, fcntl.LOCK_UN)
+        with self._log.locked() as state:
+            now = self.clock.time()
+            self._log.append({
+                'op': 'throttle', 'model': model,
+                'until': now + (retry_after or 0),
+                # Adaptive mode lowers the learned limit instead of applying a temporary penalty
+                'penalty_until': now if self.adaptive else now + THROTTLE_PENALTY
+            })
+            if self.adaptive:
+                self._decrease(state, model, now)
+
+    def _save_learned(self, model, learned):
+        self._log.append({'op': 'learned', 'model': model, 'limit': dict(learned)})
+
+    def _recent(self, state, model, now):
+        history = state.setdefault(model, [])
+        window_start = bisect_right(history, now - 60, key=_TIMESTAMP)
+        return len(history) - window_start, _window_tokens(state, model, now - 60, window_start)
+
+    def _increase(self, state, model, now):
+        """Additive increase after a success, only while demand is close to the learned limit."""
+        learned = self._learned_limit(state, model)
+        max_rpm, max_tpm = self._ceiling(model)
+        requests, tokens = self._recent(state, model, now)
+        before = dict(learned)
+        if requests >= ADAPTIVE_UTILIZATION * learned['rpm']:
+            learned['rpm'] = min(max_rpm, learned['rpm'] + 1 / learned['rpm'])
+        if tokens >= ADAPTIVE_UTILIZATION * learned['tpm']:
+            learned['tpm'] = min(max_tpm, learned['tpm'] + tokens / requests / learned['rpm'])
+        if learned != before:
+            self._save_learned(model, learned)
+
+    def _decrease(self, state, model, now):
+        """Multiplicative decrease of whichever learned limit the recent window was closer to."""
+        learned = self._learned_limit(state, model)
+        if now - learned['decreased_at'] < ADAPTIVE_HOLDOFF:
+            # One burst of concurrent 429s counts as a single congestion signal
+            return
+        requests, tokens = self._recent(state, model, now)
+        if tokens / learned['tpm'] > requests / learned['rpm']:
+            min_tpm = self.limits[model]['tpm'] * ADAPTIVE_MIN_TPM_FRACTION
+            learned['tpm'] = max(min_tpm, learned['tpm'] * ADAPTIVE_DECREASE)
+        else:
+            learned['rpm'] = max(1.0, learned['rpm'] * ADAPTIVE_DECREASE)
+        learned['decreased_at'] = now
+        self._save_learned(model, learned)
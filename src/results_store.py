@@ -0,0 +1,338 @@
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+
+# Columns extracted from the sanitized evaluation and usage metadata
+COLUMNS = (
+    "created_at",
+    "content_hash",
+    "content_type",
+    "source",
+    "model",
+    "prediction",
+    "confidence",
+    "virality",
+    "prompt_tokens",
+    "candidates_tokens",
+    "total_tokens",
+    "latency_ms",
+    "raw_text",
+    "prompt",
+    "owner",
+)
+
+# The model index covers every aggregated column, so per-model reports scan the
+# index instead of the table rows (which carry the raw response text).
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    source TEXT NOT NULL,
+    model TEXT,
+    prediction TEXT,
+    confidence REAL,
+    virality REAL,
+    prompt_tokens INTEGER,
+    candidates_tokens INTEGER,
+    total_tokens INTEGER,
+    latency_ms REAL,
+    raw_text TEXT,
+    prompt TEXT,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_created ON evaluations (created_at);
+CREATE INDEX IF NOT EXISTS idx_evaluations_model ON evaluations (model, created_at, prediction, confidence, virality, prompt_tokens, candidates_tokens, total_tokens, latency_ms);
+CREATE INDEX IF NOT EXISTS idx_evaluations_prediction ON evaluations (prediction, created_at);
+CREATE INDEX IF NOT EXISTS idx_evaluations_hash ON evaluations (content_hash);
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    label TEXT NOT NULL,
+    labeled_at REAL NOT NULL
+);
+"""
+
+# Columns added after the first release, created on open for older databases
+_MIGRATIONS = {
+    "prompt": "ALTER TABLE evaluations ADD COLUMN prompt TEXT",
+    "owner": "ALTER TABLE evaluations ADD COLUMN owner TEXT",
+}
+
+# Ground-truth labels accepted by add_labels
+LABELS = ("AI-Generated", "Human-Generated", "Hybrid")
+
+# Columns accepted by aggregate(group_by=...)
+GROUP_COLUMNS = ("model", "prediction", "content_type", "source")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(content):
+    """
+    SHA-256 of a text, bytes, or file-like object.
+    Files are hashed from the start in chunks and their read position is restored.
+    """
+    digest = hashlib.sha256()
+    if isinstance(content, str):
+        digest.update(content.encode("utf-8"))
+    elif isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+    else:
+        position = content.tell()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        content.seek(position)
+    return digest.hexdigest()
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def build_record(structured, metadata, model, content_type, content_hash, latency_ms, source="judge", raw_text=None,
+                 prompt=None, owner=None):
+    """
+    Flattens a sanitized evaluation and its usage metadata into a results row.
+    Fields that sanitize_evaluation marked "[Missing]" or coerced to strings are stored as NULL.
+    `owner` is the key fingerprint of the service caller the row belongs to (None in the app).
+    """
+    origin = structured.get("origin_analysis", {}) if structured else {}
+    social = structured.get("social_performance", {}) if structured else {}
+    prediction = origin.get("prediction")
+    return {
+        "created_at": time.time(),
+        "content_hash": content_hash,
+        "content_type": content_type,
+        "source": source,
+        "model": model,
+        "prediction": prediction if prediction not in (None, "[Missing]") else None,
+        "confidence": _number(origin.get("confidence_score")),
+        "virality": _number(social.get("virality_score")),
+        "prompt_tokens": getattr(metadata, "prompt_token_count", None),
+        "candidates_tokens": getattr(metadata, "candidates_token_count", None),
+        "total_tokens": getattr(metadata, "total_token_count", None),
+        "latency_ms": latency_ms,
+        "raw_text": raw_text,
+        "prompt": prompt,
+        "owner": owner,
+    }
+
+
+class ResultsStore:
+    """
+    Durable SQLite store of evaluation results.
+
+    `add` only enqueues the row; a background writer commits queued rows in
+    batches of up to `batch_size`, or after `flush_interval` seconds, so the
+    evaluation path never waits on disk I/O. Reads see committed rows only;
+    call `flush()` first when a read must include everything added so far.
+    """
+
+    def __init__(self, path="results.db", batch_size=500, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(evaluations)")}
+        for column, statement in _MIGRATIONS.items():
+            if column not in existing:
+                conn.execute(statement)
+        # After the migrations, which add the column on older databases
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_owner ON evaluations (owner, created_at)")
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._write_loop, name="results-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self):
+        # sqlite3 connections are per-thread; each reading thread keeps its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _write_loop(self):
+        conn = self._connect()
+        insert = f"INSERT INTO evaluations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        running = True
+        while running:
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(tuple(item.get(c) for c in COLUMNS))
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(insert, batch)
+                except sqlite3.Error as e:
+                    print(f"Warning: failed to write {len(batch)} evaluation results: {e}")
+            for event in waiters:
+                event.set()
+        conn.close()
+
+    def add(self, record):
+        self._queue.put(record)
+
+    def flush(self, timeout=None):
+        """Blocks until every row added before this call is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    def _where(self, prediction=None, model=None, content_type=None, source=None,
+               min_confidence=None, max_confidence=None, since=None, until=None, content_hash=None, owner=None):
+        clauses = []
+        params = []
+        for column, value in (("prediction", prediction), ("model", model), ("content_type", content_type),
+                              ("source", source), ("content_hash", content_hash), ("owner", owner)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        for column, op, value in (("confidence", ">=", min_confidence), ("confidence", "<=", max_confidence),
+                                  ("created_at", ">=", since), ("created_at", "<", until)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit=100, offset=0, **filters):
+        """
+        Returns matching rows as dicts, newest first.
+        Filters: prediction, model, content_type, source, content_hash, owner,
+        min_confidence, max_confidence, since, until (epoch seconds).
+        """
+        where, params = self._where(**filters)
+        sql = f"SELECT * FROM evaluations{where} ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        rows = self._reader().execute(sql, [*params, limit, offset]).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_batches(self, batch_size=10000, columns=COLUMNS, **filters):
+        """
+        Streams matching rows in insertion order as lists of tuples ordered like `columns`.
+        Uses its own connection so a long export does not hold the reader connection.
+        """
+        unknown = set(columns) - set(COLUMNS) - {"id"}
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        where, params = self._where(**filters)
+        conn = self._connect()
+        conn.row_factory = None
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM evaluations{where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def add_labels(self, labels):
+        """
+        Stores ground-truth labels given as (content_hash, label) pairs; returns how many were new.
+        A hash keeps its first label, so statistics built from labels never have to be unwound.
+        """
+        now = time.time()
+        rows = []
+        for content_hash, label in labels:
+            if label not in LABELS:
+                raise ValueError(f"Unknown label {label!r}; expected one of {LABELS}")
+            rows.append((content_hash, label, now))
+        conn = self._reader()
+        with conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO labels (content_hash, label, labeled_at) VALUES (?, ?, ?)", rows
+            )
+        return max(cursor.rowcount, 0)
+
+    def iter_labeled(self, after_evaluation=0, after_label=0, batch_size=10000, source="judge"):
+        """
+        Streams evaluations joined with the label of their content, as lists of
+        (evaluation id, label id, model, prompt, prediction, confidence, label) tuples.
+        Only pairs where the evaluation or the label has a higher id than given are returned,
+        so a caller that remembers the highest ids it has seen reads each pair once.
+        """
+        select = "SELECT e.id, l.id, e.model, e.prompt, e.prediction, e.confidence, l.label FROM "
+        # New evaluations, then new labels of older evaluations: each is a range scan on the table
+        # it is new in (CROSS JOIN keeps labels outermost), where one OR would scan every evaluation
+        queries = [
+            (select + "evaluations e JOIN labels l ON l.content_hash = e.content_hash "
+                      "WHERE e.id > ? AND e.source = ?", (after_evaluation, source)),
+            (select + "labels l CROSS JOIN evaluations e ON e.content_hash = l.content_hash "
+                      "WHERE l.id > ? AND e.id <= ? AND e.source = ?", (after_label, after_evaluation, source)),
+        ]
+        conn = self._connect()
+        conn.row_factory = None
+        conn.isolation_level = None
+        try:
+            # Both queries read one snapshot: a label committed between them would otherwise be
+            # missed by the first and, on an evaluation newer than after_evaluation, by the second
+            conn.execute("BEGIN")
+            for sql, params in queries:
+                cursor = conn.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def latest_for_hash(self, content_hash, model=None):
+        rows = self.query(limit=1, content_hash=content_hash, model=model)
+        return rows[0] if rows else None
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._reader().execute(f"SELECT COUNT(*) FROM evaluations{where}", params).fetchone()[0]
+
+    def aggregate(self, group_by="model", **filters):
+        """
+        Returns per-group counts, mean confidence and virality, token totals and
+        mean latency, computed inside SQLite.
+        """
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {group_by!r}; expected one of {GROUP_COLUMNS}")
+        where, params = self._where(**filters)
+        sql = (
+            f"SELECT {group_by} AS grp, COUNT(*) AS count, AVG(confidence) AS avg_confidence, "
+            f"AVG(virality) AS avg_virality, SUM(prompt_tokens) AS prompt_tokens, "
+            f"SUM(candidates_tokens) AS candidates_tokens, SUM(total_tokens) AS total_tokens, "
+            f"AVG(latency_ms) AS avg_latency_ms "
+            f"FROM evaluations{where} GROUP BY {group_by} ORDER BY count DESC"
+        )
+        rows = self._reader().execute(sql, params).fetchall()
+        return [{group_by: row["grp"], **{k: row[k] for k in row.keys() if k != "grp"}} for row in rows]
@@ -0,0 +1,132 @@
+import random
+import re
+import threading
+import time
+
+# Status codes worth retrying: quota exhaustion and transient server failures
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+
+_DURATION_RE = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*s?\s*$")
+
+
+def error_code(exc):
+    """HTTP status code of an SDK error (google.genai.errors.APIError exposes `code`), or None."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retry_after(exc):
+    """
+    Server-suggested delay in seconds, read from a RetryInfo entry in the error
+    details ("retryDelay": "30s") or a Retry-After response header. None if absent.
+    """
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        entries = details.get("error", details).get("details", [])
+        for entry in entries if isinstance(entries, list) else []:
+            delay = entry.get("retryDelay") if isinstance(entry, dict) else None
+            match = _DURATION_RE.match(str(delay)) if delay is not None else None
+            if match:
+                return float(match.group(1))
+
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        match = _DURATION_RE.match(str(value)) if value is not None else None
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter. A server retry-after hint is a lower bound
+    on the delay; `max_delay` caps the computed backoff but never the hint.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0, retry_on=RETRYABLE_CODES, seed=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = tuple(retry_on)
+        self._rng = random.Random(seed)
+
+    def is_retryable(self, exc):
+        return error_code(exc) in self.retry_on
+
+    def delay(self, attempt, hint=None):
+        """Delay before retry number `attempt` (0-based)."""
+        backoff = self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(backoff, hint) if hint is not None else backoff
+
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate model's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker. After `failure_threshold` consecutive failures it opens and
+    rejects calls for `reset_timeout` seconds, then lets one trial call through
+    (half-open); a success closes it again, a failure re-opens it. Time is read from
+    `clock` (e.g. the limiter's, see src/clock.py) when given, else time.monotonic.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def _now(self):
+        return self._clock.time() if self._clock is not None else time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(self._now())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return self.CLOSED
+        if now - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self._state(self._now())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._now()
+
+    def release_trial(self):
+        """Ends an allowed call that never reached the model, without counting it either way."""
+        with self._lock:
+            self._trial_in_flight = False
@@ -0,0 +1,101 @@
+"""
+Weighted fair queuing of rate-limiter admissions for sessions that share one API key.
+
+Each (API key, model) pair has one FairScheduler per process. Callers queue for a turn
+with a flow id (one per session) and a weight; turns are granted one at a time in order
+of virtual finish time (self-clocked fair queuing), so a flow that enqueues many requests
+cannot starve a flow that sends a few, and a flow with weight 2 gets twice the share.
+A request stays queued, with its tag, until it is admitted: the first in line keeps
+its place while it sleeps for capacity, so turns are granted strictly in tag order.
+"""
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+
+class FairScheduler:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._busy = False
+        self._holder = None
+
+    def __len__(self):
+        """Requests queued for a turn, not counting the one holding it."""
+        with self._cond:
+            return len(self._queue) - (self._holder in self._queue)
+
+    def _finish_tag(self, flow, weight, cost):
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish = start + cost / weight
+        self._last_finish[flow] = finish
+        return finish
+
+    def enqueue(self, flow, weight=1.0, cost=1.0, priority=0):
+        """
+        Queues a request and returns its entry. The entry keeps its finish tag until dequeue(),
+        so a request that has to wait for capacity after its turn keeps its place in line
+        instead of re-entering behind requests that arrived while it waited.
+        """
+        with self._cond:
+            entry = (priority, self._finish_tag(flow, weight, cost), next(self._seq))
+            heapq.heappush(self._queue, entry)
+            return entry
+
+    def dequeue(self, entry):
+        with self._cond:
+            if self._queue and self._queue[0] == entry:
+                heapq.heappop(self._queue)
+            elif entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            # Idle flows restart from the current virtual time, so their old tags can go
+            self._last_finish = {f: t for f, t in self._last_finish.items() if t > self._virtual_time}
+            self._cond.notify_all()
+
+    @contextmanager
+    def holding(self, entry):
+        """
+        Blocks until `entry` is first in line, then holds the turn for the duration of the block.
+        Lower priority values are always first; fair queuing applies within a priority.
+        """
+        with self._cond:
+            while self._busy or self._queue[0] != entry:
+                self._cond.wait()
+            self._busy = True
+            self._holder = entry
+            self._virtual_time = max(self._virtual_time, entry[1])
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._busy = False
+                self._holder = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def turn(self, flow, weight=1.0, cost=1.0, priority=0):
+        """A single turn: enqueue, hold the turn for the duration of the block, dequeue."""
+        entry = self.enqueue(flow, weight, cost, priority)
+        try:
+            with self.holding(entry):
+                yield
+        finally:
+            self.dequeue(entry)
+
+
+_SCHEDULERS = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_scheduler(key_id, model):
+    """The process-wide scheduler for one API key and model."""
+    with _SCHEDULERS_LOCK:
+        scheduler = _SCHEDULERS.get((key_id, model))
+        if scheduler is None:
+            scheduler = _SCHEDULERS[(key_id, model)] = FairScheduler()
+        return scheduler
@@ -0,0 +1,412 @@
+"""
+HTTP evaluation service: the judge behind a REST API, independent of the Streamlit UI.
+
+    python -m src.service [--host 127.0.0.1] [--port 8000] [--workers 4]
+
+Endpoints (JSON unless noted):
+- POST /v1/evaluations/text     {"text", "model"?, "prescreen"?}
+- POST /v1/evaluations/video    multipart/form-data with a "file" part and optional "model";
+  with a "text" field (e.g. the post's caption), text and video are judged in one call
+  Both return 202 with a job id, or the result directly with `?wait=true`.
+- GET  /v1/jobs/{job_id}        job status, with the result once it succeeded
+- GET  /v1/results              stored evaluations (limit, offset, model, prediction, content_type, source)
+- GET  /v1/results/summary      aggregates (group_by=model|prediction|content_type|source)
+- GET  /health
+
+Every request needs the caller's Gemini key in the X-Goog-Api-Key header; the service's own
+GEMINI_API_KEY is only used for requests carrying `Authorization: Bearer <LLM_JUDGE_SERVICE_TOKEN>`.
+Jobs and stored results are scoped to the key they were made with (its fingerprint). Handlers are
+async; evaluations run on a thread pool because the SDK client and limiter are blocking.
+Video uploads are parsed incrementally and spooled to disk, so a request never holds the
+whole file in memory. With `--workers N` every worker process shares the rate-limit state
+files (serialized with flock), the job table and the results database, so limits hold
+across workers. Configuration comes from the environment:
+LLM_JUDGE_TIER (free), LLM_JUDGE_ADAPTIVE (1), LLM_JUDGE_MODEL, LLM_JUDGE_SERVICE_THREADS (16),
+LLM_JUDGE_CPU_WORKERS (processes for video fingerprinting; see src/cpu_pool.py),
+LLM_JUDGE_MOCK=1 to serve from MockClient (LLM_JUDGE_MOCK_LATENCY: median seconds per call),
+LLM_JUDGE_RECORD / LLM_JUDGE_REPLAY to record judge calls to or replay them from a cassette
+(see src/cassette.py).
+"""
+import argparse
+import asyncio
+import hmac
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from src.calibration import CalibrationEngine
+from src.client_pool import ClientPool
+from src.cpu_pool import CpuPool
+from src.evaluator import (
+    MAX_VIDEO_BYTES, PROCESSING_POLL_INTERVAL, VIDEO_EXTENSIONS, EvaluationError, Evaluator, truncate_text,
+    usage_dict
+)
+from src.jobs import JobStore
+from src.metrics import configure_from_env
+from src.rate_limiter import key_fingerprint
+from src.results_store import GROUP_COLUMNS, ResultsStore
+from src.retry import error_code
+from src.wrapper import LimitedClient
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Multipart framing and form fields allowed on top of the video itself
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+RESULT_FILTERS = ("model", "prediction", "content_type", "source")
+
+
+def result_json(result, calibration=None):
+    """The JSON body for an evaluation result; with a CalibrationEngine, adds the calibrated P(AI-Generated)."""
+    body = {
+        "type": result["type"],
+        "source": result["source"],
+        "model": result["model"],
+        "prompt": result.get("prompt"),
+        "evaluation": result["structured"],
+        "raw_text": result["raw_text"],
+        "usage": usage_dict(result["metadata"]),
+        "content_hash": result["content_hash"],
+        "latency_ms": result["latency_ms"],
+    }
+    if "similarity" in result:
+        body["similarity"] = result["similarity"]
+    if result.get("truncated"):
+        body["truncated"] = True
+    if calibration is not None and result["structured"]:
+        origin = result["structured"]["origin_analysis"]
+        probability = calibration.calibrate(result["model"], result.get("prompt"), origin["prediction"],
+                                            origin["confidence_score"])
+        if probability is not None:
+            body["calibrated_ai_probability"] = probability
+    return body
+
+
+def _error(status, message):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+class JudgeService:
+    def __init__(self, client_factory, api_key=None, tier="free", adaptive=True, model=DEFAULT_MODEL,
+                 state_file="rate_limit_state.json", config_file="models_config.json",
+                 results_path="results.db", jobs_path="jobs.db", index_root=".", threads=16,
+                 poll_interval=PROCESSING_POLL_INTERVAL, cpu_pool=None, calibration_path="calibration.json",
+                 service_token=None):
+        self.api_key = api_key
+        # Callers presenting this bearer token may use `api_key` instead of sending their own
+        self.service_token = service_token
+        self.tier = tier
+        self.adaptive = adaptive
+        self.model = model
+        self.state_file = state_file
+        self.config_file = config_file
+        self.index_root = index_root
+        self.poll_interval = poll_interval
+        self.pool = ClientPool(client_factory)
+        self.results = ResultsStore(results_path)
+        self.jobs = JobStore(jobs_path)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="judge")
+        # CPU-bound stages leave the request threads (and the GIL) for worker processes
+        self.cpu_pool = cpu_pool or CpuPool()
+        # Fitted by `python -m src.calibration`; reloaded when that rewrites the file
+        self.calibration = CalibrationEngine(calibration_path)
+        self._clients = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.cpu_pool.close()
+        self.results.close()
+        self.pool.close()
+
+    def _index(self, kind, prompt_hash):
+        with self._lock:
+            index = self._indexes.get((kind, prompt_hash))
+            if index is None:
+                if kind == "text":
+                    from src.dedup import NearDuplicateIndex
+                    index = NearDuplicateIndex(os.path.join(self.index_root, "near_duplicate_index", prompt_hash))
+                else:
+                    from src.video_fingerprint import VideoFingerprintIndex
+                    index = VideoFingerprintIndex(os.path.join(self.index_root, "video_fingerprint_index", prompt_hash))
+                self._indexes[(kind, prompt_hash)] = index
+            return index
+
+    def evaluator(self, api_key):
+        """An Evaluator on the shared limited client for `api_key`, rebuilt if the pool evicted it."""
+        key_id = key_fingerprint(api_key)
+        base_client = self.pool.get(api_key, "service")
+        with self._lock:
+            client = self._clients.get(key_id)
+            if client is None or client._client is not base_client:
+                client = self._clients[key_id] = LimitedClient(
+                    base_client, state_file=self.state_file, config_file=self.config_file,
+                    tier=self.tier, adaptive=self.adaptive, key_id=key_id
+                )
+        return Evaluator(
+            client, self.results,
+            near_duplicate_index=lambda prompt_hash: self._index("text", prompt_hash),
+            video_fingerprint_index=lambda prompt_hash: self._index("video", prompt_hash),
+            poll_interval=self.poll_interval,
+            cpu_pool=self.cpu_pool,
+            owner=key_id
+        )
+
+    def run_job(self, job_id, evaluate):
+        self.jobs.update(job_id, "running")
+        try:
+            result = result_json(evaluate(), self.calibration)
+        except Exception as e:
+            self.jobs.update(job_id, "failed", error=str(e))
+            raise
+        self.jobs.update(job_id, "succeeded", result=result)
+        return result
+
+    async def submit(self, request, kind, evaluate, owner, cleanup=None):
+        """Starts `evaluate` on the pool; waits for it with ?wait=true, otherwise answers 202."""
+        def job():
+            try:
+                return self.run_job(job_id, evaluate)
+            finally:
+                if cleanup is not None:
+                    cleanup()
+
+        try:
+            job_id = await run_in_threadpool(self.jobs.create, kind, owner)
+            future = self.executor.submit(job)
+        except BaseException:
+            # The job never started, so nothing else will clean up after it
+            if cleanup is not None:
+                cleanup()
+            raise
+        if request.query_params.get("wait", "").lower() not in ("1", "true", "yes"):
+            # Failures are recorded on the job; nobody awaits this future
+            future.add_done_callback(lambda f: f.exception())
+            return JSONResponse({"job_id": job_id, "status": "queued", "status_url": f"/v1/jobs/{job_id}"},
+                                status_code=202)
+        try:
+            result = await asyncio.wrap_future(future)
+        except Exception as e:
+            code = error_code(e)
+            status = 429 if code == 429 else 422 if isinstance(e, EvaluationError) else 502
+            return JSONResponse({"job_id": job_id, "status": "failed", "error": str(e)}, status_code=status)
+        return JSONResponse({"job_id": job_id, "status": "succeeded", "result": result})
+
+    def request_key(self, request):
+        """The caller's Gemini key; the service's own key only for holders of the service token."""
+        api_key = request.headers.get("x-goog-api-key")
+        if api_key:
+            return api_key
+        if self.service_token and self.api_key:
+            authorization = request.headers.get("authorization", "")
+            if hmac.compare_digest(authorization.encode(), f"Bearer {self.service_token}".encode()):
+                return self.api_key
+        return None
+
+
+def _unauthorized():
+    return _error(401, "Missing API key: send X-Goog-Api-Key")
+
+
+async def evaluate_text(request):
+    service = request.app.state.service
+    api_key = service.request_key(request)
+    if not api_key:
+        return _unauthorized()
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error(400, "Body must be JSON")
+    text = body.get("text") if isinstance(body, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        return _error(400, "'text' must be a non-empty string")
+
+    text, truncated = truncate_text(text)
+    model = body.get("model") or service.model
+    prescreen = bool(body.get("prescreen", False))
+
+    def evaluate():
+        result = service.evaluator(api_key).evaluate_text(text, model, prescreen=prescreen)
+        result["truncated"] = truncated
+        return result
+
+    return await service.submit(request, "text", evaluate, key_fingerprint(api_key))
+
+
+async def evaluate_video(request):
+    service = request.app.state.service
+    api_key = service.request_key(request)
+    if not api_key:
+        return _unauthorized()
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_VIDEO_BYTES + UPLOAD_OVERHEAD_BYTES:
+        return _error(413, f"Video must be smaller than {MAX_VIDEO_BYTES // (1024 * 1024)} MB")
+
+    # Parsed as it streams in; file parts are spooled to disk beyond 1 MB
+    async with request.form(max_files=1, max_fields=8) as form:
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            return _error(400, "Send the video as a multipart 'file' part")
+        extension = os.path.splitext(upload.filename or "")[1].lower()
+        if extension not in VIDEO_EXTENSIONS:
+            return _error(400, f"Unsupported video type; expected one of {', '.join(VIDEO_EXTENSIONS)}")
+        if upload.size is not None and upload.size > MAX_VIDEO_BYTES:
+            return _error(413, f"Video must be smaller than {MAX_VIDEO_BYTES // (1024 * 1024)} MB")
+        model = form.get("model") or service.model
+        text = form.get("text")
+        if text is not None and (not isinstance(text, str) or not text.strip()):
+            return _error(400, "'text' must be a non-empty string")
+        truncated = False
+        if text is not None:
+            text, truncated = truncate_text(text)
+        mime_type = upload.content_type if (upload.content_type or "").startswith("video/") else None
+
+        # The form's spool is closed with the request, so the job gets its own copy
+        fd, path = tempfile.mkstemp(suffix=extension, prefix="judge-upload-")
+
+        def save():
+            with os.fdopen(fd, "wb") as out:
+                upload.file.seek(0)
+                shutil.copyfileobj(upload.file, out)
+
+        try:
+            await run_in_threadpool(save)
+        except BaseException:
+            os.remove(path)
+            raise
+
+    def evaluate():
+        with open(path, "rb") as video:
+            if text is None:
+                return service.evaluator(api_key).evaluate_video(video, model, mime_type=mime_type)
+            result = service.evaluator(api_key).evaluate_combined(text, video, model, mime_type=mime_type)
+            result["truncated"] = truncated
+            return result
+
+    kind = "video" if text is None else "text+video"
+    return await service.submit(request, kind, evaluate, key_fingerprint(api_key), cleanup=lambda: os.remove(path))
+
+
+async def get_job(request):
+    service = request.app.state.service
+    api_key = service.request_key(request)
+    if not api_key:
+        return _unauthorized()
+    job = await run_in_threadpool(service.jobs.get, request.path_params["job_id"], key_fingerprint(api_key))
+    if job is None:
+        return _error(404, "Unknown job")
+    return JSONResponse(job)
+
+
+def _int_param(request, name, default):
+    try:
+        return max(0, int(request.query_params.get(name, default)))
+    except ValueError:
+        return default
+
+
+def _result_filters(request, api_key):
+    filters = {name: request.query_params[name] for name in RESULT_FILTERS if name in request.query_params}
+    # Callers only ever see evaluations made with their own key
+    filters["owner"] = key_fingerprint(api_key)
+    return filters
+
+
+async def list_results(request):
+    service = request.app.state.service
+    api_key = service.request_key(request)
+    if not api_key:
+        return _unauthorized()
+    filters = _result_filters(request, api_key)
+    # Include rows still queued for the background writer
+    await run_in_threadpool(service.results.flush, 2)
+    rows = await run_in_threadpool(
+        service.results.query,
+        limit=min(_int_param(request, "limit", 100), 1000), offset=_int_param(request, "offset", 0), **filters
+    )
+    return JSONResponse({"results": rows})
+
+
+async def results_summary(request):
+    service = request.app.state.service
+    api_key = service.request_key(request)
+    if not api_key:
+        return _unauthorized()
+    group_by = request.query_params.get("group_by", "model")
+    if group_by not in GROUP_COLUMNS:
+        return _error(400, f"group_by must be one of {', '.join(GROUP_COLUMNS)}")
+    filters = _result_filters(request, api_key)
+    await run_in_threadpool(service.results.flush, 2)
+    rows = await run_in_threadpool(service.results.aggregate, group_by=group_by, **filters)
+    return JSONResponse({"group_by": group_by, "summary": rows})
+
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+def default_client_factory():
+    # LLM_JUDGE_RECORD / LLM_JUDGE_REPLAY record calls to, or serve them from, a cassette
+    from src.cassette import cassette_factory
+    if os.environ.get("LLM_JUDGE_MOCK") == "1":
+        from src.mock_client import MockClient, lognormal_latency
+        # Median simulated response time in seconds, for load tests
+        median = float(os.environ.get("LLM_JUDGE_MOCK_LATENCY", "0"))
+        latency = lognormal_latency(median, 0.5) if median > 0 else None
+        return cassette_factory(lambda api_key: MockClient(api_key=api_key, latency=latency))
+    if os.environ.get("LLM_JUDGE_REPLAY"):
+        return cassette_factory(None)
+    from google import genai
+    return cassette_factory(lambda api_key: genai.Client(api_key=api_key))
+
+
+def create_app(service=None):
+    """The ASGI app; without `service`, one is configured from the environment."""
+    if service is None:
+        configure_from_env()
+        service = JudgeService(
+            default_client_factory(),
+            api_key=os.environ.get("GEMINI_API_KEY"),
+            service_token=os.environ.get("LLM_JUDGE_SERVICE_TOKEN") or None,
+            tier=os.environ.get("LLM_JUDGE_TIER", "free"),
+            adaptive=os.environ.get("LLM_JUDGE_ADAPTIVE", "1") == "1",
+            model=os.environ.get("LLM_JUDGE_MODEL", DEFAULT_MODEL),
+            threads=int(os.environ.get("LLM_JUDGE_SERVICE_THREADS", "16"))
+        )
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await run_in_threadpool(service.close)
+
+    app = Starlette(routes=[
+        Route("/health", health),
+        Route("/v1/evaluations/text", evaluate_text, methods=["POST"]),
+        Route("/v1/evaluations/video", evaluate_video, methods=["POST"]),
+        Route("/v1/jobs/{job_id}", get_job),
+        Route("/v1/results", list_results),
+        Route("/v1/results/summary", results_summary),
+    ], lifespan=lifespan)
+    app.state.service = service
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="LLM judge evaluation service")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to accept connections from other hosts")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes; they share the rate-limit state")
+    args = parser.parse_args()
+    uvicorn.run("src.service:create_app", factory=True, host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Client for the evaluation service (src/service.py) with the Evaluator interface, so the
+Streamlit app can hand evaluations to a separately deployed and scaled service.
+"""
+import os
+from types import SimpleNamespace
+
+import httpx
+
+# Video evaluations include upload and File API processing
+DEFAULT_TIMEOUT = 600.0
+
+
+class ServiceError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.code = status_code
+
+
+class ServiceClient:
+    def __init__(self, base_url, api_key, timeout=DEFAULT_TIMEOUT, http_client=None):
+        self._http = http_client or httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+        self._headers = {"X-Goog-Api-Key": api_key}
+
+    def close(self):
+        self._http.close()
+
+    def _body(self, response):
+        body = response.json()
+        if response.status_code != 200:
+            raise ServiceError(response.status_code, body.get("error", response.text))
+        return body
+
+    def _result(self, response):
+        result = self._body(response)["result"]
+        usage = result.get("usage")
+        # Same shape as Evaluator results; usage reads like the SDK's usage metadata
+        result["metadata"] = SimpleNamespace(**usage) if usage else None
+        result["structured"] = result.pop("evaluation")
+        return result
+
+    def evaluate_text(self, text, model, prescreen=False):
+        response = self._http.post(
+            "/v1/evaluations/text", params={"wait": "true"}, headers=self._headers,
+            json={"text": text, "model": model, "prescreen": prescreen}
+        )
+        return self._result(response)
+
+    def evaluate_video(self, file, model, mime_type=None, keep_upload=False, on_status=None):
+        """Streams `file` to the service. The upload is not kept: follow-ups see the verdict only."""
+        return self._post_video(file, {"model": model}, mime_type, on_status)
+
+    def evaluate_combined(self, text, file, model, mime_type=None, keep_upload=False, on_status=None):
+        """Text and video judged in one call by the service; as evaluate_video otherwise."""
+        return self._post_video(file, {"model": model, "text": text}, mime_type, on_status)
+
+    def _post_video(self, file, data, mime_type, on_status):
+        if on_status:
+            on_status("Sending video to the evaluation service...")
+        file.seek(0)
+        response = self._http.post(
+            "/v1/evaluations/video", params={"wait": "true"}, headers=self._headers,
+            files={"file": (os.path.basename(file.name), file, mime_type or "application/octet-stream")},
+            data=data
+        )
+        return self._result(response)
+
+    def results(self, limit=100, **filters):
+        """Stored results of this key, newest first, as ResultsStore.query."""
+        response = self._http.get("/v1/results", params={"limit": limit, **filters}, headers=self._headers)
+        return self._body(response)["results"]
+
+    def results_summary(self, group_by="model", **filters):
+        """Aggregates of this key's stored results, as ResultsStore.aggregate."""
+        response = self._http.get(
+            "/v1/results/summary", params={"group_by": group_by, **filters}, headers=self._headers
+        )
+        return self._body(response)["summary"]
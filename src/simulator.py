@@ -0,0 +1,298 @@
+"""
+Capacity planning: discrete-event simulation of a workload through the rate limiter.
+
+    python -m src.simulator --count 10000 [--tier tier1] [--model gemini-2.5-flash]
+    python -m src.simulator --workload workload.jsonl
+    python -m src.simulator --results results.db [--since 2026-10-01] [--arrivals recorded]
+
+Requests are admitted by the real RateLimiter.try_admit on a VirtualClock, against
+in-memory quota state, so RPM/TPM/RPD and batch headroom behave exactly as in production
+while a day of traffic takes a fraction of a second. As in wait_if_needed, requests for a
+model are admitted one at a time (interactive before batch, then in arrival order): only
+the head of each model's queue polls the limiter, and it polls again after the wait the
+limiter returns. An admitted request holds its slot for its latency, then its tokens are
+recorded with update_usage.
+
+A workload file has one JSON object per line: "model", "prompt_tokens", and optionally
+"candidates_tokens", "latency_ms", "priority" ("interactive" or "batch") and "at" (arrival
+in seconds from the start). Stored results replay their models, token counts and
+latencies, either as a backlog submitted at once or at their recorded arrival times.
+The simulation assumes the server enforces the configured limits and never throttles
+(429) below them.
+"""
+import argparse
+import contextlib
+import heapq
+import json
+import math
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from src.clock import VirtualClock
+from src.rate_limiter import PRIORITIES, RateLimiter, _apply_change
+from src.state_log import MemoryStateLog
+
+# Defaults for synthetic workloads, close to a text evaluation with the text judge prompt
+DEFAULT_PROMPT_TOKENS = 1500
+DEFAULT_CANDIDATES_TOKENS = 500
+DEFAULT_LATENCY = 4.0
+LATENCY_SIGMA = 0.5
+
+# Event kinds, in the order events at the same instant are handled
+_DONE, _ARRIVAL, _ADMIT = 0, 1, 2
+
+
+class SimRequest:
+    __slots__ = ("arrival", "model", "prompt_tokens", "candidates_tokens", "latency", "priority",
+                 "admitted", "finished")
+
+    def __init__(self, arrival, model, prompt_tokens, candidates_tokens=0, latency=DEFAULT_LATENCY,
+                 priority="interactive"):
+        self.arrival = arrival
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.candidates_tokens = candidates_tokens
+        self.latency = latency
+        self.priority = PRIORITIES.index(priority)
+        self.admitted = None
+        self.finished = None
+
+
+def synthetic_workload(count, model, prompt_tokens=DEFAULT_PROMPT_TOKENS, candidates_tokens=DEFAULT_CANDIDATES_TOKENS,
+                       latency=DEFAULT_LATENCY, priority="interactive", seed=0):
+    """`count` requests submitted at once, with lognormal latencies around `latency` seconds."""
+    rng = random.Random(seed)
+    mu = math.log(latency)
+    return [SimRequest(0.0, model, prompt_tokens, candidates_tokens, rng.lognormvariate(mu, LATENCY_SIGMA), priority)
+            for _ in range(count)]
+
+
+def load_workload(path):
+    requests = []
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            requests.append(SimRequest(
+                float(item.get("at", 0.0)), item["model"], int(item["prompt_tokens"]),
+                int(item.get("candidates_tokens", 0)),
+                item["latency_ms"] / 1000 if item.get("latency_ms") is not None else DEFAULT_LATENCY,
+                item.get("priority", "interactive")
+            ))
+    return requests
+
+
+def results_workload(store, recorded_arrivals=False, since=None):
+    """Judge calls stored in a ResultsStore; arrivals at once, or at their recorded times."""
+    requests = []
+    columns = ["created_at", "model", "prompt_tokens", "candidates_tokens", "latency_ms"]
+    for rows in store.iter_batches(columns=columns, source="judge", since=since):
+        for created_at, model, prompt_tokens, candidates_tokens, latency_ms in rows:
+            if model is None or prompt_tokens is None:
+                continue
+            requests.append(SimRequest(
+                created_at if recorded_arrivals else 0.0, model, prompt_tokens, candidates_tokens or 0,
+                latency_ms / 1000 if latency_ms is not None else DEFAULT_LATENCY
+            ))
+    if recorded_arrivals and requests:
+        start = min(r.arrival for r in requests)
+        for r in requests:
+            r.arrival -= start
+    return requests
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"mean": sum(values) / len(values), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+
+class Simulator:
+    def __init__(self, config_file="models_config.json", tier="free", concurrency=None, adaptive=False):
+        """`concurrency` caps requests queued or in flight at once (evaluation threads); None for no cap."""
+        self.clock = VirtualClock()
+        self.limiter = RateLimiter(config_file=config_file, tier=tier, adaptive=adaptive, clock=self.clock,
+                                   state_log=MemoryStateLog(_apply_change))
+        self.concurrency = concurrency
+
+    def run(self, requests):
+        unknown = {r.model for r in requests} - set(self.limiter.limits)
+        if unknown:
+            raise ValueError(f"No limits configured in tier {self.limiter.tier!r} for: {', '.join(sorted(unknown))}")
+        clock, limiter = self.clock, self.limiter
+        events = [(r.arrival, _ARRIVAL, i, r) for i, r in enumerate(requests)]
+        heapq.heapify(events)
+        sequence = len(events)
+        queues = {}
+        # The current poll of each model's queue head; a superseded poll's event is ignored
+        polling = {}
+        waiting = deque()
+        busy = 0
+        rejected = 0
+
+        def poll(model, at):
+            nonlocal sequence
+            polling[model] = sequence
+            heapq.heappush(events, (at, _ADMIT, sequence, model))
+            sequence += 1
+
+        def enqueue(request):
+            nonlocal busy
+            busy += 1
+            model_queues = queues.setdefault(request.model, [deque() for _ in PRIORITIES])
+            # A request outranking the current head polls now, as a waiting caller sleeps outside its turn
+            outranks = not any(model_queues[:request.priority + 1])
+            model_queues[request.priority].append(request)
+            if request.model not in polling or outranks:
+                poll(request.model, clock.now)
+
+        started = time.perf_counter()
+        # The limiter reports every wait on stdout; a simulation makes millions of them
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            while events:
+                at, kind, token, item = heapq.heappop(events)
+                clock.advance_to(at)
+                if kind == _ARRIVAL:
+                    if self.concurrency is not None and busy >= self.concurrency:
+                        waiting.append(item)
+                    else:
+                        enqueue(item)
+                elif kind == _ADMIT:
+                    if polling.get(item) != token:
+                        continue
+                    queue = next((q for q in queues[item] if q), None)
+                    if queue is None:
+                        del polling[item]
+                        continue
+                    request = queue[0]
+                    try:
+                        wait, reservation = limiter.try_admit(item, request.prompt_tokens, PRIORITIES[request.priority])
+                    except ValueError:
+                        # Larger than the model's TPM: never admissible
+                        queue.popleft()
+                        busy -= 1
+                        rejected += 1
+                        wait, reservation = 0.0, None
+                    else:
+                        if wait is None:
+                            queue.popleft()
+                            request.admitted = clock.now
+                            heapq.heappush(events, (clock.now + request.latency, _DONE, sequence, (request, reservation)))
+                            sequence += 1
+                            wait = 0.0
+                    poll(item, clock.now + wait)
+                else:
+                    request, reservation = item
+                    request.finished = clock.now
+                    limiter.update_usage(request.model, request.prompt_tokens + request.candidates_tokens, reservation)
+                    busy -= 1
+                    if waiting:
+                        enqueue(waiting.popleft())
+        return self._report(requests, rejected, time.perf_counter() - started)
+
+    def _report(self, requests, rejected, wall_seconds):
+        done = [r for r in requests if r.finished is not None]
+        start = min((r.arrival for r in requests), default=0.0)
+        end = max((r.finished for r in done), default=start)
+        span_minutes = max((end - start) / 60, 1 / 60)
+        models = {}
+        for r in done:
+            m = models.setdefault(r.model, {"requests": 0, "tokens": 0, "first": r.admitted, "last": r.admitted})
+            m["requests"] += 1
+            m["tokens"] += r.prompt_tokens + r.candidates_tokens
+            m["first"] = min(m["first"], r.admitted)
+            m["last"] = max(m["last"], r.admitted)
+        for model, m in models.items():
+            limit = self.limiter.limits[model]
+            # Utilization over the minutes the model was admitting requests
+            minutes = max((m.pop("last") - m.pop("first")) / 60, 1.0)
+            m["rpm_utilization"] = m["requests"] / minutes / limit["rpm"]
+            m["tpm_utilization"] = m["tokens"] / minutes / limit["tpm"]
+            # Days of the model's daily quota the workload consumes
+            m["rpd_burn"] = m["requests"] / limit["rpd"]
+        return {
+            "requests": len(requests),
+            "completed": len(done),
+            "rejected": rejected,
+            "completion_seconds": end - start,
+            "throughput_per_minute": len(done) / span_minutes,
+            "queueing_delay_seconds": _percentiles([r.admitted - r.arrival for r in done]),
+            "models": models,
+            "simulated_requests_per_second": len(requests) / wall_seconds if wall_seconds > 0 else None,
+        }
+
+
+def _duration(seconds):
+    if seconds < 120:
+        return f"{seconds:.1f} s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f} min"
+    if seconds < 172800:
+        return f"{seconds / 3600:.1f} h"
+    return f"{seconds / 86400:.1f} days"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast how long a workload takes under the configured rate limits.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--count", type=int, help="Synthetic backlog of this many evaluations")
+    source.add_argument("--workload", help="JSONL workload file")
+    source.add_argument("--results", help="Replay judge calls from a results database")
+    parser.add_argument("--config", default="models_config.json")
+    parser.add_argument("--tier", default="free")
+    parser.add_argument("--model", help="Send every request to this model (default for --count: gemini-2.5-flash)")
+    parser.add_argument("--concurrency", type=int, help="Requests queued or in flight at once (default: no cap)")
+    parser.add_argument("--prompt-tokens", type=int, default=DEFAULT_PROMPT_TOKENS)
+    parser.add_argument("--candidates-tokens", type=int, default=DEFAULT_CANDIDATES_TOKENS)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Median call latency in seconds")
+    parser.add_argument("--priority", choices=PRIORITIES, default="interactive")
+    parser.add_argument("--since", help="With --results: only rows created on or after this date (YYYY-MM-DD, UTC)")
+    parser.add_argument("--arrivals", choices=("backlog", "recorded"), default="backlog",
+                        help="With --results: submit everything at once, or at the recorded times")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.count is not None:
+        requests = synthetic_workload(args.count, args.model or "gemini-2.5-flash", args.prompt_tokens,
+                                      args.candidates_tokens, args.latency, args.priority)
+    elif args.workload:
+        requests = load_workload(args.workload)
+    else:
+        from src.results_store import ResultsStore
+        since = None
+        if args.since:
+            since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+        store = ResultsStore(args.results)
+        try:
+            requests = results_workload(store, recorded_arrivals=args.arrivals == "recorded", since=since)
+        finally:
+            store.close()
+    if args.model:
+        for r in requests:
+            r.model = args.model
+
+    report = Simulator(args.config, args.tier, args.concurrency).run(requests)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['completed']} of {report['requests']} requests completed in {_duration(report['completion_seconds'])} "
+          f"({report['throughput_per_minute']:.1f}/min, tier {args.tier})")
+    if report["rejected"]:
+        print(f"{report['rejected']} requests exceed their model's TPM and can never be admitted")
+    delay = report["queueing_delay_seconds"]
+    if delay:
+        print(f"Queueing delay: mean {_duration(delay['mean'])}, p50 {_duration(delay['p50'])}, "
+              f"p99 {_duration(delay['p99'])}, max {_duration(delay['max'])}")
+    for model, m in report["models"].items():
+        print(f"{model}: {m['requests']} requests, RPM {m['rpm_utilization']:.0%}, TPM {m['tpm_utilization']:.0%}, "
+              f"{m['rpd_burn']:.2f} days of RPD")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Crash-safe JSON state shared between processes: a snapshot plus a write-ahead log.
+
+The snapshot (`path`) is only ever replaced whole, by writing a temporary file, fsyncing
+it and renaming it over the old one, so it is never seen half-written. Changes between
+snapshots are appended to `path + ".wal"` as one JSON line each, tagged with a sequence
+number. A change therefore costs a small append rather than a rewrite of the whole state.
+
+Every process keeps the state in memory and, under an exclusive flock on the log, replays
+only the lines appended since it last looked. Once the log outgrows the snapshot it is
+compacted: the state is written as a new snapshot carrying the last sequence number, and
+the log is truncated. A crash between the two leaves log lines the snapshot already holds,
+and replay skips them by sequence number. A line torn by a crash mid-append is cut off at
+recovery. Appends are not fsynced: a killed process loses nothing that was written, while
+an OS crash can lose the last appends but never the snapshot.
+"""
+import copy
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+# Reserved snapshot key holding the sequence number of the last change the snapshot includes
+SEQ_KEY = "_seq"
+# The log is compacted once it is larger than the snapshot, and at least this large
+COMPACT_MIN_BYTES = 64 * 1024
+
+_LOGS = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def get_state_log(path, apply):
+    """
+    The process-wide StateLog for `path`. Shared so that threads of one process use one
+    in-memory state and one lock (flock does not exclude threads sharing a descriptor).
+    """
+    # Keyed by pid: a forked child must not share the parent's descriptor, and with it the parent's flock
+    key = (os.getpid(), os.path.abspath(path))
+    with _LOGS_LOCK:
+        log = _LOGS.get(key)
+        if log is None:
+            log = _LOGS[key] = StateLog(path, apply)
+        return log
+
+
+class StateLog:
+    def __init__(self, path, apply, compact_min_bytes=COMPACT_MIN_BYTES):
+        """`apply(state, record)` applies one logged change to the state dict; it must be deterministic."""
+        self.path = path
+        self.wal_path = f"{path}.wal"
+        self._apply = apply
+        self.compact_min_bytes = compact_min_bytes
+        self.state = {}
+        self.seq = 0
+        self._snapshot_id = None
+        self._snapshot_size = 0
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._fd = None
+        with self.locked():
+            if not os.path.exists(self.path):
+                self._write_snapshot()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _open(self):
+        """(Re)opens the log, e.g. after the state files were deleted to reset the quota."""
+        try:
+            current = os.stat(self.wal_path).st_ino
+        except FileNotFoundError:
+            current = None
+        if self._fd is not None and current == os.fstat(self._fd).st_ino:
+            return
+        self.close()
+        self._fd = os.open(self.wal_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._snapshot_id = None
+        self._offset = 0
+
+    @contextmanager
+    def locked(self):
+        """Holds the log exclusively (across threads and processes) and yields the up-to-date state."""
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield self.state
+                if self._offset > max(self.compact_min_bytes, self._snapshot_size):
+                    self.compact()
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def read(self):
+        """A copy of the current state."""
+        with self.locked() as state:
+            return copy.deepcopy(state)
+
+    def append(self, record):
+        """Applies `record` to the in-memory state and appends it to the log; call while locked."""
+        record = {**record, "seq": self.seq + 1}
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        os.write(self._fd, line)
+        self._offset += len(line)
+        self._apply(self.state, record)
+        self.seq = record["seq"]
+
+    def compact(self):
+        """Writes the state as a new snapshot and empties the log; call while locked."""
+        self._write_snapshot()
+        os.ftruncate(self._fd, 0)
+        self._offset = 0
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+            snapshot_id = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            snapshot_id = None
+        wal_size = os.fstat(self._fd).st_size
+        # Another process compacted: its snapshot holds everything, the log starts over
+        if snapshot_id != self._snapshot_id or wal_size < self._offset:
+            self._load_snapshot()
+            self._snapshot_id = snapshot_id
+            self._offset = 0
+        if wal_size > self._offset:
+            self._replay(wal_size)
+
+    def _load_snapshot(self):
+        self.state, self.seq, self._snapshot_size = {}, 0, 0
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        self._snapshot_size = len(data)
+        if not data.strip():
+            return
+        try:
+            state = json.loads(data)
+        except ValueError as e:
+            # Snapshots are replaced atomically, so this is a file damaged outside the limiter
+            # (or a pre-WAL state file torn mid-rewrite); keep it for inspection rather than overwrite it
+            corrupt_path = f"{self.path}.corrupt"
+            print(f"Warning: Unreadable state snapshot {self.path} ({e}); moved to {corrupt_path}")
+            os.replace(self.path, corrupt_path)
+            return
+        # A state file from before the log is a snapshot at sequence 0
+        self.seq = state.pop(SEQ_KEY, 0)
+        self.state = state
+
+    def _replay(self, wal_size):
+        data = os.pread(self._fd, wal_size - self._offset, self._offset)
+        good = 0
+        # The last piece is empty unless the final line is incomplete
+        for line in data.split(b"\n")[:-1]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good += len(line) + 1
+            if record["seq"] > self.seq:
+                self._apply(self.state, record)
+                self.seq = record["seq"]
+        if good < len(data):
+            # Left by a writer that died mid-append; cut it so later appends start on a clean line
+            print(f"Warning: Discarding {len(data) - good} bytes of incomplete log entries in {self.wal_path}")
+            os.ftruncate(self._fd, self._offset + good)
+        self._offset += good
+
+    def _write_snapshot(self):
+        tmp_path = f"{self.path}.tmp"
+        data = json.dumps({**self.state, SEQ_KEY: self.seq}).encode("utf-8")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        st = os.stat(self.path)
+        self._snapshot_id = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self._snapshot_size = len(data)
+
+
+class MemoryStateLog:
+    """The StateLog interface over a plain dict, for state private to one process (e.g. a simulation)."""
+
+    def __init__(self, apply, state=None):
+        self._apply = apply
+        self.state = state if state is not None else {}
+        self._lock = threading.Lock()
+
+    def locked(self):
+        # The log is its own context manager: a simulation takes the lock millions of times
+        return self
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self.state
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+    def read(self):
+        with self._lock:
+            return copy.deepcopy(self.state)
+
+    def append(self, record):
+        self._apply(self.state, record)
@@ -0,0 +1,186 @@
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+from src.dedup import append_verdicts, read_verdict, popcount
+
+try:
+    import cv2
+except ImportError:
+    # Frame decoding is optional; without OpenCV videos are never fingerprinted
+    cv2 = None
+
+# Frames sampled at evenly spaced positions across the clip
+SAMPLE_FRAMES = 16
+HASH_SIZE = 8
+# Bits per frame hash; fingerprint distances are in [0, HASH_BITS]
+HASH_BITS = HASH_SIZE * HASH_SIZE
+DCT_SIZE = 32
+CHUNK_SIZE = 1024 * 1024
+# Stored fingerprints compared per vectorized step, bounding the pairwise distance buffer
+LOOKUP_BATCH = 8192
+
+_RECORD_DTYPE = np.dtype([
+    ("frames", "<u8", (SAMPLE_FRAMES,)),
+    ("offset", "<u8"),
+    ("length", "<u4")
+])
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+_DCT = _dct_matrix(DCT_SIZE)
+_BIT_WEIGHTS = np.uint64(1) << np.arange(HASH_BITS, dtype=np.uint64)
+
+
+def _area_resize(gray, size):
+    """Downsamples a 2D array to size x size by averaging the source blocks."""
+    rows = np.linspace(0, gray.shape[0], size + 1).astype(int)[:-1]
+    cols = np.linspace(0, gray.shape[1], size + 1).astype(int)[:-1]
+    summed = np.add.reduceat(np.add.reduceat(gray.astype(np.float64), rows, axis=0), cols, axis=1)
+    counts = np.outer(np.diff(np.append(rows, gray.shape[0])), np.diff(np.append(cols, gray.shape[1])))
+    return summed / counts
+
+
+def phash(gray):
+    """
+    Computes the 64-bit perceptual hash of a grayscale frame: the low-frequency
+    8x8 block of a 32x32 DCT, thresholded at its median (DC term excluded).
+    """
+    small = _area_resize(gray, DCT_SIZE)
+    coeffs = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    median = np.median(coeffs[1:])
+    return int(((coeffs > median).astype(np.uint64) * _BIT_WEIGHTS).sum())
+
+
+def iter_frames(path, samples=SAMPLE_FRAMES):
+    """
+    Yields up to `samples` grayscale frames at evenly spaced positions.
+    Frames are decoded one at a time, so memory stays bounded by a single frame.
+    """
+    if cv2 is None:
+        raise RuntimeError("OpenCV (opencv-python-headless) is required to decode video frames")
+
+    capture = cv2.VideoCapture(path)
+    try:
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total <= 0:
+            return
+        for position in np.linspace(0, total - 1, min(samples, total)).astype(int):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            ok, frame = capture.read()
+            if not ok:
+                continue
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    finally:
+        capture.release()
+
+
+def fingerprint_path(path):
+    """Returns a uint64 array of SAMPLE_FRAMES frame hashes, or None if nothing could be decoded."""
+    hashes = [phash(frame) for frame in iter_frames(path)]
+    if not hashes:
+        return None
+    # Short clips repeat their last hash so every fingerprint has the same width
+    hashes += [hashes[-1]] * (SAMPLE_FRAMES - len(hashes))
+    return np.array(hashes, dtype=np.uint64)
+
+
+def fingerprint_file(file_obj, suffix=".mp4"):
+    """
+    Fingerprints a file-like object (e.g. Streamlit's UploadedFile).
+    The upload is streamed to a temporary file in fixed-size chunks because OpenCV
+    decodes from a path, and the read position is restored afterwards.
+    """
+    position = file_obj.tell() if hasattr(file_obj, "tell") else None
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            shutil.copyfileobj(file_obj, tmp, CHUNK_SIZE)
+        return fingerprint_path(tmp_path)
+    finally:
+        os.remove(tmp_path)
+        if position is not None:
+            file_obj.seek(position)
+
+
+def fingerprint_distance(query, stored):
+    """
+    Mean Hamming distance from each query frame to its closest stored frame.
+    `stored` is an (N, SAMPLE_FRAMES) array; returns N distances.
+    Matching frames to their nearest neighbour tolerates small trims and re-timing.
+    """
+    pairwise = popcount(query[None, :, None] ^ stored[:, None, :]).reshape(stored.shape[0], SAMPLE_FRAMES, SAMPLE_FRAMES)
+    return pairwise.min(axis=2).mean(axis=1)
+
+
+class VideoFingerprintIndex:
+    """
+    Disk-backed index of perceptual video fingerprints and their verdicts.
+
+    Layout of `path`:
+    - fingerprints.bin: fixed-size records (frame hashes, verdict offset, verdict length)
+    - verdicts.jsonl: one stored verdict per line
+
+    Nothing is read from disk until the first lookup or insert.
+    """
+
+    def __init__(self, path="video_fingerprint_index", max_distance=10):
+        self.path = path
+        self.max_distance = max_distance
+        self._records_file = os.path.join(path, "fingerprints.bin")
+        self._verdicts_file = os.path.join(path, "verdicts.jsonl")
+        self._lock = threading.Lock()
+        self._records = None
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._records)
+
+    def _ensure_loaded(self):
+        if self._records is not None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._records_file):
+            self._records = np.fromfile(self._records_file, dtype=_RECORD_DTYPE)
+        else:
+            self._records = np.empty(0, dtype=_RECORD_DTYPE)
+
+    def lookup(self, fingerprint):
+        """Returns (verdict, distance) for the closest stored video within max_distance, or None."""
+        with self._lock:
+            self._ensure_loaded()
+            if fingerprint is None or not len(self._records):
+                return None
+            frames = self._records["frames"]
+            distances = np.concatenate([
+                fingerprint_distance(fingerprint, frames[i:i + LOOKUP_BATCH])
+                for i in range(0, len(frames), LOOKUP_BATCH)
+            ])
+            i = int(np.argmin(distances))
+            if distances[i] > self.max_distance:
+                return None
+            record = self._records[i]
+            return read_verdict(self._verdicts_file, record["offset"], record["length"]), float(distances[i])
+
+    def add(self, fingerprint, verdict):
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            records = []
+
+            def encode(spans):
+                records.extend((fingerprint, offset, length) for offset, length in spans)
+                return np.array(records, dtype=_RECORD_DTYPE).tobytes()
+
+            append_verdicts(self._verdicts_file, [verdict], self._records_file, encode)
+            self._records = np.concatenate([self._records, np.array(records, dtype=_RECORD_DTYPE)])
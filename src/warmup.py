@@ -0,0 +1,57 @@
+"""
+Preloads what the first evaluation would otherwise pay for: the google-genai SDK and an
+HTTP client, the parsed limits config, and the parser.
+
+The app starts this in a background thread on its first run, so the API key screen renders
+without waiting on the SDK import and the import is done by the time a key is entered.
+
+    python -m src.warmup    # prints the time spent per step
+"""
+import threading
+import time
+
+_SAMPLE_RESPONSE = '```json\n{"origin_analysis": {"prediction": "Human-Generated", "confidence_score": 0.5}}\n```'
+
+
+def warm_up(config_file="models_config.json"):
+    """Runs every warm-up step and returns {step: seconds}; a failing step is reported, not raised."""
+    timings = {}
+
+    def step(name, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"Warning: warm-up step {name} failed: {e}")
+        timings[name] = time.perf_counter() - start
+
+    def sdk():
+        from google import genai
+        import google.genai.types
+        # The first client pays for the SDK's lazy imports and TLS setup; no request is sent
+        genai.Client(api_key="warm-up").close()
+
+    def config():
+        from src.rate_limiter import load_config
+        load_config(config_file)
+
+    def parser():
+        from src.parser import extract_json, sanitize_evaluation
+        sanitize_evaluation(extract_json(_SAMPLE_RESPONSE))
+
+    step("sdk", sdk)
+    step("config", config)
+    step("parser", parser)
+    return timings
+
+
+def start_warm_up(config_file="models_config.json"):
+    """Runs warm_up in a daemon thread and returns the thread."""
+    thread = threading.Thread(target=warm_up, args=(config_file,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    for name, seconds in warm_up().items():
+        print(f"{name:<8} {seconds * 1000:8.1f} ms")
@@ -1,106 +1,244 @@
+import time
 from src.rate_limiter import RateLimiter
+from src.metrics import METRICS
+from src.retry import RetryPolicy, CircuitBreaker, CircuitOpenError, error_code, retry_after
+from src.tokens import estimate_tokens
+
+_COUNT_TOKENS_CONFIG = None
+
+def _count_tokens_kwargs(kwargs):
+    """
+    count_tokens arguments for a generate call's kwargs. GenerateContentConfig is not
+    accepted by count_tokens in some SDK versions, so only the system instruction is carried
+    over in a CountTokensConfig (compatible with the real SDK and MockClient). The SDK type is
+    resolved on first use rather than at import, keeping the SDK off the startup path.
+    """
+    global _COUNT_TOKENS_CONFIG
+    sys_inst = getattr(kwargs.get('config'), 'system_instruction', None)
+    if not sys_inst:
+        return {}
+    if _COUNT_TOKENS_CONFIG is None:
+        from google.genai.types import CountTokensConfig
+        _COUNT_TOKENS_CONFIG = CountTokensConfig
+    return {'config': _COUNT_TOKENS_CONFIG(system_instruction=sys_inst)}
+
+def _call_with_retry(limiter, policy, breaker_for, candidates, prompt_tokens, call, stage):
+    """
+    Admits and runs `call(model)` under the rate limiter, retrying retryable errors
+    with backoff. The prompt is counted once by the caller and reused across attempts.
+    Each attempt goes to the first candidate model whose circuit breaker allows it,
+    so a degraded model is skipped in favour of the next configured one.
+    Observed 429s are reported to the limiter so it slows down for that model.
+    """
+    attempt = 0
+    while True:
+        model = next((m for m in candidates if breaker_for(m).allow()), None)
+        if model is None:
+            raise CircuitOpenError(f"Circuit open for {', '.join(candidates)}; try again later.")
+        breaker = breaker_for(model)
+
+        reservation = None
+        # Whether the breaker was told how the call went; otherwise a half-open trial is ended
+        reported = False
+        try:
+            wait_start = time.perf_counter()
+            reservation = limiter.wait_if_needed(model, prompt_tokens)
+            METRICS.observe_wait(model, time.perf_counter() - wait_start)
+
+            generate_start = time.perf_counter()
+            try:
+                with METRICS.span(stage, model=model):
+                    response = call(model)
+            except Exception as e:
+                # The request did not complete, so its reserved slot is handed back
+                limiter.release(model, reservation)
+                reservation = None
+                if not policy.is_retryable(e):
+                    # The service answered (e.g. 400 for a bad request), so the model itself is healthy
+                    breaker.record_success()
+                    reported = True
+                    raise
+                code = error_code(e)
+                hint = retry_after(e)
+                breaker.record_failure()
+                reported = True
+                if code == 429:
+                    limiter.record_throttle(model, hint)
+                attempt += 1
+                if attempt >= policy.max_attempts:
+                    raise
+                delay = policy.delay(attempt - 1, hint)
+                print(f"{model} returned {code}. Retrying in {delay:.2f}s (attempt {attempt + 1}/{policy.max_attempts})...")
+                METRICS.record_retry(model, code)
+                limiter.clock.sleep(delay)
+                continue
+
+            breaker.record_success()
+            reported = True
+            METRICS.record_usage(model, response.usage_metadata, time.perf_counter() - generate_start)
+            total_tokens = response.usage_metadata.total_token_count if response.usage_metadata else prompt_tokens
+            limiter.update_usage(model, total_tokens, reservation)
+            reservation = None
+            return response
+        finally:
+            # Admission failed (e.g. a prompt over the TPM limit) or the call was interrupted
+            if not reported:
+                breaker.release_trial()
+            if reservation is not None:
+                limiter.release(model, reservation)
 
 class LimitedChat:
-    def __init__(self, chat, model, client, limiter):
+    def __init__(self, chat, model, client, limiter, retry_policy=None, breakers=None, history=None, create_kwargs=None):
         self._chat = chat
         self._model = model
         self._client = client
         self._limiter = limiter
-
-    def send_message(self, message, **kwargs):
-        # To count tokens for chat, we need the history + the new message
-        history = self._chat.get_history()
-        # We wrap the message in a temporary list for counting
-        contents = [*history, message]
-        
+        self._retry = retry_policy or RetryPolicy()
+        self._breakers = breakers if breakers is not None else {}
+        # Optional ChatHistory bounding the context sent each turn (see src/chat_history.py)
+        self.history = history
+        self._create_kwargs = create_kwargs or {}
+        # Context size after the last turn, from usage metadata, so later turns only count the new message
+        self._context_tokens = None
+
+    def _prompt_tokens(self, message, kwargs):
+        if self.history is not None:
+            return self.history.estimate_prompt(message)
+
+        if self._context_tokens is not None:
+            base, contents, count_kwargs = self._context_tokens, message, {}
+        else:
+            # First turn: count the history the chat was created with + the new message
+            base, contents, count_kwargs = 0, [*self._chat.get_history(), message], _count_tokens_kwargs(kwargs)
         try:
-            # Extract system_instruction for count_tokens if present in config
-            count_kwargs = {}
-            if 'config' in kwargs:
-                # GenerateContentConfig is not compatible with count_tokens directly in some SDK versions
-                # We extract the relevant parts for token counting
-                sys_inst = getattr(kwargs['config'], 'system_instruction', None)
-                if sys_inst:
-                    # In newer SDKs we might use CountTokensConfig, but often passing 
-                    # system_instruction as a kwarg or in a simplified config works.
-                    # To be safe and compatible with our MockClient and the real SDK:
-                    from google.genai.types import CountTokensConfig
-                    count_kwargs['config'] = CountTokensConfig(system_instruction=sys_inst)
-
-            token_count_resp = self._client.models.count_tokens(
-                model=self._model,
-                contents=contents,
-                **count_kwargs
-            )
-            prompt_tokens = token_count_resp.total_tokens
+            with METRICS.span("count_tokens", model=self._model):
+                token_count_resp = self._client.models.count_tokens(
+                    model=self._model,
+                    contents=contents,
+                    **count_kwargs
+                )
+            return base + token_count_resp.total_tokens
         except Exception as e:
             print(f"Error counting tokens: {e}")
-            prompt_tokens = 1000 # Conservative fallback
-
-        self._limiter.wait_if_needed(self._model, prompt_tokens)
-        
-        response = self._chat.send_message(message, **kwargs)
-        
-        total_tokens = response.usage_metadata.total_token_count if response.usage_metadata else prompt_tokens
-        self._limiter.update_usage(self._model, total_tokens)
-        
+            return base + 1000 # Conservative fallback
+
+    def send_message(self, message, **kwargs):
+        prompt_tokens = self._prompt_tokens(message, kwargs)
+
+        # A chat is bound to its model, so retries never fall back to another one
+        response = _call_with_retry(
+            self._limiter, self._retry,
+            lambda m: self._breakers.setdefault(m, CircuitBreaker(clock=self._limiter.clock)),
+            [self._model], prompt_tokens,
+            lambda m: self._chat.send_message(message, **kwargs),
+            "send_message"
+        )
+
+        usage = response.usage_metadata
+        if self.history is not None:
+            self.history.add_turn(message, response.text, usage)
+            if self.history.changed:
+                # Evicted turns leave the chat by re-seeding it with the trimmed history
+                self._chat = self._client.chats.create(
+                    model=self._model, history=self.history.contents(), **self._create_kwargs
+                )
+                self.history.changed = False
+        elif usage is not None and usage.total_token_count:
+            self._context_tokens = usage.total_token_count
         return response
 
 class LimitedChats:
-    def __init__(self, client, limiter):
+    def __init__(self, client, limiter, retry_policy=None, breakers=None):
         self._client = client
         self._limiter = limiter
-
-    def create(self, model, **kwargs):
-        chat = self._client.chats.create(model=model, **kwargs)
-        return LimitedChat(chat, model, self._client, self._limiter)
+        self._retry = retry_policy
+        self._breakers = breakers
+
+    def create(self, model, history=None, **kwargs):
+        """`history` may be a ChatHistory, which then bounds the context sent on every turn."""
+        if history is not None:
+            chat = self._client.chats.create(model=model, history=history.contents(), **kwargs)
+        else:
+            chat = self._client.chats.create(model=model, **kwargs)
+        return LimitedChat(chat, model, self._client, self._limiter, self._retry, self._breakers,
+                           history=history, create_kwargs=kwargs)
 
 class LimitedModels:
-    def __init__(self, client, limiter):
+    def __init__(self, client, limiter, retry_policy=None, breakers=None, fallback=True):
         self._client = client
         self._limiter = limiter
-
-    def generate_content(self, model, contents, **kwargs):
-        try:
-            count_kwargs = {}
-            if 'config' in kwargs:
-                sys_inst = getattr(kwargs['config'], 'system_instruction', None)
-                if sys_inst:
-                    from google.genai.types import CountTokensConfig
-                    count_kwargs['config'] = CountTokensConfig(system_instruction=sys_inst)
-
-            token_count_resp = self._client.models.count_tokens(
-                model=model,
+        self._retry = retry_policy or RetryPolicy()
+        self._breakers = breakers if breakers is not None else {}
+        self._fallback = fallback
+
+    def breaker(self, model):
+        return self._breakers.setdefault(model, CircuitBreaker(clock=self._limiter.clock))
+
+    def _candidates(self, model):
+        if not self._fallback:
+            return [model]
+        return [model, *(m for m in self._limiter.limits if m != model)]
+
+    def generate_content(self, model, contents, prompt_tokens=None, **kwargs):
+        """
+        `prompt_tokens` is the caller's estimate of the prompt (see src/tokens.py), which
+        skips the count_tokens round trip; the reservation is settled with the actual usage.
+        """
+        if prompt_tokens is None:
+            try:
+                count_kwargs = _count_tokens_kwargs(kwargs)
+                with METRICS.span("count_tokens", model=model):
+                    token_count_resp = self._client.models.count_tokens(
+                        model=model,
+                        contents=contents,
+                        **count_kwargs
+                    )
+                prompt_tokens = token_count_resp.total_tokens
+            except Exception:
+                prompt_tokens = estimate_tokens(
+                    contents, system_instruction=getattr(kwargs.get('config'), 'system_instruction', None)
+                )
+
+        return _call_with_retry(
+            self._limiter, self._retry, self.breaker,
+            self._candidates(model), prompt_tokens,
+            lambda m: self._client.models.generate_content(
+                model=m,
                 contents=contents,
-                **count_kwargs
-            )
-            prompt_tokens = token_count_resp.total_tokens
-        except Exception:
-            prompt_tokens = len(str(contents)) // 4
-
-        self._limiter.wait_if_needed(model, prompt_tokens)
-
-        response = self._client.models.generate_content(
-            model=model,
-            contents=contents,
-            **kwargs
+                **kwargs
+            ),
+            "generate_content"
         )
 
-        total_tokens = response.usage_metadata.total_token_count if response.usage_metadata else prompt_tokens
-        self._limiter.update_usage(model, total_tokens)
-
-        return response
-
 class LimitedClient:
-    def __init__(self, client, state_file="rate_limit_state.json", config_file="models_config.json", tier="free"):
+    def __init__(self, client, state_file="rate_limit_state.json", config_file="models_config.json", tier="free",
+                 retry_policy=None, fallback=True, adaptive=False, key_id="default", flow_id=None, weight=1.0,
+                 priority="interactive", clock=None):
         self._client = client
-        self._limiter = RateLimiter(state_file, config_file, tier=tier)
-        self.models = LimitedModels(client, self._limiter)
-        self.chats = LimitedChats(client, self._limiter)
+        self._limiter = RateLimiter(state_file, config_file, tier=tier, adaptive=adaptive, key_id=key_id,
+                                    flow_id=flow_id, weight=weight, priority=priority, clock=clock)
+        # Circuit breakers are per model and shared by one-shot calls and chats
+        self._breakers = {}
+        retry_policy = retry_policy or RetryPolicy()
+        self._options = dict(state_file=state_file, config_file=config_file, retry_policy=retry_policy,
+                             fallback=fallback, key_id=key_id, weight=weight, clock=clock)
+        self.models = LimitedModels(client, self._limiter, retry_policy, self._breakers, fallback=fallback)
+        self.chats = LimitedChats(client, self._limiter, retry_policy, self._breakers)
 
     def set_tier(self, tier):
         self._limiter.tier = tier
 
+    def set_adaptive(self, adaptive):
+        self._limiter.adaptive = adaptive
+
+    def with_priority(self, priority):
+        """
+        A client over the same upstream client, key and flow whose calls are admitted in
+        another priority class, e.g. "batch" for bulk work started from an interactive session.
+        """
+        return LimitedClient(self._client, tier=self._limiter.tier, adaptive=self._limiter.adaptive,
+                             flow_id=self._limiter.flow_id, priority=priority, **self._options)
+
     @property
     def files(self):
         return self._client.files
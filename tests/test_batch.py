@@ -0,0 +1,158 @@
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import httpx
+from src.batch import BatchRunner, fetch_url, file_items, html_text, parse_text_list
+from src.clock import VirtualClock
+from src.evaluator import EvaluationError, Evaluator
+from src.mock_client import MockClient, constant_latency
+from src.rate_limiter import read_state
+from src.results_store import ResultsStore
+from src.wrapper import LimitedClient
+
+def _upload(name, data, mime_type=None):
+    file = io.BytesIO(data)
+    file.name = name
+    file.type = mime_type
+    file.size = len(data)
+    return file
+
+class TestBatchInput(unittest.TestCase):
+    def test_parse_text_list(self):
+        items = parse_text_list(
+            "https://example.com/a\nhttps://example.com/b.mp4\n---\n"
+            "First paragraph.\n\nSecond paragraph.\n---\n\n---\nAnother text\n"
+        )
+        self.assertEqual([(i.kind, i.content) for i in items], [
+            ("url", "https://example.com/a"),
+            ("url", "https://example.com/b.mp4"),
+            ("text", "First paragraph.\n\nSecond paragraph."),
+            ("text", "Another text"),
+        ])
+
+    def test_file_items(self):
+        items = file_items([
+            _upload("clip.mp4", b"video", "video/mp4"),
+            _upload("post.txt", "café review".encode("utf-8")),
+            _upload("image.png", b"png"),
+        ])
+        self.assertEqual([(i.kind, i.status) for i in items], [("video", "queued"), ("text", "queued"), ("text", "failed")])
+        self.assertEqual(items[1].content, "café review")
+        # Text files can be read again on the next rerun
+        self.assertEqual(file_items([_upload("post.txt", b"again")])[0].content, "again")
+
+    def test_oversized_video_fails_up_front(self):
+        video = _upload("big.mp4", b"x", "video/mp4")
+        video.size = 21 * 1024 * 1024
+        self.assertEqual(file_items([video])[0].status, "failed")
+
+    @patch("src.batch.resolve_host", return_value={"93.184.215.14"})
+    def test_fetch_url(self, resolve):
+        def handler(request):
+            if request.url.path.endswith(".mp4"):
+                return httpx.Response(200, content=b"frames", headers={"content-type": "video/mp4"})
+            return httpx.Response(200, text="<html><head><title>t</title></head><body><p>Hello</p>"
+                                            "<script>var x;</script><p>world</p></body></html>",
+                                  headers={"content-type": "text/html; charset=utf-8"})
+
+        http = httpx.Client(transport=httpx.MockTransport(handler))
+        kind, video, mime_type = fetch_url(http, "https://example.com/media/clip.mp4")
+        self.assertEqual((kind, video.name, video.read(), mime_type), ("video", "clip.mp4", b"frames", "video/mp4"))
+        self.assertEqual(fetch_url(http, "https://example.com/post")[:2], ("text", "Hello\nworld"))
+        with self.assertRaises(Exception):
+            fetch_url(http, "https://example.com/media/clip.mp4", max_bytes=3)
+        self.assertEqual(html_text("<p>a <b>b</b></p>"), "a\nb")
+
+    def test_fetch_url_refuses_non_public_hosts(self):
+        addresses = {"example.com": {"93.184.215.14"}, "metadata.internal": {"169.254.169.254"},
+                     "localhost": {"127.0.0.1", "::1"}, "intranet": {"10.0.0.7"}, "mapped": {"::ffff:127.0.0.1"}}
+        requested = []
+
+        def handler(request):
+            requested.append(request.url.host)
+            if request.url.path == "/redirect":
+                return httpx.Response(302, headers={"location": "http://metadata.internal/latest/meta-data/"})
+            return httpx.Response(200, text="public page", headers={"content-type": "text/plain"})
+
+        http = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch("src.batch.resolve_host", side_effect=lambda host, port: addresses[host]):
+            for url in ("http://metadata.internal/latest/meta-data/", "http://localhost:8501/", "http://intranet/",
+                        "http://mapped/", "file:///etc/passwd", "https://example.com/redirect"):
+                with self.assertRaises(EvaluationError, msg=url):
+                    fetch_url(http, url)
+            self.assertEqual(fetch_url(http, "https://example.com/post")[:2], ("text", "public page"))
+        # Only the public host was ever requested; the redirect target was checked before following it
+        self.assertEqual(set(requested), {"example.com"})
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        with open(config_path, 'w') as f:
+            json.dump({"free": {"gemini-2.5-flash": {"rpm": 1000, "tpm": 10000000, "rpd": 10000}}}, f)
+        self.mock = MockClient(latency=constant_latency(0.2))
+        self.client = LimitedClient(self.mock, state_file=os.path.join(self.tmpdir.name, "state.json"),
+                                    config_file=config_path)
+        self.store = ResultsStore(os.path.join(self.tmpdir.name, "results.db"))
+        self.evaluator = Evaluator(self.client, self.store, poll_interval=0)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_items_run_concurrently(self):
+        items = parse_text_list("\n---\n".join(f"Post number {i} about my weekend." for i in range(16)))
+        items += file_items([_upload("clip.mp4", b"video", "video/mp4")])
+        runner = BatchRunner(self.evaluator, "gemini-2.5-flash", max_workers=8)
+        started = time.perf_counter()
+        runner.start(items)
+        self.assertTrue(runner.wait(timeout=30))
+        # 17 calls of 0.2s each, eight at a time
+        self.assertLess(time.perf_counter() - started, 17 * 0.2 / 2)
+        self.assertEqual(runner.counts()["done"], 17)
+        rows = runner.rows()
+        self.assertEqual({row["prediction"] for row in rows}, {"Human-Generated"})
+        self.assertEqual(rows[-1]["type"], "Video")
+        self.assertTrue(all(row["total_tokens"] > 0 for row in rows))
+        # The uploaded video was deleted after its verdict
+        self.assertEqual(self.mock.files._files, {})
+        self.store.flush(timeout=2)
+        self.assertEqual(self.store.count(), 17)
+
+    @patch("src.batch.resolve_host", return_value={"93.184.215.14"})
+    def test_failures_are_reported_per_item(self, resolve):
+        items = parse_text_list("A normal post\n---\nhttps://example.com/missing") + file_items([_upload("x.png", b"")])
+        http = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+        runner = BatchRunner(self.evaluator, "gemini-2.5-flash", http_client=http).start(items)
+        self.assertTrue(runner.wait(timeout=30))
+        self.assertEqual([row["status"] for row in runner.rows()], ["done", "failed", "failed"])
+        self.assertIn("404", runner.rows()[1]["error"])
+
+    def test_batch_client_stops_at_the_batch_share(self):
+        config_path = os.path.join(self.tmpdir.name, "limits.json")
+        with open(config_path, 'w') as f:
+            json.dump({"free": {"gemini-2.5-flash": {"rpm": 100, "tpm": 10000000, "rpd": 10000}}}, f)
+        state_path = os.path.join(self.tmpdir.name, "shared_state.json")
+        interactive = LimitedClient(MockClient(), state_file=state_path, config_file=config_path,
+                                    key_id="batch-share", clock=VirtualClock(1000.0))
+        batch = interactive.with_priority("batch")
+        items = parse_text_list("\n---\n".join(f"Bulk post {i} about my weekend." for i in range(100)))
+        with patch("builtins.print"):
+            runner = BatchRunner(Evaluator(batch, poll_interval=0), "gemini-2.5-flash", max_workers=16).start(items)
+            self.assertTrue(runner.wait(timeout=30))
+        self.assertEqual(runner.counts()["done"], 100)
+        # Only 80% of the RPM was admitted before the virtual clock had to move on
+        history = read_state(state_path, "batch-share")["gemini-2.5-flash"]
+        self.assertEqual(sum(1 for e in history if e["timestamp"] == 1000.0), 80)
+
+    def test_empty_batch_is_done(self):
+        runner = BatchRunner(self.evaluator, "gemini-2.5-flash").start([])
+        self.assertTrue(runner.done())
+        self.assertEqual(runner.rows(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from src.calibration import CalibrationEngine, ai_scores, fit_isotonic, fit_platt
+from src.mock_client import MockUsageMetadata
+from src.parser import sanitize_evaluation
+from src.results_store import ResultsStore, build_record
+
+MODEL = "gemini-2.5-flash"
+PROMPT = "judge-text@v1"
+
+
+def _record(i, prediction, confidence, model=MODEL, prompt=PROMPT):
+    structured = sanitize_evaluation({"origin_analysis": {"prediction": prediction, "confidence_score": confidence}})
+    return build_record(structured, MockUsageMetadata(100, 20), model=model, content_type="text",
+                        content_hash=f"h{i}", latency_ms=10.0, prompt=prompt)
+
+
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.store = ResultsStore(os.path.join(self.workdir, "results.db"), flush_interval=0.01)
+        self.state = os.path.join(self.workdir, "calibration.json")
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+    def _judge(self, start, count, seed=0, model=MODEL, prompt=PROMPT):
+        """An overconfident judge: always says 0.9, and is right 70% of the time."""
+        rng = np.random.default_rng(seed)
+        labels = []
+        for i in range(start, start + count):
+            truth = "AI-Generated" if rng.random() < 0.5 else "Human-Generated"
+            correct = rng.random() < 0.7
+            other = "Human-Generated" if truth == "AI-Generated" else "AI-Generated"
+            self.store.add(_record(i, truth if correct else other, 0.9, model, prompt))
+            labels.append((f"h{i}", truth))
+        self.store.flush(5)
+        return labels
+
+    def test_ai_scores(self):
+        scores = ai_scores(["AI-Generated", "Human-Generated", "Hybrid", None], [0.8, 0.8, 0.9, 0.5])
+        np.testing.assert_allclose(scores[:3], [0.8, 0.2, 0.5])
+        self.assertTrue(np.isnan(scores[3]))
+
+    def test_fits_are_monotone(self):
+        counts = np.array([10, 0, 10, 10, 10])
+        positives = np.array([4, 0, 2, 6, 9])
+        isotonic = fit_isotonic(counts, positives)
+        self.assertTrue(np.all(np.diff(isotonic) >= 0))
+        # The violating pair (0.4, 0.2) is pooled to its mean
+        self.assertAlmostEqual(isotonic[0], 0.3)
+        self.assertAlmostEqual(isotonic[2], 0.3)
+        platt = fit_platt(counts, positives)
+        self.assertTrue(np.all(np.diff(platt) > 0))
+
+    def test_overconfident_judge_is_calibrated(self):
+        engine = CalibrationEngine(self.state, method="isotonic")
+        self.assertEqual(self.store.add_labels(self._judge(0, 2000)), 2000)
+        self.assertEqual(engine.update(self.store), 2000)
+
+        probability = engine.calibrate(MODEL, PROMPT, "AI-Generated", 0.9)
+        self.assertAlmostEqual(probability, 0.7, delta=0.05)
+        self.assertAlmostEqual(engine.calibrate(MODEL, PROMPT, "Human-Generated", 0.9), 0.3, delta=0.05)
+        # Other prompt versions and models are not calibrated
+        self.assertIsNone(engine.calibrate(MODEL, "judge-text@v2", "AI-Generated", 0.9))
+        self.assertIsNone(engine.calibrate(MODEL, PROMPT, "AI-Generated", "[Missing]"))
+        group = engine.summary()[f"{MODEL}|{PROMPT}"]
+        self.assertLess(group["brier_calibrated"], group["brier_raw"])
+
+    def test_incremental_update_matches_full_refit(self):
+        engine = CalibrationEngine(self.state)
+        self.store.add_labels(self._judge(0, 300, seed=1))
+        engine.update(self.store)
+        # New evaluations, and labels arriving late for evaluations stored earlier
+        late = self._judge(300, 300, seed=2)
+        self.store.add_labels(late[:200])
+        self.assertEqual(engine.update(self.store), 200)
+        self.store.add_labels(late[200:])
+        self.assertEqual(engine.update(self.store), 100)
+        self.assertEqual(engine.update(self.store), 0)
+
+        # A second engine loads the saved state; a refit from scratch gives the same result
+        reloaded = CalibrationEngine(self.state)
+        incremental = reloaded.calibrate(MODEL, PROMPT, "AI-Generated", 0.9)
+        self.assertEqual(reloaded.refit(self.store), 600)
+        self.assertAlmostEqual(reloaded.calibrate(MODEL, PROMPT, "AI-Generated", 0.9), incremental)
+
+    def test_needs_min_labels(self):
+        engine = CalibrationEngine(self.state, min_labels=30)
+        self.store.add_labels(self._judge(0, 20))
+        engine.update(self.store)
+        self.assertIsNone(engine.calibrate(MODEL, PROMPT, "AI-Generated", 0.9))
+        calibrated = engine.calibrate_many([MODEL], [PROMPT], ["AI-Generated"], [0.9])
+        self.assertTrue(np.isnan(calibrated[0]))
+
+    def test_rejects_unknown_label(self):
+        with self.assertRaises(ValueError):
+            self.store.add_labels([("h0", "Robot")])
+
+
+if __name__ == '__main__':
+    unittest.main()
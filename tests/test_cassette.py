@@ -0,0 +1,165 @@
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.cassette import (
+    Cassette, CassetteMiss, CassetteWriter, RecordingClient, ReplayClient, cassette_factory, merge_journals,
+    orphaned_journals, request_key
+)
+from src.evaluator import Evaluator
+from src.mock_client import MockClient, constant_latency
+from src.wrapper import LimitedClient
+
+MODEL = "gemini-2.5-flash"
+
+def _video(data=b"not really a video"):
+    video = io.BytesIO(data)
+    video.name = "clip.mp4"
+    return video
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        with open(self.config_path, 'w') as f:
+            json.dump({"free": {MODEL: {"rpm": 1000, "tpm": 10000000, "rpd": 10000}}}, f)
+        self.path = os.path.join(self.tmpdir.name, "judge.cassette")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _evaluator(self, client, name):
+        limited = LimitedClient(client, state_file=os.path.join(self.tmpdir.name, f"{name}.json"),
+                                config_file=self.config_path)
+        return Evaluator(limited, poll_interval=0)
+
+    def _cassette(self):
+        cassette = Cassette(self.path)
+        self.addCleanup(cassette.close)
+        return cassette
+
+    def test_record_then_replay(self):
+        with CassetteWriter(self.path) as writer:
+            recorder = self._evaluator(RecordingClient(MockClient(latency=constant_latency(0.25)), writer), "record")
+            text = recorder.evaluate_text("We waited 45 minutes for ramen.", MODEL)
+            video = recorder.evaluate_video(_video(), MODEL, mime_type="video/mp4")
+            post = recorder.evaluate_combined("day 3 of juggling", _video(), MODEL, mime_type="video/mp4")
+
+        cassette = self._cassette()
+        self.assertEqual(len(cassette), 3)
+        replay = self._evaluator(ReplayClient(cassette), "replay")
+        with patch("src.cassette.time.sleep") as sleep:
+            replayed = [
+                replay.evaluate_text("We waited 45 minutes for ramen.", MODEL),
+                # A new upload of the same bytes under a different File API name
+                replay.evaluate_video(_video(), MODEL, mime_type="video/mp4"),
+                replay.evaluate_combined("day 3 of juggling", _video(), MODEL, mime_type="video/mp4"),
+            ]
+        for original, result in zip((text, video, post), replayed):
+            self.assertEqual(result["raw_text"], original["raw_text"])
+            self.assertEqual(result["metadata"].total_token_count, original["metadata"].total_token_count)
+        # The recorded latency profile is reproduced
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.25] * 3)
+
+        with self.assertRaises(CassetteMiss) as miss:
+            replay.evaluate_video(_video(b"other bytes"), MODEL, mime_type="video/mp4")
+        self.assertEqual(miss.exception.code, 404)
+
+    def test_index_lookup_and_repeated_recordings(self):
+        with CassetteWriter(self.path) as writer:
+            for i in range(500):
+                writer.record(request_key(MODEL, f"request {i}")[0], {"n": i})
+            repeated = request_key(MODEL, "repeated")[0]
+            for n in ("first", "second"):
+                writer.record(repeated, {"n": n})
+        cassette = self._cassette()
+        for i in (0, 123, 499):
+            self.assertEqual(cassette.lookup(request_key(MODEL, f"request {i}")[0]), [{"n": i}])
+        self.assertEqual(cassette.lookup(request_key(MODEL, "missing")[0]), [])
+        self.assertEqual([cassette.next(repeated)["n"] for _ in range(3)], ["first", "second", "first"])
+
+    def test_append_keeps_earlier_recordings(self):
+        key_a, key_b = request_key(MODEL, "a")[0], request_key(MODEL, "b")[0]
+        with CassetteWriter(self.path) as writer:
+            writer.record(key_a, {"n": "a"})
+        with CassetteWriter(self.path) as writer:
+            writer.record(key_b, {"n": "b"})
+        cassette = self._cassette()
+        self.assertEqual((cassette.lookup(key_a), cassette.lookup(key_b)), ([{"n": "a"}], [{"n": "b"}]))
+
+    def test_concurrent_writers_keep_each_others_recordings(self):
+        # As service workers do: each writer has its own journal, merged in at close
+        key_a, key_b = request_key(MODEL, "a")[0], request_key(MODEL, "b")[0]
+        first, second = CassetteWriter(self.path), CassetteWriter(self.path)
+        first.record(key_a, {"n": "a"})
+        second.record(key_b, {"n": "b"})
+        second.close()
+        first.close()
+        cassette = self._cassette()
+        self.assertEqual((cassette.lookup(key_a), cassette.lookup(key_b)), ([{"n": "a"}], [{"n": "b"}]))
+        self.assertEqual(glob.glob(self.path + ".*.journal"), [])
+
+    def test_killed_writer_is_recovered(self):
+        script = (
+            "import os, sys\n"
+            "from src.cassette import CassetteWriter, request_key\n"
+            "writer = CassetteWriter(sys.argv[1])\n"
+            "for i in range(3):\n"
+            "    writer.record(request_key('m', f'killed {i}')[0], {'n': i})\n"
+            "os._exit(9)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", script, self.path], cwd=root, check=False)
+        journals = orphaned_journals(self.path)
+        self.assertEqual(len(journals), 1)
+        with open(journals[0], "ab") as f:
+            # A record cut short mid-write is dropped
+            f.write(b"\0" * 20)
+
+        # The next writer to close merges the orphaned journal
+        key = request_key(MODEL, "after")[0]
+        with CassetteWriter(self.path) as writer:
+            writer.record(key, {"n": "after"})
+        cassette = self._cassette()
+        self.assertEqual(len(cassette), 4)
+        self.assertEqual(cassette.lookup(request_key("m", "killed 2")[0]), [{"n": 2}])
+        self.assertEqual(orphaned_journals(self.path), [])
+        self.assertEqual(merge_journals(self.path, []), 4)
+
+    def test_replay_has_no_chats(self):
+        with CassetteWriter(self.path):
+            pass
+        client = LimitedClient(ReplayClient(self._cassette()), state_file=os.path.join(self.tmpdir.name, "s.json"),
+                               config_file=self.config_path)
+        with self.assertRaises(CassetteMiss):
+            client.chats.create(model=MODEL)
+
+    def test_key_depends_on_model_and_system_instruction(self):
+        config = type("Config", (), {"system_instruction": "judge"})()
+        self.assertNotEqual(request_key(MODEL, "x", config)[0], request_key(MODEL, "x")[0])
+        self.assertNotEqual(request_key(MODEL, "x")[0], request_key("gemini-2.5-flash-lite", "x")[0])
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            Cassette(self.path)
+
+    def test_factory_from_environment(self):
+        with CassetteWriter(self.path):
+            pass
+        with patch.dict(os.environ, {"LLM_JUDGE_REPLAY": self.path, "LLM_JUDGE_REPLAY_SPEED": "0"}):
+            client = cassette_factory(MockClient)("any-key")
+        self.assertIsInstance(client, ReplayClient)
+        self.assertEqual(client.models.speed, 0.0)
+        client.cassette.close()
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIs(cassette_factory(MockClient), MockClient)
+
+if __name__ == '__main__':
+    unittest.main()
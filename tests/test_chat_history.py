@@ -0,0 +1,71 @@
+import unittest
+import os
+import json
+import tempfile
+from unittest.mock import patch
+from src.chat_history import ChatHistory, SUMMARY_HEADER, file_content, text_content
+from src.mock_client import MockClient, MockFile
+from src.wrapper import LimitedClient
+
+class TestChatHistory(unittest.TestCase):
+    def test_evicts_oldest_turns_into_summary(self):
+        pinned = [text_content("user", "Judged text"), text_content("model", "Verdict")]
+        history = ChatHistory(pinned, budget_tokens=400, keep_turns=2)
+        for i in range(10):
+            history.add_turn(f"Question {i}? " + "detail " * 20, f"Answer {i}. " + "reason " * 20)
+
+        self.assertLessEqual(history.total_tokens, 400)
+        contents = history.contents()
+        self.assertEqual(contents[:2], pinned)
+        self.assertIn(SUMMARY_HEADER, contents[2]["parts"][0]["text"])
+        # The newest evicted turn is summarized; the oldest summary lines gave way to the budget
+        first_kept = contents[4]["parts"][0]["text"].split("?")[0]
+        newest_evicted = "Question %d?" % (int(first_kept.split()[-1]) - 1)
+        self.assertIn(newest_evicted, contents[2]["parts"][0]["text"])
+        self.assertNotIn("Question 0?", contents[2]["parts"][0]["text"])
+        self.assertEqual(contents[-2]["parts"][0]["text"], "Question 9? " + "detail " * 20)
+        self.assertTrue(history.changed)
+
+    def test_usage_metadata_corrects_running_total(self):
+        video = MockFile("files/clip.mp4", "mock://files/clip.mp4", "video/mp4")
+        history = ChatHistory([file_content("user", video, "This is the video."), text_content("model", "Verdict")])
+        usage = type("Usage", (), {"total_token_count": 5000})()
+        history.add_turn("Why frame 12?", "Warped hands.", usage)
+        self.assertEqual(history.total_tokens, 5000)
+        self.assertEqual(history.estimate_prompt("Next?"), 5000 + 2)
+
+class TestFollowUpChat(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        with open(config_path, 'w') as f:
+            json.dump({"free": {"gemini-2.5-flash": {"rpm": 1000, "tpm": 10000000, "rpd": 10000}}}, f)
+        self.mock = MockClient()
+        self.client = LimitedClient(self.mock, state_file=os.path.join(self.tmpdir.name, "state.json"),
+                                    config_file=config_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_per_turn_cost_stays_flat(self):
+        pinned = [text_content("user", "Judged text " * 50), text_content("model", "Verdict")]
+        chat = self.client.chats.create(model="gemini-2.5-flash", history=ChatHistory(pinned, budget_tokens=2000))
+        prompt_tokens = []
+        with patch.object(self.mock.models, "count_tokens") as count_tokens:
+            for i in range(30):
+                response = chat.send_message(f"Follow-up question {i}?")
+                prompt_tokens.append(response.usage_metadata.prompt_token_count)
+        # No count_tokens round trip per turn, and the context stops growing at the budget
+        count_tokens.assert_not_called()
+        self.assertLessEqual(max(prompt_tokens), 2000)
+        self.assertLess(prompt_tokens[-1] - prompt_tokens[15], 200)
+
+    def test_unmanaged_chat_counts_only_new_message(self):
+        chat = self.client.chats.create(model="gemini-2.5-flash")
+        with patch.object(self.mock.models, "count_tokens", wraps=self.mock.models.count_tokens) as count_tokens:
+            chat.send_message("First question")
+            chat.send_message("Second question")
+        self.assertEqual(count_tokens.call_args_list[1].kwargs["contents"], "Second question")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from src.client_pool import ClientPool
+
+class TestClientPool(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+
+        def factory(api_key):
+            client = MagicMock(name=f"client-{api_key}")
+            self.created.append(client)
+            return client
+        self.pool = ClientPool(factory, idle_timeout=60)
+
+    def test_sessions_share_client_per_key(self):
+        a = self.pool.get("key-1", "session-a")
+        b = self.pool.get("key-1", "session-b")
+        c = self.pool.get("key-2", "session-c")
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+        self.assertEqual(len(self.created), 2)
+
+    def test_last_checkout_closes_client(self):
+        client = self.pool.get("key-1", "session-a")
+        self.pool.get("key-1", "session-b")
+        self.pool.checkout("key-1", "session-a")
+        client.close.assert_not_called()
+        self.pool.checkout("key-1", "session-b")
+        client.close.assert_called_once()
+        self.assertEqual(len(self.pool), 0)
+        self.assertIsNot(self.pool.get("key-1", "session-a"), client)
+
+    @patch("time.monotonic")
+    def test_idle_clients_are_evicted(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        idle = self.pool.get("key-1", "session-a")
+        mock_monotonic.return_value = 30.0
+        active = self.pool.get("key-2", "session-b")
+        mock_monotonic.return_value = 75.0
+        self.pool.get("key-2", "session-b")
+        idle.close.assert_called_once()
+        active.close.assert_not_called()
+        self.assertEqual(len(self.pool), 1)
+
+    @patch("time.monotonic")
+    def test_clients_in_use_are_not_evicted(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        busy = self.pool.get("key-1", "session-a")
+        # A long batch keeps calling through its client without going back to get()
+        for now in (40.0, 80.0, 120.0):
+            mock_monotonic.return_value = now
+            busy.models.generate_content(model="m", contents="item")
+            self.pool.get("key-2", "session-b")
+        self.created[0].close.assert_not_called()
+        self.assertEqual(len(self.created), 2)
+
+    @patch("time.monotonic")
+    def test_returning_session_keeps_its_client(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        client = self.pool.get("key-1", "session-a")
+        mock_monotonic.return_value = 75.0
+        self.assertIs(self.pool.get("key-1", "session-a"), client)
+        self.created[0].close.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import hashlib
+import io
+import os
+import tempfile
+from unittest.mock import patch
+import numpy as np
+from src.cpu_pool import CpuPool, file_path
+from src.dedup import simhash
+from src.parser import extract_json, sanitize_evaluation
+from src.video_fingerprint import cv2
+
+RAW = '```json\n{"origin_analysis": {"prediction": "AI-Generated", "confidence_score": 0.8}}\n```'
+
+def _video(path):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 15, (160, 120))
+    rng = np.random.default_rng(0)
+    for t in range(30):
+        frame = rng.integers(0, 256, size=(120, 160), dtype=np.uint8) if t % 10 == 0 else frame
+        writer.write(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    writer.release()
+
+class TestCpuPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = CpuPool(max_workers=2)
+        cls.inline = CpuPool(max_workers=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_parse_and_simhash_run_inline(self):
+        with patch.object(self.pool, "_run") as run:
+            self.assertEqual(self.pool.parse(RAW), sanitize_evaluation(extract_json(RAW)))
+            self.assertEqual(self.pool.simhash("some text to hash"), simhash("some text to hash"))
+        run.assert_not_called()
+
+    def test_video_digest_without_fingerprint_is_hashed_inline(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        video = io.BytesIO(data)
+        video.seek(5)
+        with patch.object(self.pool, "_run") as run:
+            digest, fingerprint = self.pool.video_digest(video, fingerprint=False)
+        run.assert_not_called()
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        self.assertIsNone(fingerprint)
+        self.assertEqual(video.tell(), 5)
+        self.assertEqual(self.inline.video_digest(video, fingerprint=False), (digest, None))
+
+    def test_file_path_only_for_files_on_disk(self):
+        with tempfile.NamedTemporaryFile() as f:
+            self.assertEqual(file_path(f), f.name)
+        video = io.BytesIO(b"payload")
+        video.name = "clip.mp4"
+        self.assertIsNone(file_path(video))
+
+    @unittest.skipIf(cv2 is None, "OpenCV not installed")
+    def test_video_fingerprint_matches_inline(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "clip.mp4")
+            _video(path)
+            with open(path, "rb") as f:
+                f.seek(3)
+                pooled = self.pool.video_digest(f)
+                inline = self.inline.video_digest(f)
+                self.assertEqual(f.tell(), 3)
+                f.seek(0)
+                upload = io.BytesIO(f.read())
+            # An in-memory upload goes to the worker through a temporary file
+            from_memory = self.pool.video_digest(upload)
+        self.assertEqual(pooled[0], inline[0])
+        self.assertEqual(from_memory[0], inline[0])
+        np.testing.assert_array_equal(pooled[1], inline[1])
+        np.testing.assert_array_equal(from_memory[1], inline[1])
+
+if __name__ == '__main__':
+    unittest.main()
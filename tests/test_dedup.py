@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.dedup import NearDuplicateIndex, simhash, popcount
+import numpy as np
+
+ORIGINAL = ("Breaking: the city council approved a new budget tonight that raises "
+            "transit funding by twelve percent and cuts road spending.")
+EDITED = ("BREAKING - the city council approved a new budget tonight which raises "
+          "transit funding by twelve percent and cuts road spending!")
+UNRELATED = "A quiet weekend spent baking sourdough bread at home with an old starter from my aunt."
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "index")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_simhash_is_stable_and_edit_tolerant(self):
+        self.assertEqual(simhash(ORIGINAL), simhash(ORIGINAL))
+        self.assertLessEqual(bin(simhash(ORIGINAL) ^ simhash(EDITED)).count("1"), 7)
+        self.assertGreater(bin(simhash(ORIGINAL) ^ simhash(UNRELATED)).count("1"), 7)
+
+    def test_popcount(self):
+        values = np.array([0, 1, 0xFF, 2**64 - 1], dtype=np.uint64)
+        self.assertEqual(popcount(values).tolist(), [0, 1, 8, 64])
+
+    def test_lookup_near_duplicate(self):
+        index = NearDuplicateIndex(self.path)
+        index.add(ORIGINAL, {"raw_text": "stored"})
+
+        verdict, similarity = index.lookup(EDITED)
+        self.assertEqual(verdict, {"raw_text": "stored"})
+        self.assertGreater(similarity, 0.88)
+        self.assertIsNone(index.lookup(UNRELATED))
+
+    def test_lazy_load_from_disk(self):
+        NearDuplicateIndex(self.path).add(ORIGINAL, {"raw_text": "stored"})
+
+        reopened = NearDuplicateIndex(self.path)
+        self.assertFalse(reopened._loaded)
+        self.assertEqual(reopened.lookup(ORIGINAL), ({"raw_text": "stored"}, 1.0))
+        self.assertEqual(len(reopened), 1)
+
+    def test_band_probes_find_every_match_within_distance(self):
+        rng = np.random.default_rng(1)
+        stored = [int(h) for h in rng.integers(0, 2**63, size=200, dtype=np.int64)]
+        index = NearDuplicateIndex(self.path, max_distance=7)
+        index.add_many([(h, {"id": i}) for i, h in enumerate(stored)])
+        index._merge_pending()
+
+        for i, h in enumerate(stored):
+            bits = rng.choice(64, size=7, replace=False)
+            probe = h ^ sum(1 << int(b) for b in bits)
+            verdict, distance = index.lookup_hash(probe)
+            self.assertEqual(verdict, {"id": i})
+            self.assertEqual(distance, 7)
+
+if __name__ == "__main__":
+    unittest.main()
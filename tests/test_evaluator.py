@@ -0,0 +1,108 @@
+import unittest
+import io
+import os
+import json
+import tempfile
+from unittest.mock import patch
+from src.evaluator import Evaluator, EvaluationError, truncate_text
+from src.mock_client import MockClient
+from src.results_store import ResultsStore
+from src.wrapper import LimitedClient
+
+class TestEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        with open(config_path, 'w') as f:
+            json.dump({"free": {"gemini-2.5-flash": {"rpm": 1000, "tpm": 10000000, "rpd": 10000}}}, f)
+        self.mock = MockClient()
+        self.client = LimitedClient(self.mock, state_file=os.path.join(self.tmpdir.name, "state.json"),
+                                    config_file=config_path)
+        self.store = ResultsStore(os.path.join(self.tmpdir.name, "results.db"))
+        self.indexes = {}
+
+        def index(prompt_hash):
+            from src.dedup import NearDuplicateIndex
+            return self.indexes.setdefault(prompt_hash, NearDuplicateIndex(os.path.join(self.tmpdir.name, prompt_hash)))
+
+        self.evaluator = Evaluator(self.client, self.store, near_duplicate_index=index, poll_interval=0)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_text_then_near_duplicate(self):
+        text = "I finally tried the ramen place on 5th and honestly it was overrated, we waited 45 minutes."
+        first = self.evaluator.evaluate_text(text, "gemini-2.5-flash")
+        self.assertEqual(first["source"], "judge")
+        self.assertEqual(first["structured"]["origin_analysis"]["prediction"], "Human-Generated")
+        self.assertGreater(first["metadata"].total_token_count, 0)
+
+        second = self.evaluator.evaluate_text(text + "!", "gemini-2.5-flash")
+        self.assertEqual(second["source"], "near-duplicate")
+        self.assertIsNone(second["metadata"])
+        self.store.flush(timeout=2)
+        self.assertEqual(self.store.count(), 2)
+
+    def test_video_upload_is_deleted_unless_kept(self):
+        video = io.BytesIO(b"not really a video")
+        video.name = "clip.mp4"
+        result = self.evaluator.evaluate_video(video, "gemini-2.5-flash", mime_type="video/mp4")
+        self.assertEqual(result["type"], "Video")
+        self.assertEqual(self.mock.files._files, {})
+
+        kept = self.evaluator.evaluate_video(video, "gemini-2.5-flash", mime_type="video/mp4", keep_upload=True)
+        self.assertIn(kept["uploaded_file"].name, self.mock.files._files)
+        self.assertTrue(self.evaluator.delete_upload(kept["uploaded_file"]))
+
+    def test_text_and_video_are_priced_locally(self):
+        video = io.BytesIO(b"not really a video")
+        video.name = "clip.mp4"
+        with patch.object(self.mock.models, "count_tokens") as count_tokens:
+            self.evaluator.evaluate_text("A short post about my weekend", "gemini-2.5-flash")
+            self.evaluator.evaluate_video(video, "gemini-2.5-flash", mime_type="video/mp4")
+        # The limiter is given the templates' precomputed counts instead of a round trip
+        count_tokens.assert_not_called()
+
+    def test_text_and_video_in_one_call(self):
+        video = io.BytesIO(b"not really a video")
+        video.name = "clip.mp4"
+        caption = "POV: you finally land the kickflip"
+        with patch.object(self.mock.models, "generate_content", wraps=self.mock.models.generate_content) as generate, \
+                patch.object(self.mock.models, "count_tokens") as count_tokens:
+            result = self.evaluator.evaluate_combined(caption, video, "gemini-2.5-flash", mime_type="video/mp4")
+        # One call carrying both parts, priced from the local estimate
+        generate.assert_called_once()
+        count_tokens.assert_not_called()
+        text_part, file_part = generate.call_args.kwargs["contents"]
+        self.assertIn(caption, text_part)
+        self.assertEqual(file_part.mime_type, "video/mp4")
+        self.assertEqual((result["type"], result["prompt"]), ("Text + Video", "judge-combined@v2"))
+        self.assertEqual(self.mock.files._files, {})
+        self.store.flush(timeout=2)
+        self.assertEqual(self.store.query()[0]["content_type"], "text+video")
+        # The same video with another caption is different content
+        other = self.evaluator.evaluate_combined("another caption", video, "gemini-2.5-flash", mime_type="video/mp4")
+        self.assertNotEqual(other["content_hash"], result["content_hash"])
+
+    def test_failed_processing_raises(self):
+        video = io.BytesIO(b"broken")
+        video.name = "broken.mp4"
+        original_get = self.mock.files.get
+
+        def failing_get(name):
+            uploaded = original_get(name)
+            uploaded.state.name = "FAILED"
+            return uploaded
+
+        self.mock.files.get = failing_get
+        with self.assertRaises(EvaluationError):
+            self.evaluator.evaluate_video(video, "gemini-2.5-flash", mime_type="video/mp4")
+        self.assertEqual(self.mock.files._files, {})
+
+    def test_truncate_text(self):
+        self.assertEqual(truncate_text("a b c", max_words=2), ("a b", True))
+        self.assertEqual(truncate_text("a b", max_words=2), ("a b", False))
+
+if __name__ == '__main__':
+    unittest.main()
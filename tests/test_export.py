@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pyarrow.dataset as ds
+from src.calibration import CalibrationEngine
+from src.export import export_results, summarize
+from src.mock_client import MockUsageMetadata
+from src.results_store import ResultsStore, build_record
+
+DAY = 86400
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.store = ResultsStore(os.path.join(self.workdir, "results.db"), flush_interval=0.05)
+        self.out = os.path.join(self.workdir, "exports")
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+    def _add(self, created_at, model, prediction, confidence, tokens=(100, 50), latency_ms=200.0):
+        structured = {"origin_analysis": {"prediction": prediction, "confidence_score": confidence}}
+        metadata = MockUsageMetadata(*tokens) if model else None
+        record = build_record(structured, metadata, model=model, content_type="text",
+                              content_hash=f"{created_at}", latency_ms=latency_ms, raw_text="{}")
+        record["created_at"] = created_at
+        self.store.add(record)
+
+    def _populate(self):
+        self._add(10 * DAY + 5, "gemini-2.5-flash", "AI-Generated", 0.95)
+        self._add(10 * DAY + 6, "gemini-2.5-flash", "Human-Generated", 0.15, latency_ms=400.0)
+        self._add(11 * DAY + 1, "gemini-2.5-flash-lite", "AI-Generated", 0.55, tokens=(10, 5))
+        self._add(11 * DAY + 2, None, "Human-Generated", 0.99)
+        self.store.flush(timeout=5)
+
+    def test_export_partitions_by_date_and_model(self):
+        self._populate()
+        self.assertEqual(export_results(self.store, self.out, batch_size=2), 4)
+
+        partitions = sorted(
+            os.path.relpath(root, self.out) for root, _, files in os.walk(self.out) if files
+        )
+        self.assertEqual(partitions, [
+            "date=1970-01-11/model=gemini-2.5-flash",
+            "date=1970-01-12/model=gemini-2.5-flash-lite",
+            "date=1970-01-12/model=none",
+        ])
+
+        table = ds.dataset(self.out, format="parquet", partitioning="hive").to_table()
+        self.assertEqual(table.num_rows, 4)
+        self.assertNotIn("raw_text", table.column_names)
+
+    def test_export_filters_and_raw_text(self):
+        self._populate()
+        self.assertEqual(export_results(self.store, self.out, include_raw_text=True, since=11 * DAY), 2)
+        table = ds.dataset(self.out, format="parquet", partitioning="hive").to_table()
+        self.assertEqual(table.column("raw_text").to_pylist(), ["{}", "{}"])
+
+    def test_reexport_replaces_partitions(self):
+        self._populate()
+        export_results(self.store, self.out)
+        export_results(self.store, self.out, batch_size=1, rows_per_group=1)
+        self._add(11 * DAY + 3, "gemini-2.5-flash-lite", "Hybrid", 0.6)
+        self.store.flush(timeout=5)
+        # Only the days since the last export are rewritten; earlier partitions are kept
+        self.assertEqual(export_results(self.store, self.out, since=11 * DAY), 3)
+
+        table = ds.dataset(self.out, format="parquet", partitioning="hive").to_table()
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(sorted(table.column("content_hash").to_pylist()),
+                         sorted(f"{t}" for t in (10 * DAY + 5, 10 * DAY + 6, 11 * DAY + 1, 11 * DAY + 2, 11 * DAY + 3)))
+
+    def test_filtered_export_keeps_the_rest_of_the_partition(self):
+        self._populate()
+        export_results(self.store, self.out)
+        self.assertEqual(export_results(self.store, self.out, prediction="Human-Generated"), 2)
+        # A mid-day since is rounded down, so day 11 is rewritten whole
+        self.assertEqual(export_results(self.store, self.out, since=11 * DAY + 2), 2)
+
+        table = ds.dataset(self.out, format="parquet", partitioning="hive").to_table()
+        hashes = sorted(table.column("content_hash").to_pylist())
+        # The filtered export adds its rows; none of the partition's other rows are lost
+        self.assertEqual(hashes, sorted(f"{t}" for t in (10 * DAY + 5, 10 * DAY + 6, 10 * DAY + 6, 11 * DAY + 1, 11 * DAY + 2)))
+
+    def test_export_calibrated_probability(self):
+        self._populate()
+        self.store.add_labels([(f"{10 * DAY + 5}", "AI-Generated"), (f"{10 * DAY + 6}", "Human-Generated")])
+        engine = CalibrationEngine(os.path.join(self.workdir, "calibration.json"), method="platt", min_labels=1)
+        self.assertEqual(engine.update(self.store), 2)
+        export_results(self.store, self.out, calibration=engine)
+        table = ds.dataset(self.out, format="parquet", partitioning="hive").to_table().sort_by("created_at")
+        calibrated = table.column("calibrated_ai_probability").to_pylist()
+        # Only gemini-2.5-flash has labels
+        self.assertGreater(calibrated[0], calibrated[1])
+        self.assertEqual(calibrated[2:], [None, None])
+
+    def test_summary_report(self):
+        self._populate()
+        export_results(self.store, self.out)
+        report = summarize(self.out, bins=10, batch_size=1)
+
+        self.assertEqual(report["rows"], 4)
+        self.assertEqual(report["predictions"], {"AI-Generated": 2, "Human-Generated": 2})
+        self.assertEqual(sum(report["confidence_histogram"]["counts"]), 4)
+        self.assertEqual(report["confidence_histogram"]["counts"][9], 2)
+
+        flash = report["models"]["gemini-2.5-flash"]
+        self.assertEqual(flash["count"], 2)
+        self.assertEqual(flash["prompt_tokens"], 200)
+        self.assertEqual(flash["candidates_tokens"], 100)
+        self.assertAlmostEqual(flash["avg_latency_ms"], 300.0)
+        self.assertEqual(report["models"]["none"]["total_tokens"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
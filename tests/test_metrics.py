@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+import urllib.request
+from src.metrics import METRICS, Histogram, _NOOP_SPAN
+from src.mock_client import MockClient
+from src.wrapper import LimitedClient
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.config_fd, self.config_path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(self.config_fd, 'w') as f:
+            json.dump({"free": {"gemini-2.5-flash": {"rpm": 100, "tpm": 1000000, "rpd": 1000}}}, f)
+        self.state_fd, self.state_path = tempfile.mkstemp(suffix=".json")
+        os.close(self.state_fd)
+        self.client = LimitedClient(MockClient(), state_file=self.state_path, config_file=self.config_path)
+
+    def tearDown(self):
+        METRICS.enable(False)
+        os.remove(self.config_path)
+        os.remove(self.state_path)
+        os.remove(self.state_path + ".wal")
+
+    def test_disabled_span_is_noop(self):
+        METRICS.enable(False)
+        self.assertIs(METRICS.span("generate_content", model="m"), _NOOP_SPAN)
+
+    def test_histogram_rendering(self):
+        h = Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1))
+        h.observe(0.05, stage="a")
+        h.observe(0.5, stage="a")
+        h.observe(5, stage="a")
+        lines = h.render()
+        self.assertIn('test_seconds_bucket{stage="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{stage="a"} 3', lines)
+
+    def test_wrapper_stages_recorded(self):
+        METRICS.enable()
+        before = METRICS.stage_seconds.snapshot(stage="generate_content", model="gemini-2.5-flash", outcome="ok")[2]
+        waits = METRICS.limiter_wait_seconds.snapshot(model="gemini-2.5-flash")[2]
+
+        self.client.models.generate_content(model="gemini-2.5-flash", contents="Hello")
+
+        after = METRICS.stage_seconds.snapshot(stage="generate_content", model="gemini-2.5-flash", outcome="ok")[2]
+        self.assertEqual(after, before + 1)
+        self.assertEqual(METRICS.limiter_wait_seconds.snapshot(model="gemini-2.5-flash")[2], waits + 1)
+        self.assertGreater(METRICS.stage_seconds.snapshot(stage="limiter_update", model="gemini-2.5-flash", outcome="ok")[2], 0)
+        self.assertIn('llm_judge_tokens_total{model="gemini-2.5-flash",kind="candidates"}', METRICS.render())
+
+    def test_http_endpoint(self):
+        METRICS.enable()
+        server = METRICS.start_http_server(port=0, addr="127.0.0.1")
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            body = urllib.request.urlopen(url, timeout=5).read().decode()
+            self.assertIn("# TYPE llm_judge_stage_seconds histogram", body)
+        finally:
+            server.shutdown()
+
+    def test_textfile_export(self):
+        fd, path = tempfile.mkstemp(suffix=".prom")
+        os.close(fd)
+        try:
+            METRICS.write_textfile(path)
+            with open(path) as f:
+                self.assertIn("llm_judge_limiter_wait_seconds", f.read())
+        finally:
+            os.remove(path)
+
+if __name__ == "__main__":
+    unittest.main()
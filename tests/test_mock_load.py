@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+from src.mock_client import MockAPIError, MockClient, constant_latency, lognormal_latency
+
+class TestMockLoadBehavior(unittest.TestCase):
+    def test_defaults_are_instant_and_error_free(self):
+        client = MockClient()
+        response = client.models.generate_content(model="m", contents="Hello")
+        self.assertEqual(response.latency_seconds, 0.0)
+        self.assertEqual(client.server.stats["succeeded"], 1)
+
+    @patch("time.sleep")
+    def test_latency_is_sampled_and_slept(self, mock_sleep):
+        client = MockClient(latency=constant_latency(0.25))
+        response = client.models.generate_content(model="m", contents="Hello")
+        mock_sleep.assert_called_once_with(0.25)
+        self.assertEqual(response.latency_seconds, 0.25)
+
+    def test_seeded_runs_are_reproducible(self):
+        def samples(seed):
+            client = MockClient(latency=lognormal_latency(0.5, 0.4), seed=seed)
+            with patch("time.sleep"):
+                return [client.models.generate_content(model="m", contents="x").latency_seconds for _ in range(5)]
+        self.assertEqual(samples(7), samples(7))
+        self.assertNotEqual(samples(7), samples(8))
+
+    def test_fault_injection(self):
+        client = MockClient(rate_limit_rate=1.0)
+        with self.assertRaises(MockAPIError) as cm:
+            client.models.generate_content(model="m", contents="Hello")
+        self.assertEqual(cm.exception.code, 429)
+        retry_info = cm.exception.details["error"]["details"][0]
+        self.assertTrue(retry_info["retryDelay"].endswith("s"))
+
+        client = MockClient(error_rate=1.0)
+        with self.assertRaises(MockAPIError) as cm:
+            client.chats.create(model="m").send_message("Hi")
+        self.assertEqual(cm.exception.code, 503)
+        self.assertEqual(client.server.stats["errors"], 1)
+
+    def test_padding_grows_response(self):
+        small = MockClient().models.generate_content(model="m", contents="x")
+        large = MockClient(padding_tokens=500).models.generate_content(model="m", contents="x")
+        growth = large.usage_metadata.candidates_token_count - small.usage_metadata.candidates_token_count
+        self.assertAlmostEqual(growth, 500, delta=10)
+
+    @patch("time.time")
+    def test_server_side_quota(self, mock_time):
+        mock_time.return_value = 1000.0
+        client = MockClient(quota={"m": {"rpm": 2, "tpm": 10000, "rpd": 100}})
+        client.models.generate_content(model="m", contents="a")
+        client.models.generate_content(model="m", contents="b")
+        with self.assertRaises(MockAPIError) as cm:
+            client.models.generate_content(model="m", contents="c")
+        self.assertEqual(cm.exception.code, 429)
+        self.assertEqual(cm.exception.details["error"]["details"][0]["retryDelay"], "60s")
+
+        # Other models are not limited, and the window slides
+        client.models.generate_content(model="other", contents="d")
+        mock_time.return_value = 1061.0
+        client.models.generate_content(model="m", contents="e")
+        self.assertEqual(client.server.stats["rate_limited"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
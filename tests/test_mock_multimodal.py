@@ -1,6 +1,7 @@
 import unittest
 from google.genai.types import GenerateContentConfig
 from src.mock_client import MockClient
+from src.tokens import estimate_tokens
 
 class TestMockClientMultimodal(unittest.TestCase):
     def setUp(self):
@@ -21,6 +22,13 @@ class TestMockClientMultimodal(unittest.TestCase):
         res = self.client.models.count_tokens(model="mock", contents=video)
         self.assertEqual(res.total_tokens, 280)
 
+    def test_video_tokens_from_reported_duration(self):
+        video = self.client.files.upload(file="test.mp4")
+        video.video_metadata = {"videoDuration": "12.5s"}
+        # 290 tokens per second of video and audio
+        self.assertEqual(estimate_tokens(video), 3626)
+        self.assertEqual(estimate_tokens(["Caption", video]), 3626 + 2)
+
     def test_mixed_content_estimation(self):
         image = self.client.files.upload(file="test.png")
         prompt = "Describe this image" # 19 chars -> 4 + 1 = 5 tokens
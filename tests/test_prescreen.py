@@ -0,0 +1,69 @@
+import json
+import os
+import unittest
+from src.parser import sanitize_evaluation
+from src.prescreen import FEATURE_BIAS, FEATURE_WEIGHTS, extract_features, fit_weights, prescreen_text
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "data", "prescreen_sample.jsonl")
+
+class TestPrescreen(unittest.TestCase):
+    def setUp(self):
+        with open(SAMPLE_PATH, 'r') as f:
+            self.samples = [json.loads(line) for line in f if line.strip()]
+
+    def test_short_text_escalates(self):
+        result = prescreen_text("Too short to judge.")
+        self.assertTrue(result.escalate)
+        self.assertIsNone(result.score)
+        self.assertIsNone(result.origin_analysis)
+
+    def test_empty_text_has_no_features(self):
+        self.assertIsNone(extract_features(""))
+        self.assertTrue(prescreen_text("").escalate)
+
+    def test_trigram_repetition(self):
+        features = extract_features("the cat sat. the cat sat. the cat sat.")
+        # 7 trigrams, 3 distinct
+        self.assertAlmostEqual(features["trigram_repetition"], 1 - 3 / 7)
+
+    def test_sentence_length_variance(self):
+        uniform = extract_features("One two three. Four five six. Seven eight nine.")
+        bursty = extract_features("One. Two three four five six seven eight nine ten. Eleven.")
+        self.assertEqual(uniform["sentence_length_cv"], 0.0)
+        self.assertGreater(bursty["sentence_length_cv"], 0.5)
+
+    def test_confident_sample_verdicts(self):
+        ai_text = next(s["text"] for s in self.samples if s["label"] == "AI-Generated")
+        human_text = next(s["text"] for s in self.samples if s["label"] == "Human-Generated")
+
+        ai = prescreen_text(ai_text)
+        human = prescreen_text(human_text)
+        self.assertFalse(ai.escalate)
+        self.assertEqual(ai.origin_analysis["prediction"], "AI-Generated")
+        self.assertFalse(human.escalate)
+        self.assertEqual(human.origin_analysis["prediction"], "Human-Generated")
+
+    def test_shipped_weights_are_fitted_on_the_sample(self):
+        weights, bias = fit_weights([extract_features(s["text"]) for s in self.samples],
+                                    [s["label"] == "AI-Generated" for s in self.samples])
+        for name, (weight, centre) in FEATURE_WEIGHTS.items():
+            self.assertAlmostEqual(weights[name][0], weight, delta=abs(weight) * 1e-3)
+            self.assertAlmostEqual(weights[name][1], centre, delta=abs(centre) * 1e-3)
+        self.assertAlmostEqual(bias, FEATURE_BIAS, places=3)
+
+    def test_uncertain_band_escalates(self):
+        # Widening the band to cover every score forces escalation
+        result = prescreen_text(self.samples[0]["text"], lower=0.0, upper=1.0)
+        self.assertTrue(result.escalate)
+
+    def test_output_matches_sanitized_schema(self):
+        result = prescreen_text(self.samples[0]["text"])
+        sanitized = sanitize_evaluation(result.to_evaluation())
+        origin = sanitized["origin_analysis"]
+        self.assertIsInstance(origin["confidence_score"], float)
+        self.assertIsInstance(origin["text_artifacts"], list)
+        self.assertEqual(origin["video_artifacts"], [])
+        self.assertEqual(sanitized["social_performance"]["virality_score"], "[Missing]")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import json
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+import numpy as np
+from src.clock import VirtualClock
+from src.metrics import METRICS
+from src.mock_client import MockClient
+from src.wrapper import LimitedClient
+
+class _Stopped(Exception):
+    pass
+
+class TestPriorityLanes(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        self.state_path = os.path.join(self.tmpdir.name, "rate_limit_state.json")
+        with open(self.config_path, 'w') as f:
+            json.dump({"free": {"gemini-2.5-flash": {"rpm": 100, "tpm": 10000000, "rpd": 100000}}}, f)
+        self.mock = MockClient()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_client(self, priority, clock=None):
+        return LimitedClient(self.mock, state_file=self.state_path, config_file=self.config_path, priority=priority,
+                             clock=clock)
+
+    def test_saturated_batch_lane_leaves_headroom_to_interactive(self):
+        clock = VirtualClock(1000.0)
+        batch = self.make_client("batch", clock)
+        interactive = self.make_client("interactive", clock)
+        with patch("builtins.print"):
+            # Batch fills its lane: 80% of the RPM, then it is refused
+            admitted = 0
+            while batch._limiter.try_admit("gemini-2.5-flash", 10)[0] is None:
+                admitted += 1
+                self.assertLessEqual(admitted, 100)
+            self.assertEqual(admitted, 80)
+
+            # Interactive requests still get the remaining 20% without waiting
+            for _ in range(20):
+                interactive.models.generate_content(model="gemini-2.5-flash", contents="user request")
+            self.assertEqual(clock.time(), 1000.0)
+            self.assertEqual(self.mock.server.stats["succeeded"], 20)
+
+            # The full RPM is used; neither lane is admitted until the window moves
+            self.assertIsNotNone(batch._limiter.try_admit("gemini-2.5-flash", 10)[0])
+            self.assertIsNotNone(interactive._limiter.try_admit("gemini-2.5-flash", 10)[0])
+
+    def test_admission_wait_is_measured_on_the_limiter_clock(self):
+        clock = VirtualClock(1000.0)
+        batch = self.make_client("batch", clock)
+        with patch("builtins.print"), patch.object(METRICS, "observe_admission_wait") as observe:
+            for _ in range(81):
+                batch.models.generate_content(model="gemini-2.5-flash", contents="bulk item")
+        # The 81st request waited a virtual minute for the batch lane to free up
+        self.assertGreater(observe.call_args_list[-1].args[2], 59)
+        self.assertEqual(observe.call_args_list[0].args[2], 0)
+
+    def test_interactive_wait_bounded_under_saturating_batch(self):
+        stop = threading.Event()
+        real_sleep = time.sleep
+
+        def sleep(seconds):
+            # Limiter waits poll quickly and end the batch workers once the test is done
+            if stop.is_set():
+                raise _Stopped()
+            real_sleep(min(seconds, 0.01))
+
+        batch = self.make_client("batch")
+        interactive = self.make_client("interactive")
+
+        def batch_worker():
+            try:
+                while True:
+                    batch.models.generate_content(model="gemini-2.5-flash", contents="bulk item")
+            except _Stopped:
+                pass
+
+        with patch("time.sleep", side_effect=sleep):
+            workers = [threading.Thread(target=batch_worker) for _ in range(4)]
+            for w in workers:
+                w.start()
+            try:
+                # Batch saturates its share (80% of RPM) and then queues in the limiter
+                deadline = time.perf_counter() + 10
+                while self.mock.server.stats["succeeded"] < 80 and time.perf_counter() < deadline:
+                    real_sleep(0.01)
+                self.assertEqual(self.mock.server.stats["succeeded"], 80)
+
+                waits = []
+                # The whole 20% headroom: batch taking any of it would leave an interactive request waiting
+                for _ in range(20):
+                    start = time.perf_counter()
+                    interactive.models.generate_content(model="gemini-2.5-flash", contents="user request")
+                    waits.append(time.perf_counter() - start)
+            finally:
+                stop.set()
+                for w in workers:
+                    w.join(timeout=5)
+
+        self.assertLess(np.percentile(waits, 99), 0.5)
+        # Batch never dipped into the interactive headroom
+        self.assertEqual(self.mock.server.stats["succeeded"], 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from src.prompts import PROMPTS, PromptRegistry, PromptTemplate, get_prompt, system_prompt
+from src.tokens import estimate_tokens
+
+class TestPromptRegistry(unittest.TestCase):
+    def test_modality_prompts_omit_other_modality(self):
+        text, video = get_prompt("text"), get_prompt("video")
+        self.assertNotIn("*Video:*", text.system)
+        self.assertNotIn("*Text:*", video.system)
+        self.assertLess(text.system_tokens, get_prompt("combined").system_tokens)
+        self.assertLess(video.system_tokens, get_prompt("combined").system_tokens)
+        # Mixed content keeps the original prompt
+        self.assertEqual(get_prompt("combined", 1).system, system_prompt)
+
+    def test_render_and_token_estimate(self):
+        text = get_prompt("text")
+        rendered = text.render("Some {braces} in content")
+        self.assertTrue(rendered.endswith("\n\nSome {braces} in content"))
+        self.assertEqual(text.estimate_tokens("abcd" * 100), text.tokens + estimate_tokens("abcd" * 100))
+        self.assertEqual(get_prompt("video").render("ignored"), get_prompt("video").user)
+
+    def test_versions_and_hashes(self):
+        registry = PromptRegistry()
+        v1 = registry.register(PromptTemplate("judge-text", 1, "system", "user {content}"))
+        v2 = registry.register(PromptTemplate("judge-text", 2, "system, revised", "user {content}"))
+        self.assertIs(registry.get("judge-text"), v2)
+        self.assertIs(registry.get("judge-text", 1), v1)
+        self.assertEqual(registry.versions("judge-text"), [1, 2])
+        self.assertNotEqual(v1.hash, v2.hash)
+        # Editing a registered version in place is refused
+        with self.assertRaises(ValueError):
+            registry.register(PromptTemplate("judge-text", 1, "system, edited", "user {content}"))
+        with self.assertRaises(KeyError):
+            registry.get("judge-text", 3)
+
+    def test_registered_hashes_are_unique(self):
+        hashes = [template.hash for template in PROMPTS]
+        self.assertEqual(len(hashes), len(set(hashes)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,14 @@
 import unittest
 import os
 import json
+import random
 import time
 import tempfile
+import threading
 from unittest.mock import patch
-from src.rate_limiter import RateLimiter
+from src.clock import VirtualClock
+from src.rate_limiter import WINDOW_KEY, RateLimiter, _apply_change, read_state
+from src.state_log import MemoryStateLog, StateLog
 
 class TestRateLimiter(unittest.TestCase):
     def setUp(self):
@@ -36,8 +40,9 @@ class TestRateLimiter(unittest.TestCase):
     def tearDown(self):
         if os.path.exists(self.config_path):
             os.remove(self.config_path)
-        if os.path.exists(self.state_path):
-            os.remove(self.state_path)
+        for path in (self.state_path, self.state_path + ".wal"):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_tier_switching(self):
         self.assertEqual(self.limiter.limits["test-model"]["rpm"], 2)
@@ -46,8 +51,7 @@ class TestRateLimiter(unittest.TestCase):
 
     def test_update_usage(self):
         self.limiter.update_usage("test-model", 10)
-        with open(self.state_path, 'r') as f:
-            state = json.load(f)
+        state = read_state(self.state_path)
         self.assertEqual(len(state["test-model"]), 1)
         self.assertEqual(state["test-model"][0]["tokens"], 10)
 
@@ -63,10 +67,8 @@ class TestRateLimiter(unittest.TestCase):
         self.limiter.update_usage("test-model", 1)
         
         # Next call should trigger sleep
-        # We need a side effect for mock_time to break the while True loop in wait_if_needed
-        # The first call to wait_if_needed will see 2 requests and sleep.
-        # We'll make the second check see a much later time.
-        mock_time.side_effect = [now, now, now + 61, now + 61]
+        # Sleeping moves the clock past the window, which ends the while True loop in wait_if_needed
+        mock_sleep.side_effect = lambda seconds: setattr(mock_time, "return_value", now + 61)
         
         self.limiter.wait_if_needed("test-model", 1)
         
@@ -83,7 +85,7 @@ class TestRateLimiter(unittest.TestCase):
         self.limiter.update_usage("test-model", 90)
         
         # Next request of 20 tokens should exceed 100
-        mock_time.side_effect = [now, now, now + 61, now + 61]
+        mock_sleep.side_effect = lambda seconds: setattr(mock_time, "return_value", now + 61)
         
         self.limiter.wait_if_needed("test-model", 20)
         
@@ -97,5 +99,134 @@ class TestRateLimiter(unittest.TestCase):
         
         self.assertIn("exceed model TPM limit", str(cm.exception))
 
+    @patch('time.time')
+    def test_adaptive_increase_when_saturated(self, mock_time):
+        mock_time.return_value = 1000.0
+        limiter = RateLimiter(state_file=self.state_path, config_file=self.config_path,
+                              tier="free", adaptive=True, key_id="k1")
+        for _ in range(20):
+            limiter.update_usage("test-model", 1)
+        # Grows past the free tier but stays under the highest configured tier
+        rpm = limiter.effective_limit("test-model")["rpm"]
+        self.assertGreater(rpm, 2)
+        self.assertLessEqual(rpm, 10)
+
+    @patch('time.time')
+    def test_adaptive_decrease_on_throttle(self, mock_time):
+        mock_time.return_value = 1000.0
+        limiter = RateLimiter(state_file=self.state_path, config_file=self.config_path,
+                              tier="tier1", adaptive=True, key_id="k1")
+        limiter.update_usage("test-model", 1)
+        limiter.record_throttle("test-model", 1)
+        limiter.record_throttle("test-model", 1)  # same burst, ignored
+        self.assertEqual(limiter.effective_limit("test-model")["rpm"], 5)
+
+        mock_time.return_value = 1010.0
+        limiter.record_throttle("test-model", 1)
+        self.assertEqual(limiter.effective_limit("test-model")["rpm"], 2)
+
+        # Learned limits persist per key
+        other = RateLimiter(state_file=self.state_path, config_file=self.config_path,
+                            tier="tier1", adaptive=True, key_id="k2")
+        self.assertEqual(other.effective_limit("test-model")["rpm"], 10)
+        again = RateLimiter(state_file=self.state_path, config_file=self.config_path,
+                            tier="tier1", adaptive=True, key_id="k1")
+        self.assertEqual(again.effective_limit("test-model")["rpm"], 2)
+
+    @patch('time.time')
+    def test_learned_limits_only_change_through_the_log(self, mock_time):
+        mock_time.return_value = 1000.0
+        limiter = RateLimiter(state_file=self.state_path, config_file=self.config_path,
+                              tier="tier1", adaptive=True, key_id="k3")
+        self.addCleanup(os.remove, limiter.state_file + ".wal")
+        # Far below the limit: nothing is learned, in memory or in the log
+        limiter.update_usage("test-model", 1)
+        self.assertNotIn("_learned", read_state(self.state_path, "k3"))
+
+        limiter.record_throttle("test-model", 1)
+        in_memory = read_state(self.state_path, "k3")
+        # Another process replaying the log from disk sees the same limits, kept per model
+        replayed = StateLog(limiter.state_file, _apply_change).read()
+        self.assertEqual(in_memory["_learned"], replayed["_learned"])
+        self.assertEqual(in_memory["_learned"]["test-model"]["rpm"], 5)
+
+    def test_state_is_partitioned_per_key(self):
+        limiter = RateLimiter(state_file=self.state_path, config_file=self.config_path, tier="free", key_id="k1")
+        self.addCleanup(os.remove, limiter.state_file)
+        self.addCleanup(os.remove, limiter.state_file + ".wal")
+        self.assertNotEqual(limiter.state_file, self.state_path)
+        limiter.update_usage("test-model", 10)
+        limiter.update_usage("test-model", 10)
+
+        # A heavy key does not consume another key's quota
+        with patch('time.sleep') as mock_sleep:
+            self.limiter.wait_if_needed("test-model", 10)
+        mock_sleep.assert_not_called()
+
+    def test_window_token_sum_matches_a_recount(self):
+        clock = VirtualClock(1000.0)
+        log = MemoryStateLog(_apply_change)
+        limiter = RateLimiter(config_file=self.config_path, tier="tier1", clock=clock, state_log=log)
+        rng = random.Random(0)
+        open_reservations = []
+        with patch("builtins.print"):
+            for _ in range(500):
+                clock.sleep(rng.uniform(0, 10))
+                wait, reservation = limiter.try_admit("test-model", rng.randint(1, 100))
+                if reservation:
+                    open_reservations.append(reservation)
+                if open_reservations and rng.random() < 0.6:
+                    done = open_reservations.pop(rng.randrange(len(open_reservations)))
+                    if rng.random() < 0.8:
+                        limiter.update_usage("test-model", rng.randint(1, 150), done)
+                    else:
+                        limiter.release("test-model", done)
+                # The running sum, as of the last TPM check, equals a recount of its window
+                state = log.state
+                cutoff, tokens = state[WINDOW_KEY]["test-model"]
+                self.assertEqual(tokens, sum(e["tokens"] for e in state["test-model"] if e["timestamp"] > cutoff))
+
+    def test_light_flow_keeps_its_share_under_saturation(self):
+        # Two sessions share one key: "heavy" keeps 8 requests in flight, "light" one at a time
+        clock = VirtualClock()
+        virtual_sleep = clock.sleep
+
+        def sleep(seconds):
+            # Sleepers really leave the turn for a moment, so they come back in a race
+            time.sleep(0.001)
+            virtual_sleep(seconds)
+
+        clock.sleep = sleep
+        log = MemoryStateLog(_apply_change)
+        limiters = {flow: RateLimiter(state_file=self.state_path, config_file=self.config_path, tier="tier1",
+                                      key_id="fair-share-test", flow_id=flow, clock=clock, state_log=log)
+                    for flow in ("heavy", "light")}
+        admitted = []
+        lock = threading.Lock()
+        start = threading.Barrier(9)
+
+        def worker(flow):
+            limiter = limiters[flow]
+            start.wait()
+            while True:
+                reservation = limiter.wait_if_needed("test-model", 1)
+                with lock:
+                    if len(admitted) >= 60:
+                        limiter.release("test-model", reservation)
+                        return
+                    admitted.append(flow)
+                limiter.update_usage("test-model", 1, reservation)
+
+        with patch("builtins.print"):
+            threads = [threading.Thread(target=worker, args=("heavy",)) for _ in range(8)]
+            threads.append(threading.Thread(target=worker, args=("light",)))
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(timeout=30)
+        self.assertEqual(len(admitted), 60)
+        # Six saturated minutes of RPM 10: the light flow gets about half, not one turn in nine
+        self.assertGreaterEqual(admitted.count("light"), 27)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,146 @@
+import io
+import os
+import sqlite3
+import shutil
+import tempfile
+import unittest
+from src.parser import sanitize_evaluation
+from src.mock_client import MockUsageMetadata
+from src.results_store import ResultsStore, build_record, content_hash
+
+def _structured(prediction, confidence, virality=5):
+    return sanitize_evaluation({
+        "origin_analysis": {"prediction": prediction, "confidence_score": confidence},
+        "social_performance": {"virality_score": virality}
+    })
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.store = ResultsStore(os.path.join(self.workdir, "results.db"), flush_interval=0.05)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.workdir)
+
+    def _add(self, prediction, confidence, model="gemini-2.5-flash", tokens=(100, 20), created_at=None):
+        record = build_record(
+            _structured(prediction, confidence),
+            MockUsageMetadata(*tokens),
+            model=model,
+            content_type="text",
+            content_hash=content_hash(f"{prediction}-{confidence}"),
+            latency_ms=150.0
+        )
+        if created_at is not None:
+            record["created_at"] = created_at
+        self.store.add(record)
+
+    def test_content_hash_restores_file_position(self):
+        f = io.BytesIO(b"video bytes")
+        f.read(3)
+        self.assertEqual(content_hash(f), content_hash(b"video bytes"))
+        self.assertEqual(f.tell(), 3)
+        self.assertEqual(content_hash("abc"), content_hash(b"abc"))
+
+    def test_build_record_drops_missing_and_coerced_fields(self):
+        structured = sanitize_evaluation({"origin_analysis": {"confidence_score": "High"}})
+        record = build_record(structured, None, model=None, content_type="text", content_hash="h", latency_ms=1.0)
+        self.assertIsNone(record["prediction"])
+        self.assertIsNone(record["confidence"])
+        self.assertIsNone(record["virality"])
+        self.assertIsNone(record["total_tokens"])
+
+    def test_writes_are_batched_until_flush(self):
+        self._add("AI-Generated", 0.9)
+        self.assertTrue(self.store.flush(timeout=5))
+        rows = self.store.query()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["prediction"], "AI-Generated")
+        self.assertEqual(rows[0]["total_tokens"], 120)
+        self.assertEqual(rows[0]["source"], "judge")
+
+    def test_filtered_query(self):
+        self._add("AI-Generated", 0.95, created_at=100)
+        self._add("AI-Generated", 0.55, created_at=200)
+        self._add("Human-Generated", 0.9, model="gemini-2.5-flash-lite", created_at=300)
+        self.store.flush(timeout=5)
+
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual(self.store.count(prediction="AI-Generated"), 2)
+        rows = self.store.query(prediction="AI-Generated", min_confidence=0.9)
+        self.assertEqual([r["confidence"] for r in rows], [0.95])
+        self.assertEqual(len(self.store.query(since=150, until=300)), 1)
+        self.assertEqual(self.store.query(limit=1)[0]["created_at"], 300)
+        self.assertEqual(self.store.latest_for_hash(content_hash("AI-Generated-0.55"))["created_at"], 200)
+
+    def test_aggregate(self):
+        self._add("AI-Generated", 0.8)
+        self._add("Human-Generated", 0.6)
+        self._add("AI-Generated", 0.7, model="gemini-2.5-flash-lite", tokens=(10, 5))
+        self.store.flush(timeout=5)
+
+        by_model = {row["model"]: row for row in self.store.aggregate(group_by="model")}
+        self.assertEqual(by_model["gemini-2.5-flash"]["count"], 2)
+        self.assertAlmostEqual(by_model["gemini-2.5-flash"]["avg_confidence"], 0.7)
+        self.assertEqual(by_model["gemini-2.5-flash"]["total_tokens"], 240)
+        self.assertEqual(by_model["gemini-2.5-flash-lite"]["prompt_tokens"], 10)
+
+        by_prediction = {row["prediction"]: row["count"] for row in self.store.aggregate(group_by="prediction")}
+        self.assertEqual(by_prediction, {"AI-Generated": 2, "Human-Generated": 1})
+
+        with self.assertRaises(ValueError):
+            self.store.aggregate(group_by="raw_text; DROP TABLE evaluations")
+
+    def test_adds_prompt_column_to_older_databases(self):
+        path = os.path.join(self.workdir, "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE evaluations (id INTEGER PRIMARY KEY, created_at REAL NOT NULL, content_hash TEXT, "
+                     "content_type TEXT, source TEXT, model TEXT, prediction TEXT, confidence REAL, virality REAL, "
+                     "prompt_tokens INTEGER, candidates_tokens INTEGER, total_tokens INTEGER, latency_ms REAL, raw_text TEXT)")
+        conn.close()
+        store = ResultsStore(path, flush_interval=0.05)
+        try:
+            record = build_record(_structured("AI-Generated", 0.9), None, model="m", content_type="text",
+                                  content_hash="h", latency_ms=1.0, prompt="judge-text@v1")
+            store.add(record)
+            store.flush(timeout=5)
+            self.assertEqual(store.query()[0]["prompt"], "judge-text@v1")
+            self.assertEqual(store.add_labels([("h", "Hybrid"), ("h", "AI-Generated")]), 1)
+            [rows] = list(store.iter_labeled())
+            self.assertEqual(rows[0][2:], ("m", "judge-text@v1", "AI-Generated", 0.9, "Hybrid"))
+        finally:
+            store.close()
+
+    def test_labels_committed_while_reading_are_not_skipped(self):
+        for prediction in ("Human-Generated", "Hybrid", "AI-Generated", "Uncertain"):
+            self._add(prediction, 0.5)
+        self.store.flush(timeout=5)
+        hashes = [row["content_hash"] for row in sorted(self.store.query(), key=lambda row: row["id"])]
+        self.store.add_labels([(hashes[2], "AI-Generated"), (hashes[3], "Hybrid")])
+
+        seen = []
+        # Evaluation 1 was read before; evaluations 2-4 are new
+        batches = self.store.iter_labeled(after_evaluation=1, batch_size=1)
+        seen.extend(next(batches))
+        # Labels for the unread evaluation 2 and the already read evaluation 1 land mid-read
+        self.store.add_labels([(hashes[1], "Hybrid"), (hashes[0], "Human-Generated")])
+        for rows in batches:
+            seen.extend(rows)
+        evaluation_mark = max([1] + [row[0] for row in seen])
+        label_mark = max([0] + [row[1] for row in seen])
+        for rows in self.store.iter_labeled(evaluation_mark, label_mark):
+            seen.extend(rows)
+        self.assertEqual(sorted(row[0] for row in seen), [1, 2, 3, 4])
+
+    def test_persists_across_instances(self):
+        self._add("Hybrid", 0.5)
+        self.store.flush(timeout=5)
+        reopened = ResultsStore(self.store.path)
+        try:
+            self.assertEqual(reopened.count(prediction="Hybrid"), 1)
+        finally:
+            reopened.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+import os
+import json
+import tempfile
+from unittest.mock import patch
+from src.clock import VirtualClock
+from src.mock_client import MockAPIError, MockClient
+from src.rate_limiter import read_state
+from src.retry import CircuitBreaker, CircuitOpenError, RetryPolicy, retry_after
+from src.wrapper import LimitedClient
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_full_jitter_is_bounded(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=8.0, seed=0)
+        for attempt in range(6):
+            delay = policy.delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(8.0, 2 ** attempt))
+
+    def test_retry_after_hint_is_a_lower_bound(self):
+        policy = RetryPolicy(max_delay=1.0, seed=0)
+        self.assertGreaterEqual(policy.delay(0, hint=20), 20)
+
+    def test_parses_retry_info(self):
+        error = MockAPIError(429, "RESOURCE_EXHAUSTED", "quota", {
+            "error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "17s"}]}
+        })
+        self.assertEqual(retry_after(error), 17.0)
+        self.assertIsNone(retry_after(MockAPIError(503, "UNAVAILABLE", "busy")))
+
+    def test_only_transient_codes_are_retryable(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.is_retryable(MockAPIError(503, "UNAVAILABLE", "busy")))
+        self.assertFalse(policy.is_retryable(MockAPIError(400, "INVALID_ARGUMENT", "bad")))
+        self.assertFalse(policy.is_retryable(ValueError("not an API error")))
+
+class TestCircuitBreaker(unittest.TestCase):
+    @patch("time.monotonic")
+    def test_opens_then_half_opens(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        mock_monotonic.return_value = 131.0
+        self.assertTrue(breaker.allow())   # single trial call
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+class TestWrapperRetries(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        self.state_path = os.path.join(self.tmpdir.name, "rate_limit_state.json")
+        limit = {"rpm": 100, "tpm": 1000000, "rpd": 1000}
+        with open(self.config_path, 'w') as f:
+            json.dump({"free": {"model-a": limit, "model-b": limit}}, f)
+        self.mock = MockClient()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_client(self, **kwargs):
+        return LimitedClient(self.mock, state_file=self.state_path, config_file=self.config_path, **kwargs)
+
+    @patch("time.sleep")
+    def test_transient_errors_are_retried(self, mock_sleep):
+        client = self.make_client(retry_policy=RetryPolicy(seed=0))
+        self.mock.server.inject(503, 500)
+        response = client.models.generate_content(model="model-a", contents="Hello")
+        self.assertEqual(response.model_version, "model-a")
+        self.assertEqual(self.mock.server.stats["requests"], 3)
+        self.assertEqual(len(read_state(self.state_path)["model-a"]), 1)
+
+    @patch("time.sleep")
+    @patch("time.time")
+    def test_rate_limit_throttles_limiter(self, mock_time, mock_sleep):
+        # Sleeping advances a fake clock, so the limiter's throttle wait does not spin
+        clock = [1000.0]
+        mock_time.side_effect = lambda: clock[0]
+        mock_sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+        client = self.make_client(retry_policy=RetryPolicy(seed=0))
+        self.mock.server.inject(429)
+        client.models.generate_content(model="model-a", contents="Hello")
+        throttle = read_state(self.state_path)["_throttle"]["model-a"]
+        self.assertGreater(throttle["penalty_until"], throttle["until"])
+        # The retry waited at least the server's retryDelay
+        self.assertGreaterEqual(mock_sleep.call_args_list[0].args[0], 1)
+
+    @patch("time.sleep")
+    def test_gives_up_after_max_attempts(self, mock_sleep):
+        client = self.make_client(retry_policy=RetryPolicy(max_attempts=2, seed=0), fallback=False)
+        self.mock.server.inject(503, 503, 503)
+        with self.assertRaises(MockAPIError):
+            client.models.generate_content(model="model-a", contents="Hello")
+        self.assertEqual(self.mock.server.stats["requests"], 2)
+
+    @patch("time.sleep")
+    def test_non_retryable_errors_raise_immediately(self, mock_sleep):
+        client = self.make_client()
+        self.mock.server.inject(400)
+        with self.assertRaises(MockAPIError):
+            client.models.generate_content(model="model-a", contents="Hello")
+        self.assertEqual(self.mock.server.stats["requests"], 1)
+        mock_sleep.assert_not_called()
+
+    @patch("time.sleep")
+    def test_open_circuit_falls_back_to_next_model(self, mock_sleep):
+        client = self.make_client(retry_policy=RetryPolicy(max_attempts=1, seed=0))
+        self.mock.server.inject(503, 503, 503, model="model-a")
+        for _ in range(3):
+            with self.assertRaises(MockAPIError):
+                client.models.generate_content(model="model-a", contents="Hello")
+        self.assertEqual(client.models.breaker("model-a").state, CircuitBreaker.OPEN)
+
+        response = client.models.generate_content(model="model-a", contents="Hello")
+        self.assertEqual(response.model_version, "model-b")
+
+    @patch("time.sleep")
+    def test_open_circuit_without_fallback_raises(self, mock_sleep):
+        client = self.make_client(retry_policy=RetryPolicy(max_attempts=1, seed=0), fallback=False)
+        self.mock.server.inject(503, 503, 503)
+        for _ in range(3):
+            with self.assertRaises(MockAPIError):
+                client.models.generate_content(model="model-a", contents="Hello")
+        with self.assertRaises(CircuitOpenError):
+            client.models.generate_content(model="model-a", contents="Hello")
+
+    def test_failed_admission_ends_half_open_trial(self):
+        clock = VirtualClock(1000.0)
+        client = self.make_client(retry_policy=RetryPolicy(max_attempts=1, seed=0), fallback=False, clock=clock)
+        self.mock.server.inject(503, 503, 503)
+        for _ in range(3):
+            with self.assertRaises(MockAPIError):
+                client.models.generate_content(model="model-a", contents="Hello")
+        breaker = client.models.breaker("model-a")
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # The breaker follows the limiter's clock
+        clock.sleep(31)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(ValueError):
+            # Over the TPM limit: the trial is admitted by the breaker but refused by the limiter
+            client.models.generate_content(model="model-a", contents="Hello", prompt_tokens=10 ** 9)
+        response = client.models.generate_content(model="model-a", contents="Hello")
+        self.assertEqual(response.model_version, "model-a")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    @patch("time.sleep")
+    def test_chat_messages_are_retried(self, mock_sleep):
+        client = self.make_client(retry_policy=RetryPolicy(seed=0))
+        chat = client.chats.create(model="model-a")
+        self.mock.server.inject(503)
+        response = chat.send_message("Hi")
+        self.assertEqual(response.model_version, "model-a")
+        self.assertEqual(len(chat._chat.get_history()), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import threading
+import time
+from src.scheduler import FairScheduler, get_scheduler
+
+class TestFairScheduler(unittest.TestCase):
+    def run_flows(self, scheduler, requests):
+        """Queues (flow, weight) requests behind a held turn, releases it and returns the grant order."""
+        order = []
+        held = threading.Event()
+        hold = threading.Event()
+
+        def holder():
+            with scheduler.turn("holder"):
+                held.set()
+                hold.wait()
+
+        def worker(flow, weight):
+            with scheduler.turn(flow, weight):
+                order.append(flow)
+
+        threads = [threading.Thread(target=holder)]
+        threads[0].start()
+        held.wait(timeout=5)
+        for flow, weight in requests:
+            t = threading.Thread(target=worker, args=(flow, weight))
+            t.start()
+            threads.append(t)
+            # Enqueue in a deterministic order
+            while len(scheduler) < len(threads) - 1:
+                time.sleep(0.001)
+        hold.set()
+        for t in threads:
+            t.join(timeout=5)
+        return order
+
+    def test_light_flow_is_not_starved(self):
+        scheduler = FairScheduler()
+        order = self.run_flows(scheduler, [("batch", 1.0)] * 10 + [("interactive", 1.0)] * 2)
+        # The interactive requests queued last are served within the first few turns
+        self.assertLessEqual(order.index("interactive"), 1)
+        self.assertLessEqual(len(order) - 1 - order[::-1].index("interactive"), 3)
+
+    def test_weights_share_turns_proportionally(self):
+        scheduler = FairScheduler()
+        order = self.run_flows(scheduler, [("a", 2.0)] * 8 + [("b", 1.0)] * 8)
+        self.assertEqual(order[:6].count("a"), 4)
+
+    def test_registry_is_per_key_and_model(self):
+        self.assertIs(get_scheduler("k1", "m"), get_scheduler("k1", "m"))
+        self.assertIsNot(get_scheduler("k1", "m"), get_scheduler("k2", "m"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import os
+import json
+import tempfile
+import time
+from unittest.mock import patch
+from starlette.testclient import TestClient
+from src.mock_client import MockClient
+from src.service import JudgeService, create_app
+from src.service_client import ServiceClient
+
+class TestService(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        with open(config_path, 'w') as f:
+            json.dump({"free": {"gemini-2.5-flash": {"rpm": 1000, "tpm": 10000000, "rpd": 10000}}}, f)
+        self.clients = {}
+
+        def factory(api_key):
+            self.clients[api_key] = MockClient(api_key=api_key)
+            return self.clients[api_key]
+
+        path = lambda name: os.path.join(self.tmpdir.name, name)
+        self.service = JudgeService(
+            factory, state_file=path("state.json"), config_file=config_path,
+            results_path=path("results.db"), jobs_path=path("jobs.db"), index_root=self.tmpdir.name, threads=4,
+            poll_interval=0, calibration_path=path("calibration.json"), api_key="server-key", service_token="secret"
+        )
+        self.http = TestClient(create_app(self.service), headers={"X-Goog-Api-Key": "key-a"})
+        self.http.__enter__()
+
+    def tearDown(self):
+        self.http.__exit__(None, None, None)
+        self.tmpdir.cleanup()
+
+    def test_text_evaluation_waits_for_result(self):
+        response = self.http.post("/v1/evaluations/text?wait=true", json={"text": "ok so the ramen was overrated"})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()["result"]
+        self.assertEqual(result["source"], "judge")
+        self.assertEqual(result["evaluation"]["origin_analysis"]["prediction"], "Human-Generated")
+        self.assertGreater(result["usage"]["total_token_count"], 0)
+        self.assertEqual(result["prompt"], "judge-text@v1")
+
+        results = self.http.get("/v1/results").json()["results"]
+        self.assertEqual([row["content_type"] for row in results], ["text"])
+        summary = self.http.get("/v1/results/summary?group_by=source").json()["summary"]
+        self.assertEqual(summary[0]["source"], "judge")
+
+    def test_job_status(self):
+        response = self.http.post("/v1/evaluations/text", json={"text": "word " * 1500})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            job = self.http.get(f"/v1/jobs/{job_id}").json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.01)
+        self.assertEqual(job["status"], "succeeded")
+        self.assertTrue(job["result"]["truncated"])
+        self.assertEqual(self.http.get("/v1/jobs/unknown").status_code, 404)
+
+    def test_video_multipart_upload(self):
+        response = self.http.post(
+            "/v1/evaluations/video?wait=true",
+            files={"file": ("clip.mp4", b"\x00" * 4096, "video/mp4")},
+            data={"model": "gemini-2.5-flash"}
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.json()["result"]["type"], "Video")
+        # The upload was deleted from the File API afterwards
+        self.assertEqual(self.clients["key-a"].files._files, {})
+
+    def test_video_with_text_is_one_combined_evaluation(self):
+        response = self.http.post(
+            "/v1/evaluations/video?wait=true",
+            files={"file": ("clip.mp4", b"\x00" * 4096, "video/mp4")},
+            data={"model": "gemini-2.5-flash", "text": "day 3 of learning to juggle"}
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        result = response.json()["result"]
+        self.assertEqual((result["type"], result["prompt"]), ("Text + Video", "judge-combined@v2"))
+        self.assertEqual(self.clients["key-a"].files._files, {})
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.http.post("/v1/evaluations/text", json={"text": ""}).status_code, 400)
+        self.assertEqual(self.http.post("/v1/evaluations/text", json={"text": "hi"}, headers={"X-Goog-Api-Key": ""}).status_code, 401)
+        response = self.http.post("/v1/evaluations/video", files={"file": ("notes.txt", b"hello", "text/plain")})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.http.get("/v1/results/summary?group_by=raw_text").status_code, 400)
+
+    def test_clients_are_shared_per_key(self):
+        for key in ("key-a", "key-a", "key-b"):
+            self.http.post("/v1/evaluations/text?wait=true", json={"text": f"text for {key}"},
+                           headers={"X-Goog-Api-Key": key})
+        self.assertEqual(sorted(self.clients), ["key-a", "key-b"])
+
+    def test_service_client_matches_evaluator_results(self):
+        client = ServiceClient("http://testserver", "key-a", http_client=self.http)
+        result = client.evaluate_text("a short text to judge", "gemini-2.5-flash")
+        self.assertEqual(result["structured"]["origin_analysis"]["prediction"], "Human-Generated")
+        self.assertEqual(result["metadata"].total_token_count, result["usage"]["total_token_count"])
+
+    def test_service_client_reads_the_key_history(self):
+        client = ServiceClient("http://testserver", "key-a", http_client=self.http)
+        client.evaluate_text("a short text to judge", "gemini-2.5-flash")
+        summary = client.results_summary(group_by="model")
+        self.assertEqual([(row["model"], row["count"]) for row in summary], [("gemini-2.5-flash", 1)])
+        self.assertEqual([row["content_type"] for row in client.results(limit=20)], ["text"])
+        other = ServiceClient("http://testserver", "key-b", http_client=self.http)
+        self.assertEqual(other.results_summary(), [])
+
+    def test_server_key_needs_the_service_token(self):
+        anonymous = {"X-Goog-Api-Key": ""}
+        self.assertEqual(self.http.post("/v1/evaluations/text?wait=true", json={"text": "hi"}, headers=anonymous).status_code, 401)
+        self.assertEqual(self.http.get("/v1/results", headers=anonymous).status_code, 401)
+        wrong = {**anonymous, "Authorization": "Bearer guess"}
+        self.assertEqual(self.http.post("/v1/evaluations/text?wait=true", json={"text": "hi"}, headers=wrong).status_code, 401)
+        response = self.http.post("/v1/evaluations/text?wait=true", json={"text": "hi"},
+                                  headers={**anonymous, "Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(self.clients), ["server-key"])
+
+    def test_results_and_jobs_are_scoped_to_the_key(self):
+        response = self.http.post("/v1/evaluations/text?wait=true", json={"text": "the ramen was overrated"})
+        job_id = response.json()["job_id"]
+        other = {"X-Goog-Api-Key": "key-b"}
+        self.assertEqual(len(self.http.get("/v1/results").json()["results"]), 1)
+        self.assertEqual(self.http.get("/v1/results", headers=other).json()["results"], [])
+        self.assertEqual(self.http.get("/v1/results/summary", headers=other).json()["summary"], [])
+        self.assertEqual(self.http.get(f"/v1/jobs/{job_id}").status_code, 200)
+        self.assertEqual(self.http.get(f"/v1/jobs/{job_id}", headers=other).status_code, 404)
+
+    def test_upload_is_removed_when_the_job_is_not_created(self):
+        created = []
+        mkstemp = tempfile.mkstemp
+
+        def tracked_mkstemp(*args, **kwargs):
+            fd, path = mkstemp(*args, **kwargs)
+            created.append(path)
+            return fd, path
+
+        with patch("src.service.tempfile.mkstemp", tracked_mkstemp), \
+                patch.object(self.service.jobs, "create", side_effect=RuntimeError("jobs.db is locked")):
+            with self.assertRaises(RuntimeError):
+                self.http.post("/v1/evaluations/video", files={"file": ("clip.mp4", b"\x00" * 4096, "video/mp4")})
+        self.assertEqual(len(created), 1)
+        self.assertFalse(os.path.exists(created[0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.clock import VirtualClock
+from src.rate_limiter import RateLimiter, _apply_change
+from src.simulator import SimRequest, Simulator, load_workload, synthetic_workload
+from src.state_log import MemoryStateLog
+
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmpdir.name, "models_config.json")
+        with open(self.config_path, "w") as f:
+            json.dump({"free": {"test-model": {"rpm": 5, "tpm": 10000, "rpd": 20}}}, f)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _run(self, requests, **kwargs):
+        return Simulator(self.config_path, "free", **kwargs).run(requests)
+
+    def test_rpm_spreads_backlog_over_minutes(self):
+        report = self._run(synthetic_workload(10, "test-model", 100, 0, latency=1.0))
+        self.assertEqual(report["completed"], 10)
+        # Five per minute: the second five wait for the first minute's window to pass
+        self.assertGreater(report["completion_seconds"], 60)
+        self.assertLess(report["completion_seconds"], 120)
+        self.assertAlmostEqual(report["queueing_delay_seconds"]["mean"], 30.05)
+        self.assertAlmostEqual(report["queueing_delay_seconds"]["max"], 60.1)
+        self.assertEqual(report["models"]["test-model"]["rpd_burn"], 0.5)
+
+    def test_rpd_defers_to_next_day(self):
+        requests = synthetic_workload(25, "test-model", 100, 0, latency=1.0)
+        report = self._run(requests)
+        self.assertEqual(report["completed"], 25)
+        self.assertGreater(report["completion_seconds"], 86400)
+        self.assertEqual(sum(r.admitted < 86400 for r in requests), 20)
+
+    def test_tpm_is_respected(self):
+        requests = synthetic_workload(4, "test-model", 4000, 0, latency=1.0)
+        report = self._run(requests)
+        # Two prompts of 4000 fit in a 10000 TPM window, the next two wait a minute
+        self.assertEqual(sorted(r.admitted >= 60 for r in requests), [False, False, True, True])
+        self.assertEqual(report["rejected"], 0)
+
+    def test_request_over_tpm_is_rejected(self):
+        report = self._run([SimRequest(0.0, "test-model", 20000), SimRequest(0.0, "test-model", 100)])
+        self.assertEqual((report["completed"], report["rejected"]), (1, 1))
+
+    def test_interactive_arrival_overtakes_waiting_batch(self):
+        # Batch may use 4 of the 5 RPM; the fifth batch request waits for the window
+        requests = synthetic_workload(5, "test-model", 100, 0, latency=1.0, priority="batch")
+        interactive = SimRequest(10.0, "test-model", 100, latency=1.0)
+        self._run(requests + [interactive])
+        self.assertEqual(interactive.admitted, 10.0)
+        self.assertGreater(requests[-1].admitted, 60)
+
+    def test_concurrency_cap(self):
+        requests = synthetic_workload(4, "test-model", 100, 0, latency=10.0)
+        report = self._run(requests, concurrency=2)
+        self.assertEqual(report["completed"], 4)
+        # The last two start only as the first two finish
+        self.assertEqual(sum(r.admitted > 0 for r in requests), 2)
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            self._run([SimRequest(0.0, "other-model", 100)])
+
+    def test_load_workload(self):
+        path = os.path.join(self.tmpdir.name, "workload.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"model": "test-model", "prompt_tokens": 100, "latency_ms": 2500, "at": 30}) + "\n\n")
+            f.write(json.dumps({"model": "test-model", "prompt_tokens": 50, "priority": "batch"}) + "\n")
+        first, second = load_workload(path)
+        self.assertEqual((first.arrival, first.latency, first.prompt_tokens), (30.0, 2.5, 100))
+        self.assertEqual((second.arrival, second.priority), (0.0, 1))
+
+    def test_limiter_sleeps_on_virtual_clock(self):
+        clock = VirtualClock()
+        limiter = RateLimiter(config_file=self.config_path, tier="free", clock=clock,
+                              state_log=MemoryStateLog(_apply_change))
+        with patch("time.sleep") as sleep, patch("builtins.print"):
+            for _ in range(6):
+                reservation = limiter.wait_if_needed("test-model", 100)
+                limiter.update_usage("test-model", 150, reservation)
+        sleep.assert_not_called()
+        self.assertGreater(clock.now, 60)
+        self.assertEqual(sum(e["tokens"] for e in limiter._log.read()["test-model"]), 900)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from src.state_log import SEQ_KEY, StateLog
+
+def _add(state, change):
+    state[change["key"]] = state.get(change["key"], 0) + change["n"]
+
+def _increment(path, times):
+    log = StateLog(path, _add, compact_min_bytes=256)
+    for _ in range(times):
+        with log.locked():
+            log.append({"key": "count", "n": 1})
+    log.close()
+
+class TestStateLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "state.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _log(self, **kwargs):
+        log = StateLog(self.path, _add, **kwargs)
+        self.addCleanup(log.close)
+        return log
+
+    def test_changes_are_appended_and_replayed(self):
+        writer, reader = self._log(), self._log()
+        with writer.locked():
+            writer.append({"key": "a", "n": 2})
+            writer.append({"key": "a", "n": 3})
+        self.assertEqual(reader.read(), {"a": 5})
+        # Steady-state writes leave the snapshot alone
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {SEQ_KEY: 0})
+
+    def test_compaction_writes_snapshot_and_truncates_log(self):
+        writer, reader = self._log(compact_min_bytes=100), self._log()
+        self.assertEqual(reader.read(), {})
+        for _ in range(20):
+            with writer.locked():
+                writer.append({"key": "a", "n": 1})
+        self.assertLess(os.path.getsize(self.path + ".wal"), 100)
+        with open(self.path) as f:
+            snapshot = json.load(f)
+        with open(self.path + ".wal") as f:
+            self.assertEqual(snapshot["a"] + len(f.readlines()), 20)
+        self.assertEqual(reader.read(), {"a": 20})
+
+    def test_torn_append_is_discarded(self):
+        writer = self._log()
+        with writer.locked():
+            writer.append({"key": "a", "n": 1})
+        with open(self.path + ".wal", "ab") as f:
+            f.write(b'{"key":"a","n":100,"se')
+        recovered = self._log()
+        self.assertEqual(recovered.read(), {"a": 1})
+        with recovered.locked():
+            recovered.append({"key": "a", "n": 1})
+        self.assertEqual(self._log().read(), {"a": 2})
+
+    def test_log_already_in_snapshot_is_skipped(self):
+        # A crash after the snapshot was renamed into place but before the log was truncated
+        writer = self._log()
+        with writer.locked():
+            writer.append({"key": "a", "n": 1})
+            writer.append({"key": "a", "n": 1})
+        with open(self.path, "w") as f:
+            json.dump({"a": 2, SEQ_KEY: 2}, f)
+        self.assertEqual(self._log().read(), {"a": 2})
+
+    def test_loads_state_file_without_log(self):
+        with open(self.path, "w") as f:
+            json.dump({"a": 7}, f)
+        log = self._log()
+        self.assertEqual(log.read(), {"a": 7})
+        with log.locked():
+            log.append({"key": "a", "n": 1})
+        self.assertEqual(self._log().read(), {"a": 8})
+
+    def test_corrupt_snapshot_is_kept_aside(self):
+        with open(self.path, "w") as f:
+            f.write('{"a": 1, "b"')
+        self.assertEqual(self._log().read(), {})
+        self.assertTrue(os.path.exists(self.path + ".corrupt"))
+
+    def test_concurrent_processes_with_compaction(self):
+        self._log()
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=_increment, args=(self.path, 100)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self._log().read(), {"count": 400})
+
+if __name__ == '__main__':
+    unittest.main()
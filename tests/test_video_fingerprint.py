@@ -0,0 +1,78 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from src.video_fingerprint import (
+    SAMPLE_FRAMES, VideoFingerprintIndex, cv2, fingerprint_distance, fingerprint_file, phash
+)
+
+def _frame(seed, shape=(120, 160)):
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 255, (12, 16)).astype(np.float64)
+    return np.kron(coarse, np.ones((shape[0] // 12, shape[1] // 16)))
+
+class TestVideoFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_phash_tolerates_noise_and_rescaling(self):
+        frame = _frame(1)
+        noisy = frame + np.random.default_rng(2).normal(0, 10, frame.shape)
+        upscaled = np.kron(frame, np.ones((2, 2)))
+        other = _frame(3)
+
+        self.assertLessEqual(bin(phash(frame) ^ phash(noisy)).count("1"), 6)
+        self.assertLessEqual(bin(phash(frame) ^ phash(upscaled)).count("1"), 2)
+        self.assertGreater(bin(phash(frame) ^ phash(other)).count("1"), 16)
+
+    def test_fingerprint_distance(self):
+        a = np.array([phash(_frame(i)) for i in range(SAMPLE_FRAMES)], dtype=np.uint64)
+        shifted = np.roll(a, 1)
+        b = np.array([phash(_frame(100 + i)) for i in range(SAMPLE_FRAMES)], dtype=np.uint64)
+
+        distances = fingerprint_distance(a, np.stack([a, shifted, b]))
+        self.assertEqual(distances[0], 0)
+        self.assertEqual(distances[1], 0)
+        self.assertGreater(distances[2], 10)
+
+    def test_index_roundtrip(self):
+        path = os.path.join(self.workdir, "index")
+        fingerprint = np.array([phash(_frame(i)) for i in range(SAMPLE_FRAMES)], dtype=np.uint64)
+        VideoFingerprintIndex(path).add(fingerprint, {"raw_text": "stored"})
+
+        index = VideoFingerprintIndex(path)
+        self.assertEqual(index.lookup(fingerprint), ({"raw_text": "stored"}, 0.0))
+        other = np.array([phash(_frame(100 + i)) for i in range(SAMPLE_FRAMES)], dtype=np.uint64)
+        self.assertIsNone(index.lookup(other))
+        self.assertIsNone(index.lookup(None))
+
+    @unittest.skipIf(cv2 is None, "OpenCV not installed")
+    def test_fingerprint_reencoded_video(self):
+        def write(path, size):
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 15, size)
+            for t in range(40):
+                frame = np.roll(_frame(t // 10), t, axis=1).astype(np.uint8)
+                writer.write(cv2.cvtColor(cv2.resize(frame, size), cv2.COLOR_GRAY2BGR))
+            writer.release()
+
+        original = os.path.join(self.workdir, "original.mp4")
+        reencoded = os.path.join(self.workdir, "reencoded.mp4")
+        write(original, (160, 120))
+        write(reencoded, (320, 240))
+
+        with open(original, "rb") as f:
+            a = fingerprint_file(f)
+            self.assertEqual(f.tell(), 0)
+        with open(reencoded, "rb") as f:
+            b = fingerprint_file(io.BytesIO(f.read()))
+
+        self.assertEqual(a.shape, (SAMPLE_FRAMES,))
+        self.assertLess(fingerprint_distance(a, b[None, :])[0], 4)
+
+if __name__ == "__main__":
+    unittest.main()
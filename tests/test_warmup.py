@@ -0,0 +1,27 @@
+import unittest
+import os
+import subprocess
+import sys
+from src.warmup import warm_up
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestWarmUp(unittest.TestCase):
+    def test_startup_modules_do_not_import_sdk(self):
+        # Everything src/app.py imports at module level must stay off the heavy dependencies
+        code = (
+            "import sys; import src.wrapper, src.rate_limiter, src.client_pool, src.results_store, "
+            "src.metrics, src.prompts, src.warmup, src.evaluator; "
+            "print(sorted(m for m in ('google.genai', 'numpy', 'cv2') if m in sys.modules))"
+        )
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT, check=True)
+        self.assertEqual(out.stdout.strip(), "[]")
+
+    def test_warm_up_reports_each_step(self):
+        config = os.path.join(ROOT, "models_config.json")
+        timings = warm_up(config)
+        self.assertEqual(set(timings), {"sdk", "config", "parser"})
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+if __name__ == '__main__':
+    unittest.main()
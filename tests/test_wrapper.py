@@ -2,6 +2,7 @@ import unittest
 import os
 import json
 import tempfile
+from src.rate_limiter import read_state
 from src.wrapper import LimitedClient
 from src.mock_client import MockClient
 from google.genai.types import GenerateContentConfig
@@ -43,8 +44,9 @@ class TestWrapper(unittest.TestCase):
     def tearDown(self):
         if os.path.exists(self.config_path):
             os.remove(self.config_path)
-        if os.path.exists(self.state_path):
-            os.remove(self.state_path)
+        for path in (self.state_path, self.state_path + ".wal"):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_set_tier(self):
         self.assertEqual(self.client._limiter.tier, "free")
@@ -60,8 +62,7 @@ class TestWrapper(unittest.TestCase):
         self.assertIn("prediction", response.text)
         
         # Verify state updated
-        with open(self.state_path, 'r') as f:
-            state = json.load(f)
+        state = read_state(self.state_path)
         self.assertEqual(len(state["gemini-2.5-flash"]), 1)
 
     def test_chat(self):